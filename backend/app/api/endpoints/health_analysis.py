@@ -4,28 +4,140 @@ from typing import List, Optional
 import io
 from PIL import Image
 import json
+from dataclasses import asdict
 
-from app.services.vision_analysis import VisionAnalysisService
-from app.services.llm_health_service import LLMHealthService
-from app.services.nail_hemoglobin_service import NailHemoglobinService
-from app.services.pattern_detection_service import PatternDetectionService
+from app.services.result_cache import create_result_cache
+from app.services.jobs import RetryJob, job_runner, pack_uploads, unpack_uploads
+from app.services.model_registry import UNVERSIONED
+from app.services.inference_profiles import CAPTION_PRESETS, INFERENCE_PROFILES, InferenceProfile, get_inference_profile
+from app.core.admission import admission
 from app.core.config import settings
+from app.core.inference_executor import inference_executor
+from app.core.inference_workers import inference_workers
+from app.core.lazy import LazyService
+from app.core.metrics import stage_timer
+from app.core.serialization import DETAIL_LEVELS, FastJSONResponse, field_selected, parse_fields, select_fields
+from app.core.profiling import profiled
 
 router = APIRouter()
 
-# Initialize services
-vision_service = VisionAnalysisService()
-llm_service = LLMHealthService()
-nail_hemoglobin_service = NailHemoglobinService()
-pattern_detection_service = PatternDetectionService()
+# Initialize services (each pipeline's modules and models load on its first use)
+vision_service = LazyService("app.services.vision_analysis:VisionAnalysisService")
+llm_service = LazyService("app.services.llm_health_service:LLMHealthService")
+nail_hemoglobin_service = LazyService("app.services.nail_hemoglobin_service:NailHemoglobinService")
+pattern_detection_service = LazyService("app.services.pattern_detection_service:PatternDetectionService")
+result_cache = create_result_cache()
+
+# Bulky per-item sub-trees left out of detail=summary responses
+SUMMARY_OMITTED_FIELDS = {
+    "analyze-image": (),
+    "analyze-hemoglobin": ("nail_analysis.individual_predictions",),
+    "analyze-hemoglobin-sequence": ("nail_analysis.individual_predictions",),
+    "analyze-patterns": ("pattern_analysis.individual_detections",),
+    "analyze-pattern-sequence": ("sequence_analysis.frames", "sequence_analysis.droplets"),
+}
+
+def _parse_symptoms(symptoms: Optional[str]) -> list:
+    """Parse the JSON-encoded symptom list sent by the client"""
+    if not symptoms:
+        return []
+    try:
+        return json.loads(symptoms)
+    except:
+        return []
+
+def _decode_image(contents: bytes) -> Image.Image:
+    """Decode uploaded image bytes"""
+    with stage_timer("decode"):
+        image = Image.open(io.BytesIO(contents))
+        image.load()
+    return image
+
+def _resolve_profile(profile: Optional[str]) -> InferenceProfile:
+    """Resolve the requested inference profile, rejecting unknown names"""
+    try:
+        return get_inference_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _resolve_detail(detail: Optional[str]) -> str:
+    """Validate the requested response detail level"""
+    detail = detail or "full"
+    if detail not in DETAIL_LEVELS:
+        raise HTTPException(status_code=400, detail=f"detail must be one of: {', '.join(DETAIL_LEVELS)}")
+    return detail
+
+def _respond(endpoint: str, content: dict, fields: Optional[str] = None, detail: str = "full",
+             **kwargs) -> FastJSONResponse:
+    """Encode an analysis response, keeping only the requested fields / detail level"""
+    with stage_timer("serialize"):
+        omit = SUMMARY_OMITTED_FIELDS[endpoint] if detail == "summary" else ()
+        return FastJSONResponse(content=select_fields(content, parse_fields(fields), omit), **kwargs)
+
+async def _submit_job(endpoint: str, contents: bytes, **params) -> JSONResponse:
+    """Queue an analysis as a background job and point the client at its status URL"""
+    job_id = await job_runner.submit(endpoint, contents, params)
+    status_url = f"{settings.API_V1_STR}/health/jobs/{job_id}"
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": status_url},
+        headers={"Location": status_url}
+    )
+
+def _job_handler(analyze):
+    """Adapt an analysis coroutine to the job runner's (contents, params) -> (status, body) interface"""
+    async def run(contents: bytes, params: dict):
+        params = {**params, "inference_profile": get_inference_profile(params["inference_profile"])}
+        try:
+            response = await analyze(contents, **params)
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            if e.status_code == 503 and retry_after:
+                raise RetryJob(float(retry_after))
+            return e.status_code, {"detail": e.detail}
+        return response.status_code, json.loads(response.body)
+    return run
+
+def _sequence_job_handler(analyze):
+    """_job_handler for an analysis of several uploads, stored as one packed job payload"""
+    async def analyze_packed(contents: bytes, **params):
+        return await analyze(unpack_uploads(contents), **params)
+    return _job_handler(analyze_packed)
+
+async def _resolved(*services: LazyService) -> None:
+    """Build services not loaded yet on an executor thread, before their first attribute access on the loop"""
+    for service in services:
+        await service.resolve_async()
+
+def _served_checkpoints(analysis: dict, checkpoints: dict) -> bool:
+    """True if the analysis ran on the checkpoint versions its cache key was built from (no reload in between)"""
+    served = analysis.get("model_versions", {})
+    # A model whose version was not published yet (first load) makes the key incomplete
+    return all(
+        served.get(name, version or UNVERSIONED) == (version or UNVERSIONED)
+        for name, version in checkpoints.items()
+    ) and all(version == UNVERSIONED for name, version in served.items() if name not in checkpoints)
+
+def _cached_response(cache_key: str, endpoint: str, fields: Optional[str] = None,
+                     detail: str = "full") -> Optional[FastJSONResponse]:
+    """Return the cached response for a key, if any"""
+    cached = result_cache.get(cache_key)
+    if cached is None:
+        return None
+    return _respond(endpoint, cached, fields, detail, headers={"X-Cache": "HIT"})
 
 @router.post("/analyze-image")
+@profiled
 async def analyze_health_image(
     file: UploadFile = File(...),
     analysis_type: str = Form(...),  # "skin" or "discharge"
     symptoms: Optional[str] = Form(None),  # JSON string of symptoms
     user_age: Optional[int] = Form(None),
-    user_phase: Optional[str] = Form(None)  # menstrual phase
+    user_phase: Optional[str] = Form(None),  # menstrual phase
+    profile: Optional[str] = Form(None),  # "fast", "balanced" or "accurate"
+    fields: Optional[str] = Form(None),  # comma-separated dotted paths to return, e.g. "health_assessment.severity"
+    detail: Optional[str] = Form("full"),  # "summary" or "full"
+    async_mode: bool = Form(False, alias="async")  # run as a background job
 ):
     """
     Analyze health image with AI
@@ -34,39 +146,82 @@ async def analyze_health_image(
     if file.content_type not in ["image/jpeg", "image/png", "image/webp"]:
         raise HTTPException(status_code=400, detail="Invalid file type")
     
-    # Read and process image
+    inference_profile = _resolve_profile(profile)
+    detail = _resolve_detail(detail)
+    
     contents = await file.read()
-    image = Image.open(io.BytesIO(contents))
+    if async_mode:
+        return await _submit_job(
+            "analyze-image",
+            contents,
+            analysis_type=analysis_type,
+            symptoms=symptoms,
+            user_age=user_age,
+            user_phase=user_phase,
+            inference_profile=inference_profile.name,
+            fields=fields,
+            detail=detail
+        )
+    
+    return await _analyze_image(
+        contents, analysis_type, symptoms, user_age, user_phase, inference_profile, fields=fields, detail=detail
+    )
+
+async def _analyze_image(
+    contents: bytes,
+    analysis_type: str,
+    symptoms: Optional[str],
+    user_age: Optional[int],
+    user_phase: Optional[str],
+    inference_profile: InferenceProfile,
+    fields: Optional[str] = None,
+    detail: str = "full"
+) -> JSONResponse:
+    """Analyze an uploaded health image (request or background job)"""
+    await _resolved(vision_service, llm_service)
+    # Process image
+    image = _decode_image(contents)
     
     # Parse symptoms if provided
-    symptom_list = []
-    if symptoms:
-        try:
-            symptom_list = json.loads(symptoms)
-        except:
-            symptom_list = []
+    symptom_list = _parse_symptoms(symptoms)
     
-    # Perform image analysis
-    if analysis_type == "skin":
-        image_results = await vision_service.analyze_skin_condition(image)
-    elif analysis_type == "discharge":
-        image_results = await vision_service.analyze_discharge(image)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid analysis type")
+    # Serve repeated uploads from the result cache
+    cache_key = result_cache.make_key(
+        "analyze-image",
+        image,
+        analysis_type=analysis_type,
+        symptoms=sorted(map(str, symptom_list)),
+        user_age=user_age,
+        user_phase=user_phase,
+        profile=inference_profile.name
+    )
+    cached_response = _cached_response(cache_key, "analyze-image", fields, detail)
+    if cached_response is not None:
+        return cached_response
     
-    # Create user context
-    user_context = {
-        "age": user_age,
-        "menstrual_phase": user_phase
-    }
+    if analysis_type not in ("skin", "discharge"):
+        raise HTTPException(status_code=400, detail="Invalid analysis type")
     
-    # Get LLM health analysis
-    health_analysis = await llm_service.analyze_with_context(
-        image_results,
-        analysis_type,
-        symptom_list,
-        user_context
-    )
+    async with admission.admit("analyze-image"):
+        # Perform image analysis
+        if analysis_type == "skin":
+            image_results = await vision_service.analyze_skin_condition(image, profile=inference_profile)
+        else:
+            image_results = await vision_service.analyze_discharge(image, profile=inference_profile)
+        
+        # Create user context
+        user_context = {
+            "age": user_age,
+            "menstrual_phase": user_phase
+        }
+        
+        # Get LLM health analysis
+        health_analysis = await llm_service.analyze_with_context(
+            image_results,
+            analysis_type,
+            symptom_list,
+            user_context
+        )
     
     # Combine results
     final_response = {
@@ -77,17 +232,26 @@ async def analyze_health_image(
         "timestamp": "2024-01-15T10:30:00Z"  # Add proper timestamp
     }
     
-    return JSONResponse(content=final_response)
+    if "error" not in image_results and "error" not in health_analysis:
+        result_cache.set(cache_key, final_response)
+    
+    return _respond("analyze-image", final_response, fields, detail)
 
 @router.post("/analyze-hemoglobin")
+@profiled
 async def analyze_nail_hemoglobin(
     file: UploadFile = File(...),
     user_age: Optional[int] = Form(None),
-    symptoms: Optional[str] = Form(None)  # JSON string of symptoms
+    symptoms: Optional[str] = Form(None),  # JSON string of symptoms
+    profile: Optional[str] = Form(None),  # "fast", "balanced" or "accurate"
+    fields: Optional[str] = Form(None),  # comma-separated dotted paths to return
+    detail: Optional[str] = Form("full"),  # "summary" (no per-nail predictions) or "full"
+    async_mode: bool = Form(False, alias="async")  # run as a background job
 ):
     """
     Analyze hemoglobin levels from nail images
     """
+    await _resolved(nail_hemoglobin_service)
     # Check if models are available
     model_status = nail_hemoglobin_service.check_models_available()
     if not model_status['models_ready']:
@@ -104,50 +268,87 @@ async def analyze_nail_hemoglobin(
     if file.size and file.size > settings.MAX_UPLOAD_SIZE:
         raise HTTPException(status_code=400, detail="File too large")
     
+    inference_profile = _resolve_profile(profile)
+    detail = _resolve_detail(detail)
+    
+    contents = await file.read()
+    if async_mode:
+        return await _submit_job(
+            "analyze-hemoglobin",
+            contents,
+            user_age=user_age,
+            symptoms=symptoms,
+            inference_profile=inference_profile.name,
+            fields=fields,
+            detail=detail
+        )
+    
+    return await _analyze_hemoglobin(contents, user_age, symptoms, inference_profile, fields=fields, detail=detail)
+
+async def _analyze_hemoglobin(
+    contents: bytes,
+    user_age: Optional[int],
+    symptoms: Optional[str],
+    inference_profile: InferenceProfile,
+    fields: Optional[str] = None,
+    detail: str = "full"
+) -> JSONResponse:
+    """Analyze hemoglobin from an uploaded nail image (request or background job)"""
+    await _resolved(nail_hemoglobin_service, llm_service)
     try:
-        # Read and process image
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
+        # Process image
+        image = _decode_image(contents)
         
         # Parse symptoms if provided
-        symptom_list = []
-        if symptoms:
-            try:
-                symptom_list = json.loads(symptoms)
-            except:
-                symptom_list = []
+        symptom_list = _parse_symptoms(symptoms)
         
-        # Perform nail hemoglobin analysis
-        nail_analysis_result = await nail_hemoglobin_service.analyze_hemoglobin(
-            image=image,
+        # Serve repeated uploads from the result cache (keyed on the model versions, so a reload invalidates it)
+        checkpoints = nail_hemoglobin_service.checkpoint_versions()
+        cache_key = result_cache.make_key(
+            "analyze-hemoglobin",
+            image,
+            symptoms=sorted(map(str, symptom_list)),
             user_age=user_age,
-            symptoms=symptom_list
+            profile=inference_profile.name,
+            models=checkpoints
         )
+        cached_response = _cached_response(cache_key, "analyze-hemoglobin", fields, detail)
+        if cached_response is not None:
+            return cached_response
         
-        # If analysis failed, return early
-        if not nail_analysis_result.get('success', False):
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "status": "error",
-                    "message": nail_analysis_result.get('message', 'Analysis failed'),
-                    "nail_analysis": nail_analysis_result.get('nail_analysis', {})
-                }
+        async with admission.admit("analyze-hemoglobin"):
+            # Perform nail hemoglobin analysis
+            nail_analysis_result = await nail_hemoglobin_service.analyze_hemoglobin(
+                image=image,
+                user_age=user_age,
+                symptoms=symptom_list,
+                profile=inference_profile
+            )
+            
+            # If analysis failed, return early
+            if not nail_analysis_result.get('success', False):
+                return JSONResponse(
+                    status_code=400,
+                    content={
+                        "status": "error",
+                        "message": nail_analysis_result.get('message', 'Analysis failed'),
+                        "nail_analysis": nail_analysis_result.get('nail_analysis', {})
+                    }
+                )
+            
+            # Create user context for LLM
+            user_context = {
+                "age": user_age,
+                "symptoms": symptom_list,
+                "analysis_type": "hemoglobin"
+            }
+            
+            # Get enhanced health assessment from LLM
+            health_assessment = await llm_service.analyze_hemoglobin_with_context(
+                nail_analysis_result,
+                symptom_list,
+                user_context
             )
-        
-        # Create user context for LLM
-        user_context = {
-            "age": user_age,
-            "symptoms": symptom_list,
-            "analysis_type": "hemoglobin"
-        }
-        
-        # Get enhanced health assessment from LLM
-        health_assessment = await llm_service.analyze_hemoglobin_with_context(
-            nail_analysis_result,
-            symptom_list,
-            user_context
-        )
         
         # Combine results
         final_response = {
@@ -163,21 +364,165 @@ async def analyze_nail_hemoglobin(
             "timestamp": nail_analysis_result['timestamp']
         }
         
-        return JSONResponse(content=final_response)
+        if "error" not in health_assessment and _served_checkpoints(final_response["nail_analysis"], checkpoints):
+            result_cache.set(cache_key, final_response)
+        
+        return _respond("analyze-hemoglobin", final_response, fields, detail)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+@router.post("/analyze-hemoglobin-sequence")
+@profiled
+async def analyze_nail_hemoglobin_sequence(
+    files: List[UploadFile] = File(...),  # one video clip, or several frames in order
+    user_age: Optional[int] = Form(None),
+    symptoms: Optional[str] = Form(None),  # JSON string of symptoms
+    keyframe_interval: Optional[int] = Form(None),  # default NAIL_KEYFRAME_INTERVAL
+    profile: Optional[str] = Form(None),  # "fast", "balanced" or "accurate"
+    fields: Optional[str] = Form(None),  # comma-separated dotted paths to return
+    detail: Optional[str] = Form("full"),  # "summary" (no per-nail predictions) or "full"
+    async_mode: bool = Form(False, alias="async")  # run as a background job
+):
+    """
+    Analyze hemoglobin levels from a short clip of the nails, aggregating estimates over frames
+    """
+    await _resolved(nail_hemoglobin_service)
+    model_status = nail_hemoglobin_service.check_models_available()
+    if not model_status['models_ready']:
+        raise HTTPException(
+            status_code=503, 
+            detail="Nail hemoglobin analysis service is not available. Model files are missing."
+        )
+    
+    is_video = len(files) == 1 and (files[0].content_type or "").startswith("video/")
+    if not is_video:
+        if len(files) > settings.NAIL_SEQUENCE_MAX_FRAMES:
+            raise HTTPException(status_code=400, detail=f"Too many frames (max {settings.NAIL_SEQUENCE_MAX_FRAMES})")
+        if any(file.content_type not in ["image/jpeg", "image/png", "image/webp"] for file in files):
+            raise HTTPException(status_code=400, detail="Invalid file type. Please upload one video or JPEG, PNG, or WebP frames.")
+    if keyframe_interval is not None and keyframe_interval < 1:
+        raise HTTPException(status_code=400, detail="keyframe_interval must be at least 1")
+    
+    inference_profile = _resolve_profile(profile)
+    detail = _resolve_detail(detail)
+    
+    uploads = []
+    for file in files:
+        if not is_video and file.size and file.size > settings.MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=400, detail="File too large")
+        uploads.append(await file.read())
+    if is_video and len(uploads[0]) > settings.NAIL_VIDEO_MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail="File too large")
+    
+    if async_mode:
+        return await _submit_job(
+            "analyze-hemoglobin-sequence",
+            pack_uploads(uploads),
+            is_video=is_video,
+            user_age=user_age,
+            symptoms=symptoms,
+            keyframe_interval=keyframe_interval,
+            inference_profile=inference_profile.name,
+            fields=fields,
+            detail=detail
+        )
+    
+    return await _analyze_hemoglobin_sequence(
+        uploads, is_video, user_age, symptoms, keyframe_interval, inference_profile, fields=fields, detail=detail
+    )
+
+async def _analyze_hemoglobin_sequence(
+    uploads: List[bytes],
+    is_video: bool,
+    user_age: Optional[int],
+    symptoms: Optional[str],
+    keyframe_interval: Optional[int],
+    inference_profile: InferenceProfile,
+    fields: Optional[str] = None,
+    detail: str = "full"
+) -> JSONResponse:
+    """Analyze hemoglobin from an uploaded clip or frames (request or background job)"""
+    await _resolved(nail_hemoglobin_service, llm_service)
+    try:
+        if is_video:
+            # Deferred: imports OpenCV
+            from app.services.nail_tracking import read_video_frames
+            try:
+                with stage_timer("decode"):
+                    frames = read_video_frames(uploads[0], settings.NAIL_SEQUENCE_MAX_FRAMES)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            frames = [_decode_image(contents) for contents in uploads]
+        
+        symptom_list = _parse_symptoms(symptoms)
+        
+        async with admission.admit("analyze-hemoglobin-sequence"):
+            nail_analysis_result = await nail_hemoglobin_service.analyze_hemoglobin_sequence(
+                frames,
+                keyframe_interval=keyframe_interval,
+                profile=inference_profile
+            )
+            
+            if not nail_analysis_result.get('success', False):
+                return JSONResponse(
+                    status_code=400,
+                    content={
+                        "status": "error",
+                        "message": nail_analysis_result.get('message', 'Analysis failed'),
+                        "nail_analysis": nail_analysis_result.get('nail_analysis', {})
+                    }
+                )
+            
+            user_context = {
+                "age": user_age,
+                "symptoms": symptom_list,
+                "analysis_type": "hemoglobin"
+            }
+            
+            health_assessment = await llm_service.analyze_hemoglobin_with_context(
+                nail_analysis_result,
+                symptom_list,
+                user_context
+            )
         
+        return _respond("analyze-hemoglobin-sequence", {
+            "status": "success",
+            "nail_analysis": nail_analysis_result['nail_analysis'],
+            "health_assessment": health_assessment,
+            "medical_context": {
+                "normal_range": "120-160 g/L for women",
+                "interpretation": nail_hemoglobin_service.get_interpretation(
+                    nail_analysis_result['nail_analysis']['average_hemoglobin_g_per_L']
+                )['interpretation']
+            },
+            "timestamp": nail_analysis_result['timestamp']
+        }, fields, detail)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @router.post("/analyze-patterns")
+@profiled
 async def analyze_pattern_detection(
     file: UploadFile = File(...),
     min_area: Optional[int] = Form(50),
     max_area: Optional[int] = Form(5000),
-    confidence_threshold: Optional[float] = Form(0.5)
+    confidence_threshold: Optional[float] = Form(0.5),
+    profile: Optional[str] = Form(None),  # "fast", "balanced" or "accurate"
+    fields: Optional[str] = Form(None),  # comma-separated dotted paths to return, e.g. "summary"
+    detail: Optional[str] = Form("full"),  # "summary" skips building the per-droplet detections
+    async_mode: bool = Form(False, alias="async")  # run as a background job
 ):
     """
     Analyze LC droplet patterns in images - detect and count circular vs cross patterns
     """
+    await _resolved(pattern_detection_service)
     # Check if models are available
     model_status = pattern_detection_service.check_models_available()
     if not model_status['models_ready']:
@@ -194,18 +539,74 @@ async def analyze_pattern_detection(
     if file.size and file.size > settings.MAX_UPLOAD_SIZE:
         raise HTTPException(status_code=400, detail="File too large")
     
+    inference_profile = _resolve_profile(profile)
+    detail = _resolve_detail(detail)
+    
+    contents = await file.read()
+    if async_mode:
+        return await _submit_job(
+            "analyze-patterns",
+            contents,
+            min_area=min_area,
+            max_area=max_area,
+            confidence_threshold=confidence_threshold,
+            inference_profile=inference_profile.name,
+            fields=fields,
+            detail=detail
+        )
+    
+    return await _analyze_patterns(
+        contents, min_area, max_area, confidence_threshold, inference_profile, fields=fields, detail=detail
+    )
+
+async def _analyze_patterns(
+    contents: bytes,
+    min_area: int,
+    max_area: int,
+    confidence_threshold: float,
+    inference_profile: InferenceProfile,
+    fields: Optional[str] = None,
+    detail: str = "full"
+) -> JSONResponse:
+    """Detect and classify LC droplet patterns in an uploaded image (request or background job)"""
+    await _resolved(pattern_detection_service)
     try:
-        # Read and process image
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
+        # Process image
+        image = _decode_image(contents)
         
-        # Perform pattern detection and classification
-        pattern_analysis_result = await pattern_detection_service.analyze_patterns(
-            image=image,
+        # Per-droplet detections are only built when the response will include them
+        include_detections = field_selected(
+            "pattern_analysis.individual_detections",
+            parse_fields(fields),
+            SUMMARY_OMITTED_FIELDS["analyze-patterns"] if detail == "summary" else ()
+        )
+        
+        # Serve repeated uploads from the result cache (keyed on the model version, so a reload invalidates it)
+        checkpoints = pattern_detection_service.checkpoint_versions()
+        cache_key = result_cache.make_key(
+            "analyze-patterns",
+            image,
             min_area=min_area,
             max_area=max_area,
-            confidence_threshold=confidence_threshold
+            confidence_threshold=confidence_threshold,
+            profile=inference_profile.name,
+            detections=include_detections,
+            models=checkpoints
         )
+        cached_response = _cached_response(cache_key, "analyze-patterns", fields, detail)
+        if cached_response is not None:
+            return cached_response
+        
+        # Perform pattern detection and classification
+        async with admission.admit("analyze-patterns"):
+            pattern_analysis_result = await pattern_detection_service.analyze_patterns(
+                image=image,
+                min_area=min_area,
+                max_area=max_area,
+                confidence_threshold=confidence_threshold,
+                profile=inference_profile,
+                include_detections=include_detections
+            )
         
         # If analysis failed, return early
         if not pattern_analysis_result.get('success', False):
@@ -232,19 +633,219 @@ async def analyze_pattern_detection(
             "timestamp": pattern_analysis_result['timestamp']
         }
         
-        return JSONResponse(content=final_response)
+        if _served_checkpoints(final_response["pattern_analysis"], checkpoints):
+            result_cache.set(cache_key, final_response)
+        
+        return _respond("analyze-patterns", final_response, fields, detail)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Pattern analysis failed: {str(e)}")
 
+@router.post("/analyze-pattern-sequence")
+@profiled
+async def analyze_pattern_sequence(
+    files: List[UploadFile] = File(...),  # time-lapse frames of one field, in order
+    min_area: Optional[int] = Form(50),
+    max_area: Optional[int] = Form(5000),
+    confidence_threshold: Optional[float] = Form(0.5),
+    change_threshold: Optional[float] = Form(None),  # default SEQUENCE_CHANGE_THRESHOLD
+    iou_threshold: Optional[float] = Form(None),  # default SEQUENCE_IOU_THRESHOLD
+    frame_interval_seconds: Optional[float] = Form(None),  # adds times to the droplet timelines
+    profile: Optional[str] = Form(None),  # "fast", "balanced" or "accurate"
+    fields: Optional[str] = Form(None),  # comma-separated dotted paths to return
+    detail: Optional[str] = Form("full"),  # "summary" (no per-frame or per-droplet detail) or "full"
+    async_mode: bool = Form(False, alias="async")  # run as a background job
+):
+    """
+    Analyze a time-lapse of one LC slide - track droplets across frames and return per-droplet pattern timelines
+    """
+    await _resolved(pattern_detection_service)
+    model_status = pattern_detection_service.check_models_available()
+    if not model_status['models_ready']:
+        raise HTTPException(
+            status_code=503, 
+            detail="Pattern detection service is not available. Model files are missing."
+        )
+    
+    if not files:
+        raise HTTPException(status_code=400, detail="No frames uploaded")
+    if len(files) > settings.SEQUENCE_MAX_FRAMES:
+        raise HTTPException(status_code=400, detail=f"Too many frames (max {settings.SEQUENCE_MAX_FRAMES})")
+    for file in files:
+        if file.content_type not in ["image/jpeg", "image/png", "image/webp"]:
+            raise HTTPException(status_code=400, detail="Invalid file type. Please upload JPEG, PNG, or WebP images.")
+        if file.size and file.size > settings.MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=400, detail="File too large")
+    
+    inference_profile = _resolve_profile(profile)
+    detail = _resolve_detail(detail)
+    
+    uploads = [await file.read() for file in files]
+    if async_mode:
+        return await _submit_job(
+            "analyze-pattern-sequence",
+            pack_uploads(uploads),
+            min_area=min_area,
+            max_area=max_area,
+            confidence_threshold=confidence_threshold,
+            change_threshold=change_threshold,
+            iou_threshold=iou_threshold,
+            frame_interval_seconds=frame_interval_seconds,
+            inference_profile=inference_profile.name,
+            fields=fields,
+            detail=detail
+        )
+    
+    return await _analyze_pattern_sequence(
+        uploads, min_area, max_area, confidence_threshold, change_threshold, iou_threshold,
+        frame_interval_seconds, inference_profile, fields=fields, detail=detail
+    )
+
+async def _analyze_pattern_sequence(
+    uploads: List[bytes],
+    min_area: Optional[int],
+    max_area: Optional[int],
+    confidence_threshold: Optional[float],
+    change_threshold: Optional[float],
+    iou_threshold: Optional[float],
+    frame_interval_seconds: Optional[float],
+    inference_profile: InferenceProfile,
+    fields: Optional[str] = None,
+    detail: str = "full"
+) -> JSONResponse:
+    """Analyze uploaded time-lapse frames (request or background job)"""
+    await _resolved(pattern_detection_service)
+    try:
+        frames = [_decode_image(contents) for contents in uploads]
+        
+        async with admission.admit("analyze-pattern-sequence"):
+            sequence_result = await pattern_detection_service.analyze_pattern_sequence(
+                frames,
+                min_area=min_area,
+                max_area=max_area,
+                confidence_threshold=confidence_threshold,
+                change_threshold=settings.SEQUENCE_CHANGE_THRESHOLD if change_threshold is None else change_threshold,
+                iou_threshold=settings.SEQUENCE_IOU_THRESHOLD if iou_threshold is None else iou_threshold,
+                frame_interval=frame_interval_seconds,
+                profile=inference_profile
+            )
+        
+        if not sequence_result.get('success', False):
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "status": "error",
+                    "message": sequence_result.get('message', 'Sequence analysis failed'),
+                    "sequence_analysis": sequence_result.get('sequence_analysis', {})
+                }
+            )
+        
+        analysis = sequence_result['sequence_analysis']
+        return _respond("analyze-pattern-sequence", {
+            "status": "success",
+            "sequence_analysis": analysis,
+            "summary": {
+                "frames": analysis['frames_analyzed'],
+                "droplets_tracked": analysis['droplets_tracked'],
+                "droplets_with_transitions": sum(1 for droplet in analysis['droplets'] if droplet['transitions']),
+                "classifications_run": analysis['classifications_run'],
+                "reuse_ratio": analysis['reuse_ratio']
+            },
+            "timestamp": sequence_result['timestamp']
+        }, fields, detail)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sequence analysis failed: {str(e)}")
+
+job_runner.register("analyze-image", _job_handler(_analyze_image))
+job_runner.register("analyze-hemoglobin", _job_handler(_analyze_hemoglobin))
+job_runner.register("analyze-patterns", _job_handler(_analyze_patterns))
+job_runner.register("analyze-hemoglobin-sequence", _sequence_job_handler(_analyze_hemoglobin_sequence))
+job_runner.register("analyze-pattern-sequence", _sequence_job_handler(_analyze_pattern_sequence))
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Poll a background analysis job; wait > 0 long-polls until it finishes or the wait expires
+    """
+    job = await job_runner.wait(job_id, min(max(wait, 0), settings.JOBS_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/health-check")
 async def health_check():
     """Check if the service is running"""
     return {"status": "healthy", "service": "Luna Health AI"}
 
+@router.get("/inference-profiles")
+async def list_inference_profiles():
+    """List the available inference profiles and caption presets, the deployment default and the inference slots"""
+    return {
+        "default": settings.INFERENCE_PROFILE,
+        "profiles": {name: asdict(profile) for name, profile in INFERENCE_PROFILES.items()},
+        "caption_presets": {name: asdict(preset) for name, preset in CAPTION_PRESETS.items()},
+        "executor": inference_executor.describe(),
+        "workers": inference_workers.describe()
+    }
+
+@router.get("/admission-stats")
+async def admission_stats():
+    """Report in-flight cost, queue depth and current Retry-After per model pool"""
+    return {"enabled": admission.enabled, "pools": admission.stats()}
+
+@router.get("/cache-stats")
+async def cache_stats():
+    """Report result cache size and hit rates per endpoint"""
+    return result_cache.stats()
+
+@router.get("/models")
+async def model_versions():
+    """Report the served version, checkpoint version and retired versions still in use of each model"""
+    await _resolved(nail_hemoglobin_service, pattern_detection_service)
+    return {
+        "nail": await nail_hemoglobin_service.describe_models(),
+        "pattern": await pattern_detection_service.describe_models()
+    }
+
+@router.post("/models/reload")
+async def reload_models(force: bool = False):
+    """Reload models whose checkpoint changed (all with force=true), swapping them in without downtime"""
+    await _resolved(nail_hemoglobin_service, pattern_detection_service)
+    try:
+        return {
+            "force": force,
+            "nail": await nail_hemoglobin_service.reload_models(force),
+            "pattern": await pattern_detection_service.reload_models(force)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
+
+@router.get("/llm-stats")
+async def llm_stats():
+    """Report upstream LLM calls and how many identical concurrent calls were coalesced into them"""
+    if not llm_service.loaded:
+        # Not worth building the LLM stack to report that nothing was called yet
+        return {'upstream_calls': 0, 'coalesced_calls': 0, 'in_flight': 0}
+    return llm_service.coalescing_stats()
+
+@router.post("/knowledge/ingest")
+async def ingest_knowledge():
+    """Re-ingest KNOWLEDGE_BASE_DIR, embedding only new or changed chunks, and report throughput"""
+    await _resolved(llm_service)
+    try:
+        return await llm_service.ingest_knowledge()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/pattern-status")
 async def pattern_service_status():
     """Check if the pattern detection service is available"""
+    await _resolved(pattern_detection_service)
     try:
         model_status = pattern_detection_service.check_models_available()
         return {
@@ -267,6 +868,7 @@ async def health_check():
 @router.get("/hemoglobin-status")
 async def hemoglobin_service_status():
     """Check if the nail hemoglobin service is available"""
+    await _resolved(nail_hemoglobin_service)
     try:
         model_status = nail_hemoglobin_service.check_models_available()
         return {
@@ -282,6 +884,7 @@ async def hemoglobin_service_status():
         }
 
 @router.post("/generate-cycle-insight")
+@profiled
 async def generate_cycle_insight(
     current_cycle_day: int,
     cycle_length: int,
@@ -293,20 +896,26 @@ async def generate_cycle_insight(
     """
     Generate personalized cycle insight using LLM
     """
+    await _resolved(llm_service)
     try:
+        # Only the request making the upstream call takes an admission slot;
+        # identical concurrent requests join it instead of queueing
         insight = await llm_service.generate_cycle_insight(
             current_cycle_day=current_cycle_day,
             cycle_length=cycle_length,
             period_length=period_length,
             last_period_date=last_period_date,
             health_goals=health_goals,
-            reproductive_stage=reproductive_stage
+            reproductive_stage=reproductive_stage,
+            admit=lambda: admission.admit("generate-cycle-insight")
         )
         
         return {
             "status": "success",
             "insight": insight
         }
+    except HTTPException:
+        raise
     except Exception as e:
         return {
             "status": "error",
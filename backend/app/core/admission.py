@@ -0,0 +1,198 @@
+# ADMISSION CONTROL
+# Bounded, cost-weighted in-flight limits and queues per model pool
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Endpoint -> (model pool, cost). Costs are relative units of pool capacity:
+# BLIP + ResNet-50 + an LLM call is the most expensive request, contour-based
+# pattern detection with a ResNet18 per droplet the cheapest.
+ADMISSION_POLICIES: Dict[str, Tuple[str, float]] = {
+    'analyze-image': ('vision', 4.0),
+    'analyze-hemoglobin': ('nail', 2.0),
+    'analyze-hemoglobin-sequence': ('nail', 6.0),
+    'analyze-patterns': ('pattern', 1.0),
+    'analyze-pattern-sequence': ('pattern', 4.0),
+    'generate-cycle-insight': ('llm', 1.0),
+}
+
+# Weight of the newest observation in the per-unit service time average
+_EWMA_ALPHA = 0.2
+
+ADMISSION_IN_FLIGHT = registry.gauge(
+    'luna_admission_in_flight_cost', 'Cost units currently admitted, by model pool', ('pool',)
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    'luna_admission_queue_depth', 'Requests waiting for admission, by model pool', ('pool',)
+)
+ADMISSION_QUEUE_WAIT = registry.histogram(
+    'luna_admission_queue_wait_seconds', 'Time admitted requests waited in the queue', ('pool',)
+)
+ADMISSION_REJECTIONS = registry.counter(
+    'luna_admission_rejections_total', 'Requests rejected with 503, by pool, endpoint and reason',
+    ('pool', 'endpoint', 'reason')
+)
+
+
+class AdmissionController:
+    """
+    FIFO admission for one model pool
+
+    Requests hold `cost` units of `capacity` while they run. Requests that do
+    not fit wait in a queue bounded to `queue_capacity` units; beyond that, or
+    after waiting `max_wait` seconds, they are rejected with 503 and a
+    Retry-After estimated from the backlog and the observed service time.
+    """
+
+    def __init__(self, pool: str, capacity: float, queue_capacity: float, max_wait: float):
+        self.pool = pool
+        self.capacity = capacity
+        self.queue_capacity = queue_capacity
+        self.max_wait = max_wait
+        self.in_flight = 0.0
+        self.queued = 0.0
+        self._waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+        self._unit_seconds: Optional[float] = None
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        unit_seconds = self._unit_seconds or 1.0
+        backlog = self.in_flight + self.queued
+        return max(1, math.ceil(backlog * unit_seconds / self.capacity))
+
+    def _reject(self, endpoint: str, reason: str) -> HTTPException:
+        ADMISSION_REJECTIONS.inc(pool=self.pool, endpoint=endpoint, reason=reason)
+        return HTTPException(
+            status_code=503,
+            detail=f"The {self.pool} analysis service is busy, please retry later",
+            headers={"Retry-After": str(self.retry_after())}
+        )
+
+    def _update_gauges(self) -> None:
+        ADMISSION_IN_FLIGHT.set(self.in_flight, pool=self.pool)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), pool=self.pool)
+
+    def _wake(self) -> None:
+        """Admit queued requests, in order, while they fit"""
+        while self._waiters and self.in_flight + self._waiters[0][0] <= self.capacity:
+            cost, future = self._waiters.popleft()
+            self.queued -= cost
+            if future.done():
+                continue
+            self.in_flight += cost
+            future.set_result(None)
+        self._update_gauges()
+
+    def _release(self, cost: float) -> None:
+        self.in_flight -= cost
+        self._wake()
+
+    def _dequeue(self, cost: float, future: asyncio.Future) -> None:
+        try:
+            self._waiters.remove((cost, future))
+        except ValueError:
+            return
+        self.queued -= cost
+        self._wake()
+
+    async def _acquire(self, cost: float, endpoint: str) -> None:
+        if not self._waiters and self.in_flight + cost <= self.capacity:
+            self.in_flight += cost
+            self._update_gauges()
+            return
+
+        if self.queued + cost > self.queue_capacity:
+            raise self._reject(endpoint, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((cost, future))
+        self.queued += cost
+        self._update_gauges()
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait ended; give the units back
+                self._release(cost)
+            else:
+                self._dequeue(cost, future)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(endpoint, "queue_timeout")
+            raise
+        ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - start, pool=self.pool)
+
+    @asynccontextmanager
+    async def admit(self, cost: float, endpoint: str) -> AsyncIterator[None]:
+        """Hold `cost` units for the duration of the block, waiting or rejecting as needed"""
+        # A request bigger than the whole pool could never be admitted otherwise
+        cost = min(cost, self.capacity)
+        await self._acquire(cost, endpoint)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            unit_seconds = (time.perf_counter() - start) / cost
+            if self._unit_seconds is None:
+                self._unit_seconds = unit_seconds
+            else:
+                self._unit_seconds += _EWMA_ALPHA * (unit_seconds - self._unit_seconds)
+            self._release(cost)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'capacity': self.capacity,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'queue_depth': len(self._waiters),
+            'queue_capacity': self.queue_capacity,
+            'retry_after_seconds': self.retry_after()
+        }
+
+
+class AdmissionControl:
+    """Admission controllers for every model pool, looked up by endpoint"""
+
+    def __init__(self, enabled: bool, capacity: float, queue_capacity: float, max_wait: float):
+        self.enabled = enabled
+        self.controllers = {
+            pool: AdmissionController(pool, capacity, queue_capacity, max_wait)
+            for pool in sorted({pool for pool, _ in ADMISSION_POLICIES.values()})
+        }
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionControl":
+        return cls(
+            enabled=settings.ADMISSION_CONTROL_ENABLED,
+            capacity=settings.ADMISSION_CAPACITY,
+            queue_capacity=settings.ADMISSION_QUEUE_CAPACITY,
+            max_wait=settings.ADMISSION_MAX_QUEUE_WAIT_SECONDS
+        )
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str) -> AsyncIterator[None]:
+        """Admit a request to an endpoint's model pool, raising 503 when overloaded"""
+        if not self.enabled:
+            yield
+            return
+
+        pool, cost = ADMISSION_POLICIES[endpoint]
+        async with self.controllers[pool].admit(cost, endpoint):
+            yield
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {pool: controller.stats() for pool, controller in self.controllers.items()}
+
+
+admission = AdmissionControl.from_settings()
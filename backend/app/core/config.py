@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # API Keys
@@ -16,6 +16,109 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".webp"}
     
+    # Result Cache
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_BACKEND: str = "memory"  # "memory" or "disk"
+    RESULT_CACHE_DIR: str = ".cache/results"
+    RESULT_CACHE_MAX_ENTRIES: int = 256
+    RESULT_CACHE_TTL_SECONDS: int = 3600
+    
+    # Pattern Analysis Cache (per-slide contours and crop probabilities; parameter re-sweeps skip detection/classification)
+    PATTERN_CACHE_ENABLED: bool = True
+    PATTERN_CACHE_MAX_IMAGES: int = 32  # slides kept per process (a few KB to a few MB each)
+    
+    # BLIP Caption Engine (per-image captions and vision-encoder outputs; concurrent captions decoded in one batch)
+    CAPTION_CACHE_ENABLED: bool = True
+    CAPTION_CACHE_MAX_ENTRIES: int = 1024  # (image, preset) captions kept per process
+    CAPTION_ENCODER_CACHE_MAX_IMAGES: int = 32  # encoder outputs kept per process (~1.8 MB each)
+    CAPTION_BATCH_MAX_SIZE: int = 8  # images captioned in one generate call
+    CAPTION_BATCH_WAIT_MS: float = 10.0  # how long a batch waits for concurrent captions to join
+    
+    # Retrieval Embeddings
+    EMBEDDINGS_PROVIDER: str = "openai"  # "openai" or "local" (sentence-embedding model on CPU, works offline)
+    EMBEDDINGS_LOCAL_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"  # hub name or local directory
+    EMBEDDINGS_BATCH_SIZE: int = 32  # texts per encoder forward pass / OpenAI request
+    EMBEDDINGS_MAX_LENGTH: int = 256  # tokens per text for the local model
+    
+    # Knowledge Retrieval
+    RETRIEVAL_MODE: str = "hybrid"  # "lexical" (BM25 only, no embedding call), "vector" or "hybrid"
+    RETRIEVAL_HYBRID_ALPHA: float = 0.5  # weight of the vector score in hybrid mode
+    
+    # Knowledge Base Ingestion
+    KNOWLEDGE_BASE_DIR: str = ""  # directory of reference documents (.txt/.md); empty = built-in passages only
+    KNOWLEDGE_STORE_DIR: str = ".cache/knowledge"  # chunks and embeddings from the last ingestion
+    KNOWLEDGE_CHUNK_SIZE: int = 800  # characters per chunk
+    KNOWLEDGE_CHUNK_OVERLAP: int = 100  # characters shared by consecutive chunks
+    KNOWLEDGE_INGEST_CONCURRENCY: int = 4  # embedding batches (EMBEDDINGS_BATCH_SIZE texts) in flight
+    KNOWLEDGE_INGEST_ON_STARTUP: bool = True  # re-ingest in the background at start-up (only changed chunks are embedded)
+    
+    # LLM Prompts
+    LLM_COMPACT_PROMPTS: bool = True  # compact, token-budgeted prompts (false = original verbose prompts)
+    LLM_PROMPT_TOKEN_BUDGET: int = 600  # input tokens per prompt; retrieved context is trimmed to fit
+    
+    # Inference
+    INFERENCE_PROFILE: str = "balanced"  # "fast", "balanced" or "accurate"
+    INFERENCE_SLOTS: int = 0  # concurrent inference slots (0 = cores // threads per slot)
+    INFERENCE_THREADS_PER_SLOT: int = 0  # torch/OpenCV threads per slot (0 = min(4, cores) or cores // slots)
+    INFERENCE_PIN_CORES: bool = False  # pin each slot to its own cores (Linux only)
+    MODEL_OPTIMIZATION_ENABLED: bool = True  # fold BatchNorm and use channels_last at load time
+    MODEL_FREEZE_ENABLED: bool = True  # also trace + freeze the classifiers with TorchScript
+    MODEL_BF16_AUTOCAST: bool = False  # bfloat16 autocast for the vision models (heads/post-processing stay fp32; disables freezing)
+    MODEL_WATCH_ENABLED: bool = True  # hot-reload checkpoints in backend/models/ when they change
+    MODEL_WATCH_INTERVAL_SECONDS: float = 5.0
+    
+    # Inference Worker Processes (optional; one process pool per model family)
+    INFERENCE_WORKERS_ENABLED: bool = False
+    INFERENCE_WORKERS_NAIL: int = 1  # nail detector + hemoglobin predictor
+    INFERENCE_WORKERS_PATTERN: int = 1  # LC pattern classifier
+    INFERENCE_WORKERS_VISION: int = 1  # BLIP + ResNet-50
+    INFERENCE_WORKER_THREADS: int = 0  # torch/OpenCV threads per worker (0 = cores // total workers)
+    INFERENCE_WORKER_TIMEOUT_SECONDS: float = 300.0
+    INFERENCE_WORKER_HEALTH_INTERVAL_SECONDS: float = 10.0
+    
+    # Admission Control (per model pool, in cost units; see app/core/admission.py)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_CAPACITY: float = 8.0  # cost units running at once per pool
+    ADMISSION_QUEUE_CAPACITY: float = 16.0  # cost units allowed to wait per pool
+    ADMISSION_MAX_QUEUE_WAIT_SECONDS: float = 30.0
+    
+    # Time-lapse Pattern Analysis (POST /analyze-pattern-sequence)
+    SEQUENCE_MAX_FRAMES: int = 120
+    SEQUENCE_CHANGE_THRESHOLD: float = 0.06  # mean abs. change of a droplet's 16x16 thumbnail that triggers reclassification
+    SEQUENCE_IOU_THRESHOLD: float = 0.3  # minimum box overlap to link a droplet across frames
+    
+    # Multi-frame Nail Capture (POST /analyze-hemoglobin-sequence)
+    NAIL_SEQUENCE_MAX_FRAMES: int = 90  # longer clips are subsampled evenly
+    NAIL_VIDEO_MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB
+    NAIL_KEYFRAME_INTERVAL: int = 10  # run the nail detector at least every N frames
+    NAIL_TRACK_MIN_SCORE: float = 0.6  # template match score below which a nail is re-detected
+    NAIL_TRACK_MAX_MISSED_KEYFRAMES: int = 2  # keyframes a lost nail may go undetected and still keep its id
+    NAIL_SEQUENCE_MIN_ESTIMATES: int = 3  # nails with fewer per-frame estimates are left out of the average
+    HEMOGLOBIN_BATCH_SIZE: int = 32  # nail crops per hemoglobin forward pass
+    
+    # Background Jobs (submit with async=true, poll /jobs/{job_id})
+    JOBS_DB_PATH: str = ".cache/jobs.sqlite3"
+    JOBS_WORKERS: int = 2  # jobs in progress at once
+    JOBS_TTL_SECONDS: int = 86400  # finished jobs are deleted, unfinished ones failed, after this
+    JOBS_CLEANUP_INTERVAL_SECONDS: int = 600
+    JOBS_LEASE_SECONDS: float = 60.0  # a running job is taken over by another process if not renewed for this long
+    JOBS_MAX_WAIT_SECONDS: float = 30.0  # long-poll cap for GET /jobs/{job_id}?wait=
+    
+    # Startup Warm-up (GET /ready reports not-ready until it finishes)
+    WARMUP_ENABLED: bool = True
+    WARMUP_MODELS: List[str] = ["nail", "pattern", "vision", "llm"]  # "llm" builds the embeddings and vector store
+    WARMUP_ITERATIONS: int = 2  # frozen TorchScript models specialize after their first runs
+    
+    # Request Profiling (opt-in per request via the X-Luna-Profile header)
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: Optional[str] = None  # if set, the header value must match
+    PROFILING_DIR: str = ".profiles"
+    PROFILING_SAMPLE_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_TRACES: int = 50
+    
+    # Memory Accounting (per-stage peaks; always on for profiled requests)
+    MEMORY_ACCOUNTING_ENABLED: bool = False  # account every request of @profiled endpoints (tracemalloc slows allocation-heavy code)
+    
     class Config:
         env_file = ".env"
 
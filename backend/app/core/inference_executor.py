@@ -0,0 +1,161 @@
+# INFERENCE EXECUTOR
+# Runs blocking model inference on a fixed set of slots with partitioned CPU cores
+
+import asyncio
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Callable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.profiling import current_profile, current_torch_profiles
+
+logger = logging.getLogger(__name__)
+
+SLOTS_BUSY = registry.gauge('luna_inference_slots_busy', 'Inference slots currently running a task')
+QUEUE_WAIT = registry.histogram('luna_inference_queue_wait_seconds', 'Time tasks wait for a free inference slot')
+
+
+def available_cores() -> List[int]:
+    """CPU cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_slots(cores: List[int], slots: int = 0, threads_per_slot: int = 0) -> List[List[int]]:
+    """
+    Partition cores among inference slots
+
+    Args:
+        cores: Available core IDs
+        slots: Number of concurrent inference slots (0 = derive from threads_per_slot)
+        threads_per_slot: Intra-op threads per slot (0 = derive from slots)
+
+    Returns:
+        list: One list of core IDs per slot
+    """
+    num_cores = len(cores)
+    if slots <= 0 and threads_per_slot <= 0:
+        threads_per_slot = min(4, num_cores)
+    if slots <= 0:
+        slots = max(1, num_cores // threads_per_slot)
+    if threads_per_slot <= 0:
+        threads_per_slot = max(1, num_cores // slots)
+
+    if slots * threads_per_slot > num_cores:
+        logger.warning(
+            f"{slots} slots x {threads_per_slot} threads oversubscribes {num_cores} cores; "
+            "slots will share cores"
+        )
+
+    return [
+        [cores[(slot * threads_per_slot + i) % num_cores] for i in range(threads_per_slot)]
+        for slot in range(slots)
+    ]
+
+
+def _configure_slot_thread(core_groups: "queue.Queue[List[int]]", pin_cores: bool) -> None:
+    """Thread initializer: claim a core group and size torch/OpenCV thread pools to it"""
+    cores = core_groups.get_nowait()
+
+    if pin_cores and hasattr(os, 'sched_setaffinity'):
+        # Applies to the calling thread; OpenMP workers it spawns inherit the mask
+        os.sched_setaffinity(0, cores)
+
+    try:
+        import torch
+        torch.set_num_threads(len(cores))
+    except ImportError:
+        pass
+
+    try:
+        import cv2
+        cv2.setNumThreads(len(cores))
+    except ImportError:
+        pass
+
+    logger.info(f"{threading.current_thread().name} using cores {cores} (pinned={pin_cores})")
+
+
+class InferenceExecutor:
+    """
+    Fixed pool of inference slots
+
+    Each slot is one worker thread with its own share of the CPU cores; torch
+    and OpenCV intra-op parallelism is limited to that share so concurrent
+    requests do not oversubscribe the machine. Excess tasks queue for a slot.
+    """
+
+    def __init__(self, slots: int = 0, threads_per_slot: int = 0, pin_cores: bool = False,
+                 cores: Optional[List[int]] = None):
+        self.core_groups = plan_slots(cores or available_cores(), slots, threads_per_slot)
+        self.pin_cores = pin_cores
+
+        groups: "queue.Queue[List[int]]" = queue.Queue()
+        for group in self.core_groups:
+            groups.put(group)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.core_groups),
+            thread_name_prefix="inference-slot",
+            initializer=_configure_slot_thread,
+            initargs=(groups, pin_cores)
+        )
+
+    @classmethod
+    def from_settings(cls) -> "InferenceExecutor":
+        return cls(
+            slots=settings.INFERENCE_SLOTS,
+            threads_per_slot=settings.INFERENCE_THREADS_PER_SLOT,
+            pin_cores=settings.INFERENCE_PIN_CORES
+        )
+
+    @property
+    def slots(self) -> int:
+        return len(self.core_groups)
+
+    def _invoke(self, submitted_at: float, fn: Callable, args, kwargs) -> Any:
+        QUEUE_WAIT.observe(time.perf_counter() - submitted_at)
+        SLOTS_BUSY.inc()
+
+        profile = current_profile()
+        if profile is not None:
+            profile.add_thread()
+        torch_profiles = current_torch_profiles()
+        try:
+            if torch_profiles is None:
+                return fn(*args, **kwargs)
+            # Profiled request: record the slot thread's operators
+            with torch_profiles.thread("inference-slot"):
+                return fn(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.remove_thread()
+            SLOTS_BUSY.dec()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on an inference slot and await its result"""
+        context = copy_context()
+        call = functools.partial(context.run, self._invoke, time.perf_counter(), fn, args, kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def describe(self):
+        return {
+            'slots': self.slots,
+            'threads_per_slot': [len(group) for group in self.core_groups],
+            'core_groups': self.core_groups,
+            'pinned': self.pin_cores
+        }
+
+
+inference_executor = InferenceExecutor.from_settings()
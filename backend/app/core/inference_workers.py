@@ -0,0 +1,438 @@
+# INFERENCE WORKER PROCESSES
+# Optional per-model-family process pools fed with images through shared memory
+
+import asyncio
+import functools
+import importlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.inference_executor import available_cores
+from app.core.memory import MemoryAccount, current_account, memory_accounting
+from app.core.metrics import current_endpoint, endpoint_context, registry
+from app.core.profiling import current_torch_profiles, torch_profiles
+
+logger = logging.getLogger(__name__)
+
+# Service class run by each model family's workers
+WORKER_FAMILIES = {
+    'nail': 'app.services.nail_hemoglobin_service:NailHemoglobinService',
+    'pattern': 'app.services.pattern_detection_service:PatternDetectionService',
+    'vision': 'app.services.vision_analysis:VisionAnalysisService',
+}
+
+# Image modes numpy can round-trip without conversion
+_SHAREABLE_MODES = {'L', 'RGB', 'RGBA'}
+
+WORKERS_ALIVE = registry.gauge(
+    'luna_inference_workers_alive', 'Live inference worker processes', ('family',)
+)
+WORKER_RESTARTS = registry.counter(
+    'luna_inference_worker_restarts_total', 'Inference worker processes restarted after a crash or hang', ('family',)
+)
+
+
+class WorkerCrashedError(RuntimeError):
+    """A worker process died or stopped responding while handling a task"""
+
+
+def _share_image(image: Image.Image) -> Tuple[SharedMemory, Dict[str, Any]]:
+    """Copy decoded pixels into a new shared memory block and describe them"""
+    if image.mode not in _SHAREABLE_MODES:
+        image = image.convert('RGB')
+    pixels = np.asarray(image)
+
+    shm = SharedMemory(create=True, size=max(1, pixels.nbytes))
+    np.ndarray(pixels.shape, dtype=pixels.dtype, buffer=shm.buf)[...] = pixels
+    spec = {'name': shm.name, 'shape': pixels.shape, 'dtype': pixels.dtype.str}
+    return shm, spec
+
+
+def _attach_image(spec: Dict[str, Any]) -> Image.Image:
+    """Rebuild an image from a shared memory block written by _share_image"""
+    shm = SharedMemory(name=spec['name'])
+    try:
+        pixels = np.ndarray(spec['shape'], dtype=np.dtype(spec['dtype']), buffer=shm.buf)
+        # fromarray copies into PIL's own buffer, so the block can be released right away
+        image = Image.fromarray(pixels)
+        del pixels
+    finally:
+        shm.close()
+    return image
+
+
+def _worker_main(family: str, conn, threads: int) -> None:
+    """Entry point of a worker process: serve tasks for one model family until told to stop"""
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+    module_name, class_name = WORKER_FAMILIES[family].split(':')
+    service = getattr(importlib.import_module(module_name), class_name)()
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        kind = message[0]
+        if kind == 'stop':
+            break
+        if kind == 'ping':
+            conn.send(('pong', None))
+            continue
+        # Replies carry the counters and histograms recorded while handling the message,
+        # which the API process merges so its /metrics covers the workers too
+        before = registry.snapshot()
+        if kind == 'call':
+            # Image-less service call (e.g. reload_models), sent to every worker by broadcast()
+            _, method, args, kwargs = message
+            try:
+                status, payload = 'ok', getattr(service, method)(*args, **kwargs)
+            except Exception as e:
+                logger.exception(f"{family} worker call {method} failed")
+                status, payload = 'error', f"{type(e).__name__}: {e}"
+            conn.send((status, payload, {'metrics': registry.delta(before)}))
+            continue
+
+        _, method, spec, args, kwargs, context = message
+        account = None
+        try:
+            # A list of specs carries a frame sequence
+            image = [_attach_image(item) for item in spec] if isinstance(spec, list) else _attach_image(spec)
+            accounting = memory_accounting() if context.get('memory_accounting') else nullcontext()
+            with endpoint_context(context.get('endpoint', 'none')), accounting as account, \
+                    torch_profiles(context.get('profile_dir')) as profiles:
+                if profiles is None:
+                    result = getattr(service, method)(image, *args, **kwargs)
+                else:
+                    # Profiled request: parts land in its trace directory, merged by the API process
+                    with profiles.thread(f"{family}-worker"):
+                        result = getattr(service, method)(image, *args, **kwargs)
+            status, payload = 'ok', result
+        except Exception as e:
+            logger.exception(f"{family} worker task {method} failed")
+            status, payload = 'error', f"{type(e).__name__}: {e}"
+        conn.send((status, payload, {
+            'metrics': registry.delta(before),
+            'memory': account.stages if account is not None else None
+        }))
+
+
+class _Worker:
+    """One worker process and the API side of its pipe"""
+
+    def __init__(self, family: str, index: int, threads: int, startup_timeout: float, context):
+        self.family = family
+        self.index = index
+        self.threads = threads
+        self.startup_timeout = startup_timeout
+        self._context = context
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.start()
+
+    def start(self) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main,
+            args=(self.family, child_conn, self.threads),
+            name=f"luna-{self.family}-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self.process is None:
+            return
+        try:
+            self.conn.send(('stop',))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def restart(self) -> None:
+        logger.warning(f"Restarting {self.process.name} (exit code {self.process.exitcode})")
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.start()
+        WORKER_RESTARTS.inc(family=self.family)
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def _receive(self, timeout: float) -> Tuple[str, Any]:
+        if not self.conn.poll(timeout):
+            raise WorkerCrashedError(f"{self.process.name} did not respond within {timeout:.0f}s")
+        return self.conn.recv()
+
+    def _check_ready(self, timeout: float) -> bool:
+        """Consume the startup handshake; False if the worker is still starting"""
+        if not self.ready and self.conn.poll(timeout):
+            status, _ = self.conn.recv()
+            self.ready = status == 'ready'
+        return self.ready
+
+    def call(self, message: tuple, timeout: float) -> Tuple[str, Any, Dict[str, Any]]:
+        """Send a task or call; returns status, payload and what the worker recorded while handling it"""
+        if not self._check_ready(self.startup_timeout):
+            raise WorkerCrashedError(f"{self.process.name} did not start within {self.startup_timeout:.0f}s")
+        self.conn.send(message)
+        status, payload, telemetry = self._receive(timeout)
+        registry.merge(telemetry['metrics'])
+        return status, payload, telemetry
+
+    def ping(self, timeout: float) -> bool:
+        """Health check: alive, and answering if it has finished starting"""
+        if not self.is_alive():
+            return False
+        if not self._check_ready(0):
+            return True
+        self.conn.send(('ping',))
+        status, _ = self._receive(timeout)
+        return status == 'pong'
+
+
+class WorkerPool:
+    """Fixed set of worker processes serving one model family"""
+
+    def __init__(self, family: str, size: int, threads: int, timeout: float, context):
+        self.family = family
+        self.timeout = timeout
+        self.workers = [_Worker(family, index, threads, timeout, context) for index in range(size)]
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def call(self, method: str, image: Union[Image.Image, List[Image.Image]], *args,
+             task_context: Optional[Dict[str, Any]] = None, memory_account: Optional[MemoryAccount] = None,
+             **kwargs) -> Any:
+        """
+        Run a service method on the next idle worker (blocking)
+
+        task_context carries request state (endpoint label, profiling, memory
+        accounting); stages the worker accounted are merged into memory_account.
+        """
+        if isinstance(image, list):
+            shared = [_share_image(frame) for frame in image]
+            spec = [item_spec for _, item_spec in shared]
+        else:
+            shm, spec = _share_image(image)
+            shared = [(shm, spec)]
+        worker = self._idle.get()
+        try:
+            try:
+                status, payload, telemetry = worker.call(
+                    ('task', method, spec, args, kwargs, task_context or {}), self.timeout
+                )
+            except (EOFError, OSError, WorkerCrashedError) as e:
+                worker.restart()
+                raise WorkerCrashedError(f"{self.family} worker failed while running {method}: {e}") from e
+        finally:
+            self._idle.put(worker)
+            for shm, _ in shared:
+                shm.close()
+                shm.unlink()
+
+        if memory_account is not None and telemetry.get('memory'):
+            memory_account.merge(telemetry['memory'])
+        if status != 'ok':
+            raise RuntimeError(payload)
+        return payload
+
+    def broadcast(self, method: str, *args, **kwargs) -> List[Any]:
+        """
+        Run an image-less service method on every worker (blocking)
+
+        Each worker is called as soon as it finishes its current task, so
+        requests keep being served by the others meanwhile. Raises
+        WorkerCrashedError if some worker is not idle within the pool timeout.
+        """
+        results = []
+        called = set()
+        deadline = time.monotonic() + self.timeout
+        while len(called) < len(self.workers):
+            try:
+                worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                worker = None
+            if worker is None or (worker.index in called and time.monotonic() >= deadline):
+                if worker is not None:
+                    self._idle.put(worker)
+                raise WorkerCrashedError(
+                    f"{self.family} worker failed while running {method}: "
+                    f"{len(self.workers) - len(called)} worker(s) did not become idle within {self.timeout:.0f}s"
+                )
+            try:
+                if worker.index in called:
+                    # Only already-called workers are idle; let the busy ones finish
+                    time.sleep(0.05)
+                    continue
+                called.add(worker.index)
+                try:
+                    status, payload, _ = worker.call(('call', method, args, kwargs), self.timeout)
+                except (EOFError, OSError, WorkerCrashedError) as e:
+                    worker.restart()
+                    status, payload = 'error', f"worker failed while running {method}: {e}"
+                results.append(payload if status == 'ok' else {'error': payload})
+                # The timeout bounds each wait for the next idle worker, not the whole broadcast
+                deadline = time.monotonic() + self.timeout
+            finally:
+                self._idle.put(worker)
+        return results
+
+    def check_health(self, ping_timeout: float) -> None:
+        """Restart idle workers that have died or stopped answering pings"""
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                healthy = worker.ping(ping_timeout)
+            except (EOFError, OSError, WorkerCrashedError):
+                healthy = False
+            try:
+                if not healthy:
+                    worker.restart()
+            finally:
+                self._idle.put(worker)
+
+        WORKERS_ALIVE.set(sum(worker.is_alive() for worker in self.workers), family=self.family)
+
+    def stop(self) -> None:
+        for worker in self.workers:
+            worker.stop()
+        WORKERS_ALIVE.set(0, family=self.family)
+
+
+class InferenceWorkers:
+    """
+    Per-model-family worker process pools with a health supervisor
+
+    Disabled until start() is called; services check `handles(family)` and
+    otherwise run inference in-process on the inference executor. Images are copied into
+    shared memory once and rebuilt in the worker instead of being pickled.
+    """
+
+    def __init__(self):
+        self.pools: Dict[str, WorkerPool] = {}
+        self._stop_event = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+
+    def start(self, sizes: Dict[str, int], threads: int = 0, timeout: float = 300.0,
+              health_interval: float = 10.0) -> None:
+        sizes = {family: size for family, size in sizes.items() if size > 0}
+        total = sum(sizes.values())
+        if total == 0:
+            return
+        threads = threads or max(1, len(available_cores()) // total)
+
+        # spawn, not fork: torch/OpenMP thread pools in the API process do not survive fork
+        context = multiprocessing.get_context('spawn')
+        for family, size in sizes.items():
+            self.pools[family] = WorkerPool(family, size, threads, timeout, context)
+            logger.info(f"Started {size} {family} worker process(es) with {threads} thread(s) each")
+
+        self._stop_event.clear()
+        self._supervisor = threading.Thread(
+            target=self._supervise, args=(health_interval,), daemon=True, name="luna-worker-supervisor"
+        )
+        self._supervisor.start()
+
+    def start_from_settings(self) -> None:
+        self.start(
+            sizes={
+                'nail': settings.INFERENCE_WORKERS_NAIL,
+                'pattern': settings.INFERENCE_WORKERS_PATTERN,
+                'vision': settings.INFERENCE_WORKERS_VISION,
+            },
+            threads=settings.INFERENCE_WORKER_THREADS,
+            timeout=settings.INFERENCE_WORKER_TIMEOUT_SECONDS,
+            health_interval=settings.INFERENCE_WORKER_HEALTH_INTERVAL_SECONDS
+        )
+
+    def _supervise(self, interval: float) -> None:
+        while not self._stop_event.wait(interval):
+            for pool in list(self.pools.values()):
+                try:
+                    pool.check_health(ping_timeout=interval)
+                except Exception:
+                    logger.exception(f"Health check of {pool.family} workers failed")
+
+    def handles(self, family: str) -> bool:
+        return family in self.pools
+
+    async def run(self, family: str, method: str, image: Union[Image.Image, List[Image.Image]],
+                  *args, **kwargs) -> Any:
+        """Run a service method in one of the family's worker processes"""
+        profiles = current_torch_profiles()
+        account = current_account()
+        # The executor thread does not inherit the request's context variables, so they travel with the task
+        task_context = {
+            'profile_dir': str(profiles.directory) if profiles is not None else None,
+            'endpoint': current_endpoint(),
+            'memory_accounting': account is not None
+        }
+        call = functools.partial(
+            self.pools[family].call, method, image, *args, task_context=task_context, memory_account=account, **kwargs
+        )
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    async def broadcast(self, family: str, method: str, *args, **kwargs) -> List[Any]:
+        """Run an image-less service method in every one of the family's worker processes"""
+        call = functools.partial(self.pools[family].broadcast, method, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+        for pool in self.pools.values():
+            pool.stop()
+        self.pools = {}
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            family: {
+                'workers': len(pool.workers),
+                'alive': sum(worker.is_alive() for worker in pool.workers),
+                'pids': [worker.process.pid for worker in pool.workers]
+            }
+            for family, pool in self.pools.items()
+        }
+
+
+inference_workers = InferenceWorkers()
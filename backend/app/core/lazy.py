@@ -0,0 +1,47 @@
+# LAZY SERVICES
+# Service singletons created on first use, so importing the app does not import every model stack
+
+import asyncio
+import importlib
+import threading
+from typing import Any, Optional
+
+
+class LazyService:
+    """
+    Stand-in for a service instance, created from a "module:Class" path on first attribute access
+
+    The service module, and the torch / transformers / langchain stack it
+    imports, is only loaded when a request, the warm-up or a worker first
+    uses that pipeline.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._instance: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def resolve(self) -> Any:
+        """The service instance, importing and constructing it on the first call (blocking)"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    module_name, class_name = self._path.split(':')
+                    self._instance = getattr(importlib.import_module(module_name), class_name)()
+        return self._instance
+
+    async def resolve_async(self) -> Any:
+        """resolve() on a default-executor thread, so the event loop never imports or builds a service"""
+        if self._instance is not None:
+            return self._instance
+        return await asyncio.get_running_loop().run_in_executor(None, self.resolve)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        return f"LazyService({self._path!r}, loaded={self.loaded})"
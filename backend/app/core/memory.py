@@ -0,0 +1,204 @@
+# MEMORY ACCOUNTING
+# Peak memory per pipeline stage (tracemalloc, process RSS high-water mark, torch CUDA allocator) for one request
+
+import os
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+MB = 1024 * 1024
+
+# Account of the request being handled; stage_timer reports into it
+_active_account: ContextVar[Optional["MemoryAccount"]] = ContextVar('memory_account', default=None)
+
+# tracemalloc and CUDA peaks are process-wide: every open span (across all requests)
+# absorbs the current peak before anyone resets it, so no span loses its maximum
+_lock = threading.Lock()
+_open_spans: List["_Span"] = []
+_tracing_users = 0
+_owns_tracing = False  # tracemalloc was started here (not by e.g. a benchmark harness)
+_rss_peak_resettable: Optional[bool] = None  # /proc/self/clear_refs accepted a reset; probed on first use
+
+
+def _rss_bytes() -> int:
+    """Current resident set size (0 where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _rss_peak_bytes() -> int:
+    """Peak resident set size since the last _reset_rss_peak() (VmHWM), or the current RSS if it cannot be reset"""
+    if not _rss_peak_resettable:
+        return _rss_bytes()
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return _rss_bytes()
+
+
+def _reset_rss_peak() -> None:
+    """Reset the kernel's RSS high-water mark to the current RSS (Linux 4.0+)"""
+    global _rss_peak_resettable
+    if _rss_peak_resettable is False:
+        return
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        _rss_peak_resettable = True
+    except OSError:
+        _rss_peak_resettable = False
+
+
+def _cuda():
+    """torch.cuda when torch is loaded and has initialized a GPU, else None (never imports torch)"""
+    torch = sys.modules.get('torch')
+    if torch is None or not torch.cuda.is_available() or not torch.cuda.is_initialized():
+        return None
+    return torch.cuda
+
+
+@dataclass
+class _Span:
+    stage: str
+    python_start: int
+    python_peak: int
+    rss_start: int
+    rss_peak: int
+    cuda_start: int
+    cuda_peak: int
+
+
+def _fold_peaks() -> None:
+    python_peak = tracemalloc.get_traced_memory()[1]
+    cuda = _cuda()
+    cuda_peak = cuda.max_memory_allocated() if cuda else 0
+    rss = _rss_peak_bytes()
+    for span in _open_spans:
+        span.python_peak = max(span.python_peak, python_peak)
+        span.cuda_peak = max(span.cuda_peak, cuda_peak)
+        span.rss_peak = max(span.rss_peak, rss)
+
+
+class MemoryAccount:
+    """
+    Peak memory of each pipeline stage in one request
+
+    Per stage, in bytes above what was allocated when the stage started:
+
+    - python: tracemalloc peak; Python objects and numpy arrays (PIL images
+      and torch CPU tensors are not traced)
+    - rss: peak process resident memory, from the kernel's high-water mark
+      (reset at every stage boundary); covers PIL images and torch CPU
+      tensors, which tracemalloc does not see. Memory malloc reuses from
+      buffers freed earlier is not counted, so numbers are only comparable
+      between runs of the same sequence in a fresh process (see
+      benchmarks/memory_budget.py). Where the mark cannot be reset, RSS is
+      sampled at stage boundaries instead
+    - cuda: torch CUDA allocator peak (only when a GPU is in use)
+
+    The counters are process-wide, so allocations of concurrent requests are
+    included; measure on an otherwise idle instance for exact numbers.
+    Stages run in an inference worker process are accounted there and
+    merged in with merge(). A stage entered
+    several times keeps its largest peak; "request" covers the whole request.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, int]] = {}
+        self._request_span: Optional[_Span] = None
+
+    def begin(self, stage: str) -> _Span:
+        with _lock:
+            _fold_peaks()
+            tracemalloc.reset_peak()
+            cuda = _cuda()
+            if cuda:
+                cuda.reset_peak_memory_stats()
+            _reset_rss_peak()
+            python_now = tracemalloc.get_traced_memory()[0]
+            cuda_now = cuda.memory_allocated() if cuda else 0
+            rss_now = _rss_bytes()
+            span = _Span(stage, python_now, python_now, rss_now, rss_now, cuda_now, cuda_now)
+            _open_spans.append(span)
+            return span
+
+    def end(self, span: _Span) -> Dict[str, int]:
+        with _lock:
+            _fold_peaks()
+            _open_spans.remove(span)
+        usage = {
+            'python_peak_bytes': span.python_peak - span.python_start,
+            'rss_peak_bytes': max(0, span.rss_peak - span.rss_start),
+            'cuda_peak_bytes': span.cuda_peak - span.cuda_start
+        }
+        recorded = self.stages.setdefault(span.stage, dict.fromkeys(usage, 0))
+        for key, value in usage.items():
+            recorded[key] = max(recorded[key], value)
+        return usage
+
+    def merge(self, stages: Dict[str, Dict[str, int]]) -> None:
+        """Fold in the stages another process accounted for this request, keeping each stage's largest peaks"""
+        for stage, usage in stages.items():
+            recorded = self.stages.setdefault(stage, dict.fromkeys(usage, 0))
+            for key, value in usage.items():
+                recorded[key] = max(recorded.get(key, 0), value)
+
+    def start(self) -> None:
+        global _tracing_users, _owns_tracing
+        with _lock:
+            if _tracing_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _owns_tracing = True
+            _tracing_users += 1
+        self._request_span = self.begin("request")
+
+    def stop(self) -> None:
+        global _tracing_users, _owns_tracing
+        if self._request_span is not None:
+            self.end(self._request_span)
+            self._request_span = None
+        with _lock:
+            _tracing_users -= 1
+            if _tracing_users == 0 and _owns_tracing:
+                tracemalloc.stop()
+                _owns_tracing = False
+
+    def describe(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage peaks in MB, for debug responses"""
+        show_cuda = _cuda() is not None
+        return {
+            stage: {
+                'python_peak_mb': round(usage['python_peak_bytes'] / MB, 3),
+                'rss_peak_mb': round(usage['rss_peak_bytes'] / MB, 3),
+                **({'cuda_peak_mb': round(usage['cuda_peak_bytes'] / MB, 3)} if show_cuda else {})
+            }
+            for stage, usage in self.stages.items()
+        }
+
+
+def current_account() -> Optional[MemoryAccount]:
+    return _active_account.get()
+
+
+@contextmanager
+def memory_accounting() -> Iterator[MemoryAccount]:
+    """Account the memory of every stage_timer stage run inside the block"""
+    account = MemoryAccount()
+    token = _active_account.set(account)
+    account.start()
+    try:
+        yield account
+    finally:
+        _active_account.reset(token)
+        account.stop()
@@ -0,0 +1,366 @@
+# METRICS
+# Dependency-free counters, gauges and histograms with Prometheus text exposition
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.memory import current_account
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Endpoint label for everything recorded while handling a request
+_current_endpoint: ContextVar[str] = ContextVar('current_endpoint', default='none')
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+    def _state(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _changes(self, before: Dict[Tuple[str, ...], float]) -> Dict[Tuple[str, ...], float]:
+        return {
+            key: value - before.get(key, 0.0) for key, value in self._state().items() if value != before.get(key, 0.0)
+        }
+
+    def _merge(self, changes: Dict[Tuple[str, ...], float]) -> None:
+        with self._lock:
+            for key, amount in changes.items():
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], list] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] += value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+
+        samples = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', repr(float(bound))))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            samples.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {cumulative}")
+            samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return samples
+
+    def _state(self) -> Dict[Tuple[str, ...], Tuple[list, float]]:
+        with self._lock:
+            return {key: (list(counts), self._sums[key]) for key, counts in self._counts.items()}
+
+    def _changes(self, before: Dict[Tuple[str, ...], Tuple[list, float]]) -> Dict[Tuple[str, ...], Tuple[list, float]]:
+        changes = {}
+        for key, (counts, total) in self._state().items():
+            before_counts, before_total = before.get(key, ([0] * len(counts), 0.0))
+            if counts != before_counts:
+                changes[key] = ([now - then for now, then in zip(counts, before_counts)], total - before_total)
+        return changes
+
+    def _merge(self, changes: Dict[Tuple[str, ...], Tuple[list, float]]) -> None:
+        with self._lock:
+            for key, (counts, total) in changes.items():
+                merged = self._counts.get(key)
+                if merged is None:
+                    merged = self._counts[key] = [0] * (len(self.buckets) + 1)
+                    self._sums[key] = 0.0
+                for index, count in enumerate(counts):
+                    merged[index] += count
+                self._sums[key] += total
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together at /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counter and histogram values, to take the changes since with delta()"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric._state() for metric in metrics if isinstance(metric, (Counter, Histogram))}
+
+    def delta(self, snapshot: Dict[str, Any]) -> List[tuple]:
+        """
+        Counter and histogram changes since snapshot(), picklable for merge() in another process
+
+        Gauges describe the process that set them (its readiness, its live
+        workers), so they are not included.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        delta = []
+        for metric in metrics:
+            if not isinstance(metric, (Counter, Histogram)):
+                continue
+            changes = metric._changes(snapshot.get(metric.name, {}))
+            if changes:
+                buckets = getattr(metric, 'buckets', None)
+                delta.append((metric.type_name, metric.name, metric.documentation, metric.labelnames, buckets, changes))
+        return delta
+
+    def merge(self, delta: List[tuple]) -> None:
+        """Add changes recorded by another process (see delta()), registering metrics only it had defined"""
+        for type_name, name, documentation, labelnames, buckets, changes in delta:
+            if type_name == 'histogram':
+                metric = self.histogram(name, documentation, labelnames, buckets)
+            else:
+                metric = self.counter(name, documentation, labelnames)
+            metric._merge(changes)
+
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.histogram(
+    'luna_request_duration_seconds', 'End-to-end HTTP request latency', ('endpoint', 'method', 'status')
+)
+STAGE_DURATION = registry.histogram(
+    'luna_stage_duration_seconds', 'Latency of individual pipeline stages', ('endpoint', 'stage')
+)
+STAGE_PEAK_MEMORY = registry.histogram(
+    'luna_stage_peak_memory_bytes', 'Peak memory of pipeline stages in memory-accounted requests, by source',
+    ('endpoint', 'stage', 'source'),
+    buckets=tuple(2 ** power * 1024 * 1024 for power in range(0, 13))  # 1 MB .. 4 GB
+)
+ERRORS = registry.counter(
+    'luna_errors_total', 'Errors raised or handled inside pipeline stages', ('endpoint', 'stage')
+)
+NAILS_DETECTED = registry.counter(
+    'luna_nails_detected_total', 'Nails detected by the nail detector', ('endpoint',)
+)
+PATTERNS_DETECTED = registry.counter(
+    'luna_patterns_detected_total', 'LC droplet patterns detected, by class', ('endpoint', 'pattern')
+)
+CACHE_REQUESTS = registry.counter(
+    'luna_result_cache_requests_total', 'Result cache lookups, by outcome', ('endpoint', 'result')
+)
+
+
+def current_endpoint() -> str:
+    return _current_endpoint.get()
+
+
+@contextmanager
+def endpoint_context(endpoint: str) -> Iterator[None]:
+    """Label everything recorded inside the block with an endpoint"""
+    token = _current_endpoint.set(endpoint)
+    try:
+        yield
+    finally:
+        _current_endpoint.reset(token)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Record the duration of a pipeline stage, counting an error if it raises
+
+    In memory-accounted requests the stage's peak memory is recorded too.
+    """
+    account = current_account()
+    span = account.begin(stage) if account is not None else None
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, endpoint=current_endpoint(), stage=stage)
+        if span is not None:
+            usage = account.end(span)
+            endpoint = current_endpoint()
+            STAGE_PEAK_MEMORY.observe(usage['python_peak_bytes'], endpoint=endpoint, stage=stage, source='python')
+            STAGE_PEAK_MEMORY.observe(usage['rss_peak_bytes'], endpoint=endpoint, stage=stage, source='rss')
+            if usage['cuda_peak_bytes']:
+                STAGE_PEAK_MEMORY.observe(usage['cuda_peak_bytes'], endpoint=endpoint, stage=stage, source='cuda')
+
+
+def record_error(stage: str) -> None:
+    """Count an error handled inside a stage (for code paths that do not re-raise)"""
+    ERRORS.inc(endpoint=current_endpoint(), stage=stage)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware labelling each request with its route and timing it
+
+    The route template (e.g. /api/v1/health/analyze-image) is used as the
+    endpoint label so path parameters cannot blow up label cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_label(self, scope) -> str:
+        from starlette.routing import Match
+
+        router = scope['app'].router if 'app' in scope else None
+        for route in getattr(router, 'routes', []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, 'path', scope['path'])
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._route_label(scope)
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        with endpoint_context(endpoint):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                REQUEST_DURATION.observe(
+                    time.perf_counter() - start,
+                    endpoint=endpoint,
+                    method=scope['method'],
+                    status=str(status['code'])
+                )
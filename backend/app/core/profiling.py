@@ -0,0 +1,320 @@
+# REQUEST PROFILING
+# Opt-in per-request Python sampling + torch operator profiles, stored locally
+
+import functools
+import inspect
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.memory import MemoryAccount, memory_accounting
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Luna-Profile"
+TRACE_ID_HEADER = "X-Luna-Trace-Id"
+
+# Profile of the request being handled, so worker threads can register themselves
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar('active_profile', default=None)
+
+# Operator profiles of the request being handled (also set inside worker processes)
+_active_torch_profiles: ContextVar[Optional["TorchProfiles"]] = ContextVar('active_torch_profiles', default=None)
+
+# torch.profiler cannot be nested, so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+class _StackSampler(threading.Thread):
+    """Periodically samples the Python stacks of a set of threads"""
+
+    def __init__(self, interval_seconds: float):
+        super().__init__(daemon=True, name="luna-request-profiler")
+        self.interval_seconds = interval_seconds
+        self.thread_ids = set()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class TorchProfiles:
+    """
+    torch operator profiles of one request, recorded on the threads that run its inference
+
+    torch.profiler's CPU callbacks only record the thread that started the
+    profiler, so each inference slot, caption dispatcher or worker process
+    profiles its own part of the request and stores it as a part file in the
+    request's directory; merge() combines the parts. Only one thread per
+    process profiles at a time, since torch.profiler cannot be nested.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def thread(self, label: str) -> Iterator[None]:
+        """Record the operators the calling thread runs during the block"""
+        try:
+            import torch
+        except ImportError:
+            yield
+            return
+        if not self._lock.acquire(blocking=False):
+            # Another thread of this request is being profiled
+            yield
+            return
+        try:
+            profiler = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU],
+                record_shapes=True,
+                profile_memory=True  # per-operator CPU allocations in torch_ops.txt
+            )
+            with profiler:
+                yield
+            self._write_part(profiler, label)
+        finally:
+            self._lock.release()
+
+    def _write_part(self, profiler, label: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{label}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        profiler.export_chrome_trace(str(self.directory / f"torch_trace.{name}.json"))
+        with open(self.directory / f"torch_ops.{name}.txt", 'w') as f:
+            f.write(f"# {label} (pid {os.getpid()}, thread {threading.current_thread().name})\n")
+            f.write(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=50))
+
+    def merge(self) -> List[str]:
+        """Combine the part files into torch_trace.json and torch_ops.txt; returns the parts' labels"""
+        trace_parts = sorted(self.directory.glob('torch_trace.*.json'), key=lambda p: p.stat().st_mtime)
+        ops_parts = sorted(self.directory.glob('torch_ops.*.txt'), key=lambda p: p.stat().st_mtime)
+        if not trace_parts:
+            return []
+
+        events = []
+        for path in trace_parts:
+            try:
+                with open(path, 'r') as f:
+                    events.extend(json.load(f).get('traceEvents', []))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable torch trace {path.name}: {e}")
+        with open(self.directory / "torch_trace.json", 'w') as f:
+            json.dump({'traceEvents': events}, f)
+        with open(self.directory / "torch_ops.txt", 'w') as f:
+            f.write('\n\n'.join(path.read_text() for path in ops_parts))
+
+        for path in trace_parts + ops_parts:
+            path.unlink(missing_ok=True)
+        return [path.name[len('torch_trace.'):-len('.json')] for path in trace_parts]
+
+
+def current_torch_profiles() -> Optional[TorchProfiles]:
+    return _active_torch_profiles.get()
+
+
+@contextmanager
+def torch_profiles(directory: Optional[str]) -> Iterator[Optional[TorchProfiles]]:
+    """Collect operator profiles into a request's directory for the block (no-op if None; worker processes)"""
+    if directory is None:
+        yield None
+        return
+    profiles = TorchProfiles(Path(directory))
+    token = _active_torch_profiles.set(profiles)
+    try:
+        yield profiles
+    finally:
+        _active_torch_profiles.reset(token)
+
+
+class RequestProfile:
+    """Python sampling profile plus torch operator profiles for one request"""
+
+    def __init__(self, endpoint: str, memory: Optional[MemoryAccount] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.memory = memory
+        self.directory = Path(settings.PROFILING_DIR) / self.trace_id
+        self._sampler = _StackSampler(settings.PROFILING_SAMPLE_INTERVAL_MS / 1000)
+        self.torch = TorchProfiles(self.directory)
+        self._torch_parts: List[str] = []
+        self._started_at = 0.0
+        self._duration = 0.0
+
+    def add_thread(self, thread_id: Optional[int] = None) -> None:
+        """Include a thread (default: the calling thread) in the sampling profile"""
+        self._sampler.thread_ids.add(thread_id or threading.get_ident())
+
+    def remove_thread(self, thread_id: Optional[int] = None) -> None:
+        self._sampler.thread_ids.discard(thread_id or threading.get_ident())
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+        self.add_thread()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._duration = time.perf_counter() - self._started_at
+        self._sampler.stop()
+        self._write()
+
+    def _write(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Collapsed stacks, loadable by flamegraph.pl / speedscope
+        with open(self.directory / "python_stacks.folded", 'w') as f:
+            for stack, count in self._sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # Operator profiles recorded on the inference threads and worker processes
+        self._torch_parts = self.torch.merge()
+
+        with open(self.directory / "meta.json", 'w') as f:
+            json.dump({
+                'trace_id': self.trace_id,
+                'endpoint': self.endpoint,
+                'duration_seconds': self._duration,
+                'python_samples': self._sampler.samples,
+                'sample_interval_ms': settings.PROFILING_SAMPLE_INTERVAL_MS,
+                'torch_profile': bool(self._torch_parts),
+                'torch_profile_parts': self._torch_parts,
+                'memory': self.memory.describe() if self.memory is not None else None,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            }, f, indent=2)
+
+        _prune_old_traces()
+        logger.info(f"Stored request profile {self.trace_id} for {self.endpoint} in {self.directory}")
+
+
+def _prune_old_traces() -> None:
+    """Keep only the newest PROFILING_MAX_TRACES trace directories"""
+    root = Path(settings.PROFILING_DIR)
+    traces = sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime)
+    for path in traces[:max(0, len(traces) - settings.PROFILING_MAX_TRACES)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _active_profile.get()
+
+
+def _profiling_requested(request: Request) -> bool:
+    value = request.headers.get(PROFILE_HEADER)
+    if not value:
+        return False
+    if settings.PROFILING_TOKEN:
+        return value == settings.PROFILING_TOKEN
+    return value.lower() in ("1", "true", "yes")
+
+
+def _attach_debug(response, trace_id: str, memory: Dict[str, Dict[str, float]]):
+    """Add the trace ID and per-stage memory to a JSON body, and the trace ID to the response headers"""
+    if isinstance(response, dict):
+        return {**response, "trace_id": trace_id, "memory": memory}
+
+    if isinstance(response, JSONResponse):
+        body = json.loads(response.body)
+        if isinstance(body, dict):
+            body["trace_id"] = trace_id
+            body["memory"] = memory
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "content-type")}
+        headers[TRACE_ID_HEADER] = trace_id
+        return JSONResponse(content=body, status_code=response.status_code, headers=headers)
+
+    return response
+
+
+def profiled(endpoint):
+    """
+    Decorator enabling opt-in profiling of an endpoint
+
+    When PROFILING_ENABLED is off the endpoint is returned unchanged, so there
+    is no per-request cost. When on, requests carrying the X-Luna-Profile header
+    (matching PROFILING_TOKEN if one is configured) are profiled, and the trace
+    ID and per-stage peak memory are returned in the body (the trace ID also in
+    the X-Luna-Trace-Id header). With MEMORY_ACCOUNTING_ENABLED every request
+    records per-stage peak memory in the metrics.
+    """
+    if not settings.PROFILING_ENABLED and not settings.MEMORY_ACCOUNTING_ENABLED:
+        return endpoint
+
+    signature = inspect.signature(endpoint)
+    request_param = next(
+        (name for name, param in signature.parameters.items() if param.annotation is Request),
+        None
+    )
+    injected_param = request_param is None
+    if injected_param:
+        request_param = "profiling_request"
+        signature = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(request_param, inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        ])
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        request = kwargs.pop(request_param) if injected_param else kwargs[request_param]
+
+        profiling = (
+            settings.PROFILING_ENABLED and _profiling_requested(request) and _profile_lock.acquire(blocking=False)
+        )
+        if not profiling:
+            if not settings.MEMORY_ACCOUNTING_ENABLED:
+                return await endpoint(**kwargs)
+            with memory_accounting():
+                return await endpoint(**kwargs)
+
+        with memory_accounting() as memory:
+            profile = RequestProfile(request.url.path, memory)
+            token = _active_profile.set(profile)
+            torch_token = _active_torch_profiles.set(profile.torch)
+            profile.start()
+            try:
+                response = await endpoint(**kwargs)
+            except HTTPException as e:
+                e.headers = {**(e.headers or {}), TRACE_ID_HEADER: profile.trace_id}
+                raise
+            finally:
+                _active_torch_profiles.reset(torch_token)
+                _active_profile.reset(token)
+                try:
+                    profile.stop()
+                finally:
+                    _profile_lock.release()
+
+        return _attach_debug(response, profile.trace_id, memory.describe())
+
+    wrapper.__signature__ = signature
+    return wrapper
@@ -0,0 +1,119 @@
+# RESPONSE SERIALIZATION
+# Fast JSON encoding with native numpy support, and field selection for large analysis responses
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder below produces the same JSON, more slowly
+    orjson = None
+
+DETAIL_LEVELS = ("summary", "full")
+
+# Leaf marker in a field tree
+_LEAF = True
+FieldTree = Dict[str, Union["FieldTree", bool]]
+
+
+def _default(value: Any) -> Any:
+    """Encode the numpy and container types analysis results carry"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON; numpy scalars and arrays are encoded natively, without a tolist() pass"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated dotted paths ("summary,pattern_analysis.pattern_counts"); None selects everything"""
+    if not fields:
+        return None
+    return [path.strip() for path in fields.split(",") if path.strip()]
+
+
+def _covers(prefix: str, path: str) -> bool:
+    return path == prefix or path.startswith(prefix + ".")
+
+
+def field_selected(path: str, fields: Optional[Sequence[str]] = None, omit: Sequence[str] = ()) -> bool:
+    """Whether select_fields() with these arguments keeps any part of the value at path"""
+    if any(_covers(omitted, path) for omitted in omit):
+        return False
+    return not fields or any(_covers(field, path) or _covers(path, field) for field in fields)
+
+
+def _field_tree(paths: Sequence[str]) -> FieldTree:
+    tree: FieldTree = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split(".")
+        for part in parents:
+            child = node.get(part)
+            if child is _LEAF:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = _LEAF
+    return tree
+
+
+def _keep(value: Any, tree: Union[FieldTree, bool]) -> Any:
+    if tree is _LEAF:
+        return value
+    if isinstance(value, list):
+        return [_keep(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: _keep(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+def _drop(value: Any, tree: FieldTree) -> Any:
+    if isinstance(value, list):
+        return [_drop(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, item in value.items():
+        subtree = tree.get(key)
+        if subtree is _LEAF:
+            continue
+        result[key] = _drop(item, subtree) if subtree else item
+    return result
+
+
+def select_fields(content: Dict[str, Any], fields: Optional[Sequence[str]] = None,
+                  omit: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Project a response onto the given dotted field paths, then drop the `omit` paths
+
+    Paths descend through lists element-wise ("pattern_analysis.individual_detections.class").
+    Only dicts along a selected or omitted path are rebuilt; every other
+    sub-tree is shared with the input, not copied. "status" is always kept.
+    """
+    if fields:
+        content = _keep(content, _field_tree(["status", *fields]))
+    if omit:
+        content = _drop(content, _field_tree(omit))
+    return content
@@ -0,0 +1,57 @@
+# SINGLE-FLIGHT
+# Coalesces identical concurrent async calls into one in-flight call
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.core.metrics import registry
+
+SINGLE_FLIGHT_CALLS = registry.counter(
+    'luna_single_flight_calls_total', 'Coalescable calls, by group and whether they ran or joined an in-flight call',
+    ('group', 'outcome')
+)
+
+
+class SingleFlight:
+    """
+    Shares one in-flight call among concurrent callers with the same key
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it runs await the same task and receive its result or exception.
+    Nothing is cached: once the call finishes, the next caller starts a new
+    one. Waiters are shielded, so a cancelled caller (e.g. a client that
+    disconnected) does not cancel the call for the others.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.calls += 1
+            SINGLE_FLIGHT_CALLS.inc(group=self.group, outcome='executed')
+        else:
+            self.coalesced += 1
+            SINGLE_FLIGHT_CALLS.inc(group=self.group, outcome='coalesced')
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'upstream_calls': self.calls,
+            'coalesced_calls': self.coalesced,
+            'in_flight': len(self._in_flight)
+        }
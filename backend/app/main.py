@@ -1,11 +1,19 @@
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings
+from app.core.inference_executor import inference_executor
+from app.core.inference_workers import inference_workers
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.serialization import FastJSONResponse
 from app.api.endpoints import health_analysis
+from app.services.jobs import job_runner
+from app.services.warmup import run_warmup, warmup_state
 
-app = FastAPI(title=settings.APP_NAME)
+app = FastAPI(title=settings.APP_NAME, default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -16,6 +24,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-endpoint request and stage metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(
     health_analysis.router,
@@ -23,6 +34,54 @@ app.include_router(
     tags=["health-analysis"]
 )
 
+@app.on_event("startup")
+async def start_inference_workers():
+    if settings.INFERENCE_WORKERS_ENABLED:
+        inference_workers.start_from_settings()
+
+@app.on_event("startup")
+async def start_warmup():
+    # Runs in the background so liveness checks pass while models warm up
+    app.state.warmup_task = asyncio.create_task(run_warmup({
+        "nail": health_analysis.nail_hemoglobin_service,
+        "pattern": health_analysis.pattern_detection_service,
+        "vision": health_analysis.vision_service,
+        "llm": health_analysis.llm_service,
+    }))
+
+@app.on_event("startup")
+async def start_knowledge_ingestion():
+    # Picks up documents added since the last run; only changed chunks are embedded
+    if settings.KNOWLEDGE_BASE_DIR and settings.KNOWLEDGE_INGEST_ON_STARTUP:
+        app.state.ingestion_task = asyncio.create_task(_ingest_knowledge())
+
+async def _ingest_knowledge():
+    llm_service = await health_analysis.llm_service.resolve_async()
+    return await llm_service.ingest_knowledge()
+
+@app.on_event("startup")
+async def start_job_runner():
+    await job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    await job_runner.stop()
+
+@app.on_event("shutdown")
+async def shutdown_inference_executor():
+    inference_workers.stop()
+    inference_executor.shutdown(wait=False)
+
 @app.get("/")
 async def root():
-    return {"message": "Luna Health AI API is running"}
\ No newline at end of file
+    return {"message": "Luna Health AI API is running"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 until the startup warm-up has finished"""
+    return JSONResponse(status_code=200 if warmup_state.ready else 503, content=warmup_state.describe())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, stage and pipeline metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,295 @@
+# BLIP CAPTION ENGINE
+# Captions and vision-encoder outputs cached per image, queued captions decoded in one batched generate call
+
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from PIL import Image
+
+from app.core.config import settings
+from app.core.inference_executor import inference_executor
+from app.core.metrics import registry
+from app.core.profiling import TorchProfiles, current_torch_profiles
+from app.services.inference_profiles import CaptionPreset
+from app.services.model_optimization import inference_autocast
+from app.services.result_cache import image_fingerprint
+
+CAPTION_CACHE_REQUESTS = registry.counter(
+    'luna_caption_cache_requests_total',
+    'Caption engine cache lookups: captions per image and preset, vision-encoder outputs per image, by outcome',
+    ('kind', 'result')
+)
+CAPTION_BATCH_SIZE = registry.histogram(
+    'luna_caption_batch_size', 'Images captioned per BLIP generate call', buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32)
+)
+
+
+class _LRU:
+    """Bounded mapping evicting the least recently used entry (thread-safe)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _Batch:
+    """Uncached images of queued requests to caption together with one preset"""
+
+    def __init__(self, preset: CaptionPreset):
+        self.preset = preset
+        self.keys: List[str] = []
+        self.images: List[Image.Image] = []
+        self.waiters: List[List[Future]] = []
+        self.profiles: Optional[TorchProfiles] = None  # of a profiled request in the batch
+
+    def add(self, key: str, image: Image.Image, future: Future, profiles: Optional[TorchProfiles]) -> None:
+        """Queue an image's caption for a request (identical uploads share one)"""
+        self.profiles = self.profiles or profiles
+        if key in self.keys:
+            self.waiters[self.keys.index(key)].append(future)
+            return
+        self.keys.append(key)
+        self.images.append(image)
+        self.waiters.append([future])
+
+
+class CaptionEngine:
+    """
+    BLIP captioning with per-image caches and batching across concurrent requests
+
+    Captions are cached per (image fingerprint, preset) and vision-encoder
+    outputs per image, so captioning an image again with another preset only
+    runs the text decoder.
+
+    Requests go into a queue served by one dispatcher thread. It takes the
+    first waiting request, collects whatever else arrives within batch_wait_ms
+    (at most batch_max_size images per preset), then runs one encoder pass over
+    the uncached images and one generate call per preset. Requests arriving
+    while it generates are queued for the next batch. Callers only hold a
+    future, so an async caller (caption_async) keeps no inference slot while
+    it waits.
+    """
+
+    def __init__(self, processor, model, max_captions: int = 1024, max_encoder_outputs: int = 32,
+                 batch_max_size: int = 8, batch_wait_ms: float = 10.0, cache_enabled: bool = True,
+                 threads: int = 0):
+        self.processor = processor
+        self.model = model
+        self.batch_max_size = max(1, batch_max_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self.cache_enabled = cache_enabled
+        self.threads = threads
+        self._captions = _LRU(max_captions if cache_enabled else 0)
+        self._encoder_outputs = _LRU(max_encoder_outputs if cache_enabled else 0)
+        self._queue: "queue.Queue[Tuple[Image.Image, CaptionPreset, Future, Optional[TorchProfiles]]]" = queue.Queue()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, image: Image.Image, preset: CaptionPreset) -> Future:
+        """Queue an image for captioning; the future resolves to its caption"""
+        future: Future = Future()
+        self._ensure_dispatcher()
+        self._queue.put((image, preset, future, current_torch_profiles()))
+        return future
+
+    def caption(self, image: Image.Image, preset: CaptionPreset, use_cache: bool = True) -> str:
+        """
+        Caption an image (blocking)
+
+        Args:
+            image: PIL Image
+            preset: Decoding settings
+            use_cache: False bypasses the caches and batching (warm-up, benchmarks)
+
+        Returns:
+            str: The caption
+        """
+        if not use_cache:
+            return self._generate([''], [image], preset, use_cache=False)[0]
+        if current_torch_profiles() is not None:
+            # Profiled request: caption on this (profiled) thread, unbatched
+            key = image_fingerprint(image)
+            caption = self._cached_caption(key, preset) if self.cache_enabled else None
+            return caption if caption is not None else self._generate([key], [image], preset)[0]
+        return self.submit(image, preset).result()
+
+    async def caption_async(self, image: Image.Image, preset: CaptionPreset) -> str:
+        """Caption an image without blocking the event loop or an inference slot"""
+        return await asyncio.wrap_future(self.submit(image, preset))
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True, name="luna-caption-dispatcher")
+                self._dispatcher.start()
+
+    def _dispatch(self) -> None:
+        if self.threads > 0:
+            # Sized like an inference slot, so batches do not oversubscribe the cores
+            torch.set_num_threads(self.threads)
+        while True:
+            pending: Dict[str, _Batch] = {}
+            full = self._admit(self._queue.get(), pending)
+            deadline = time.perf_counter() + self.batch_wait
+            while pending and not full:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                full = self._admit(request, pending)
+            for batch in pending.values():
+                self._run(batch)
+
+    def _admit(self, request: Tuple[Image.Image, CaptionPreset, Future, Optional[TorchProfiles]],
+               pending: Dict[str, _Batch]) -> bool:
+        """Answer a request from the cache or add it to its preset's batch; True once that batch is full"""
+        image, preset, future, profiles = request
+        if not future.set_running_or_notify_cancel():
+            return False  # the caller gave up
+        try:
+            key = image_fingerprint(image)
+            caption = self._cached_caption(key, preset) if self.cache_enabled else None
+        except Exception as e:
+            future.set_exception(e)
+            return False
+        if caption is not None:
+            future.set_result(caption)
+            return False
+        batch = pending.setdefault(preset.name, _Batch(preset))
+        batch.add(key, image, future, profiles)
+        return len(batch.keys) >= self.batch_max_size
+
+    def _cached_caption(self, key: str, preset: CaptionPreset) -> Optional[str]:
+        caption = self._captions.get((key, preset.name))
+        CAPTION_CACHE_REQUESTS.inc(kind="caption", result="hit" if caption is not None else "miss")
+        return caption
+
+    def _run(self, batch: _Batch) -> None:
+        """Caption a batch and resolve the futures of every request in it"""
+        try:
+            if batch.profiles is None:
+                captions = self._generate(batch.keys, batch.images, batch.preset)
+            else:
+                # A profiled request is in the batch: record the dispatcher's operators for it
+                with batch.profiles.thread("caption-dispatcher"):
+                    captions = self._generate(batch.keys, batch.images, batch.preset)
+        except Exception as e:
+            for futures in batch.waiters:
+                for future in futures:
+                    future.set_exception(e)
+            return
+        for caption, futures in zip(captions, batch.waiters):
+            for future in futures:
+                future.set_result(caption)
+
+    def _generate(self, keys: List[str], images: List[Image.Image], preset: CaptionPreset,
+                  use_cache: bool = True) -> List[str]:
+        CAPTION_BATCH_SIZE.observe(len(images))
+        use_cache = use_cache and self.cache_enabled
+        with torch.no_grad(), inference_autocast(self.model.device):
+            image_embeds = self._image_embeds(keys, images, use_cache)
+            output_ids = self._decode(image_embeds, preset)
+        captions = self.processor.batch_decode(output_ids, skip_special_tokens=True)
+        if use_cache:
+            for key, caption in zip(keys, captions):
+                self._captions.put((key, preset.name), caption)
+        return captions
+
+    def _image_embeds(self, keys: List[str], images: List[Image.Image], use_cache: bool) -> torch.Tensor:
+        """Vision-encoder outputs (batch, patches, hidden), encoding only the images not cached"""
+        embeds = [self._encoder_outputs.get(key) if use_cache else None for key in keys]
+        if use_cache:
+            for embed in embeds:
+                CAPTION_CACHE_REQUESTS.inc(kind="encoder", result="hit" if embed is not None else "miss")
+
+        missing = [index for index, embed in enumerate(embeds) if embed is None]
+        if missing:
+            pixel_values = self.processor(
+                images=[images[index] for index in missing], return_tensors="pt"
+            )["pixel_values"].to(self.model.device)
+            encoded = self.model.vision_model(pixel_values=pixel_values)[0]
+            for index, embed in zip(missing, encoded):
+                embeds[index] = embed
+                if use_cache:
+                    self._encoder_outputs.put(keys[index], embed)
+        # Cached outputs may predate a MODEL_BF16_AUTOCAST change
+        return torch.stack([embed.to(embeds[-1].dtype) for embed in embeds])
+
+    def _decode(self, image_embeds: torch.Tensor, preset: CaptionPreset) -> torch.Tensor:
+        """BlipForConditionalGeneration.generate from precomputed vision-encoder outputs"""
+        config = self.model.config.text_config
+        image_attention_mask = torch.ones(image_embeds.shape[:-1], dtype=torch.long, device=image_embeds.device)
+        input_ids = torch.full(
+            (image_embeds.shape[0], 1), config.bos_token_id, dtype=torch.long, device=image_embeds.device
+        )
+        return self.model.text_decoder.generate(
+            input_ids=input_ids,
+            eos_token_id=config.sep_token_id,
+            pad_token_id=config.pad_token_id,
+            encoder_hidden_states=image_embeds,
+            encoder_attention_mask=image_attention_mask,
+            max_length=preset.max_length,
+            num_beams=preset.num_beams
+        )
+
+    def clear(self) -> None:
+        self._captions.clear()
+        self._encoder_outputs.clear()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'cache_enabled': self.cache_enabled,
+            'captions': len(self._captions),
+            'encoder_outputs': len(self._encoder_outputs),
+            'batch_max_size': self.batch_max_size,
+            'batch_wait_ms': self.batch_wait * 1000,
+            'queued': self._queue.qsize()
+        }
+
+
+def create_caption_engine(processor, model) -> CaptionEngine:
+    return CaptionEngine(
+        processor,
+        model,
+        max_captions=settings.CAPTION_CACHE_MAX_ENTRIES,
+        max_encoder_outputs=settings.CAPTION_ENCODER_CACHE_MAX_IMAGES,
+        batch_max_size=settings.CAPTION_BATCH_MAX_SIZE,
+        batch_wait_ms=settings.CAPTION_BATCH_WAIT_MS,
+        cache_enabled=settings.CAPTION_CACHE_ENABLED,
+        threads=len(inference_executor.core_groups[0])
+    )
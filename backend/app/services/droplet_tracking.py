@@ -0,0 +1,232 @@
+# DROPLET TRACKING
+# Frame-to-frame droplet association and change detection for time-lapse pattern analysis
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+BBox = Tuple[int, int, int, int]
+
+# boxes -> [(class name, confidence)], one classifier call per frame; it cuts the crops
+# itself, so a frame's crops are never all held at once
+BatchClassifier = Callable[[List[BBox]], List[Tuple[str, float]]]
+
+# Side of the grayscale thumbnail used to decide whether a droplet's crop changed
+SIGNATURE_SIZE = 16
+
+
+def bbox_iou_matrix(boxes_a: Sequence[BBox], boxes_b: Sequence[BBox]) -> np.ndarray:
+    """Pairwise IoU of two lists of (x, y, w, h) boxes"""
+    if not len(boxes_a) or not len(boxes_b):
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+
+    a = np.asarray(boxes_a, dtype=np.float32)
+    b = np.asarray(boxes_b, dtype=np.float32)
+    ax1, ay1, ax2, ay2 = a[:, 0:1], a[:, 1:2], a[:, 0:1] + a[:, 2:3], a[:, 1:2] + a[:, 3:4]
+    bx1, by1, bx2, by2 = b[:, 0], b[:, 1], b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    intersection = inter_w * inter_h
+    union = (a[:, 2:3] * a[:, 3:4]) + (b[:, 2] * b[:, 3]) - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+def crop_signature(crop: Image.Image) -> np.ndarray:
+    """Small normalized grayscale thumbnail of a crop, insensitive to pixel noise and 1-2 px jitter"""
+    thumbnail = crop.convert('L').resize((SIGNATURE_SIZE, SIGNATURE_SIZE), Image.Resampling.BILINEAR)
+    return np.asarray(thumbnail, dtype=np.float32) / 255.0
+
+
+def signature_change(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference between two crop signatures, in [0, 1]"""
+    return float(np.abs(a - b).mean())
+
+
+class DropletTrack:
+    """One droplet followed across frames, with the classification it was last given"""
+
+    def __init__(self, track_id: int, bbox: BBox, frame_index: int):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.missed = 0
+        self.pattern: Optional[str] = None
+        self.confidence = 0.0
+        # Signature of the crop the current classification was made on
+        self.reference_signature: Optional[np.ndarray] = None
+        self.observations: List[Dict[str, Any]] = []
+
+    def observe(self, frame_index: int, bbox: BBox, reclassified: bool, change: Optional[float]) -> None:
+        self.bbox = bbox
+        self.last_frame = frame_index
+        self.missed = 0
+        self.observations.append({
+            'frame': frame_index,
+            'bbox': list(bbox),
+            'class': self.pattern,
+            'confidence': self.confidence,
+            'reclassified': reclassified,
+            'change': None if change is None else round(change, 4)
+        })
+
+    def states(self) -> List[Dict[str, Any]]:
+        """Runs of consecutive observations with the same class"""
+        states: List[Dict[str, Any]] = []
+        for observation in self.observations:
+            if states and states[-1]['class'] == observation['class']:
+                states[-1]['end_frame'] = observation['frame']
+                states[-1]['frames'] += 1
+            else:
+                states.append({
+                    'class': observation['class'],
+                    'start_frame': observation['frame'],
+                    'end_frame': observation['frame'],
+                    'frames': 1
+                })
+        return states
+
+    def describe(self, frame_interval: Optional[float] = None) -> Dict[str, Any]:
+        states = self.states()
+        transitions = [
+            {'frame': current['start_frame'], 'from': previous['class'], 'to': current['class']}
+            for previous, current in zip(states, states[1:])
+        ]
+        if frame_interval is not None:
+            for item in states:
+                item['start_seconds'] = item['start_frame'] * frame_interval
+                item['end_seconds'] = item['end_frame'] * frame_interval
+            for item in transitions:
+                item['seconds'] = item['frame'] * frame_interval
+
+        return {
+            'droplet_id': self.track_id,
+            'first_frame': self.first_frame,
+            'last_frame': self.last_frame,
+            'current_class': self.pattern,
+            'current_confidence': self.confidence,
+            'states': states,
+            'transitions': transitions,
+            'observations': self.observations
+        }
+
+
+class DropletTracker:
+    """
+    Associates droplet boxes across frames and reclassifies only changed droplets
+
+    Boxes are matched to live tracks greedily by IoU. A matched droplet keeps
+    its previous classification unless its crop signature has drifted more
+    than change_threshold from the crop it was last classified on; unmatched
+    boxes start new tracks and are always classified. Tracks missing for more
+    than max_missed consecutive frames are closed.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, change_threshold: float = 0.06, max_missed: int = 2):
+        self.iou_threshold = iou_threshold
+        self.change_threshold = change_threshold
+        self.max_missed = max_missed
+        self.tracks: List[DropletTrack] = []
+        self.closed: List[DropletTrack] = []
+        self.classifications = 0
+        self.observations = 0
+        self._next_id = 0
+
+    def associate(self, bboxes: Sequence[BBox]) -> Tuple[List[Tuple[DropletTrack, int]], List[int]]:
+        """
+        Match boxes to live tracks
+
+        Returns:
+            tuple: ([(track, box index)], [indices of unmatched boxes])
+        """
+        iou = bbox_iou_matrix([track.bbox for track in self.tracks], bboxes)
+        matches: List[Tuple[DropletTrack, int]] = []
+        used_tracks, used_boxes = set(), set()
+
+        # Greedy assignment in order of decreasing overlap
+        track_indices, box_indices = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[track_indices, box_indices], kind='stable')
+        for t, b in zip(track_indices[order].tolist(), box_indices[order].tolist()):
+            if t in used_tracks or b in used_boxes:
+                continue
+            used_tracks.add(t)
+            used_boxes.add(b)
+            matches.append((self.tracks[t], b))
+
+        unmatched = [index for index in range(len(bboxes)) if index not in used_boxes]
+        return matches, unmatched
+
+    def step(self, frame_index: int, bboxes: Sequence[BBox], signatures: Sequence[Optional[np.ndarray]],
+             classify: BatchClassifier) -> Dict[str, Any]:
+        """
+        Advance the tracker by one frame
+
+        Args:
+            frame_index: Index of the frame in the sequence
+            bboxes: Droplet boxes detected in the frame
+            signatures: crop_signature() of each box's crop (None if the box was empty)
+            classify: Batched classifier, called once with the boxes that need (re)classification
+
+        Returns:
+            dict: Per-frame summary (droplets, reclassified, new, lost)
+        """
+        matches, unmatched = self.associate(bboxes)
+
+        for index in unmatched:
+            track = DropletTrack(self._next_id, bboxes[index], frame_index)
+            self._next_id += 1
+            self.tracks.append(track)
+            matches.append((track, index))
+
+        pending: List[Tuple[DropletTrack, int, Optional[np.ndarray], Optional[float]]] = []
+        unchanged: List[Tuple[DropletTrack, int, float]] = []
+        for track, index in matches:
+            signature = signatures[index]
+            if track.reference_signature is None or signature is None:
+                pending.append((track, index, signature, None))
+                continue
+            change = signature_change(track.reference_signature, signature)
+            if change > self.change_threshold:
+                pending.append((track, index, signature, change))
+            else:
+                unchanged.append((track, index, change))
+
+        if pending:
+            results = classify([bboxes[index] for _, index, _, _ in pending])
+            for (track, index, signature, change), (class_name, confidence) in zip(pending, results):
+                track.pattern, track.confidence = class_name, confidence
+                track.reference_signature = signature
+                track.observe(frame_index, bboxes[index], True, change)
+        for track, index, change in unchanged:
+            track.observe(frame_index, bboxes[index], False, change)
+
+        # Age out tracks that were not seen in this frame
+        seen = {id(track) for track, _ in matches}
+        lost = 0
+        live = []
+        for track in self.tracks:
+            if id(track) not in seen:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    self.closed.append(track)
+                    lost += 1
+                    continue
+            live.append(track)
+        self.tracks = live
+
+        self.classifications += len(pending)
+        self.observations += len(matches)
+        return {
+            'frame': frame_index,
+            'droplets': len(matches),
+            'new': len(unmatched),
+            'reclassified': len(pending),
+            'lost': lost
+        }
+
+    def timelines(self, frame_interval: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Per-droplet state timelines for every track seen so far, in order of appearance"""
+        tracks = sorted(self.closed + self.tracks, key=lambda track: track.track_id)
+        return [track.describe(frame_interval) for track in tracks]
@@ -0,0 +1,117 @@
+# EMBEDDINGS PROVIDERS
+# Pluggable text embeddings for retrieval: OpenAI API or a local sentence-embedding model on CPU
+
+import logging
+import threading
+from typing import List, Optional
+
+from langchain.embeddings.base import Embeddings
+
+from app.core.config import settings
+from app.core.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSentenceEmbeddings(Embeddings):
+    """
+    Sentence embeddings from a local transformer encoder (mean pooling, L2-normalized)
+
+    Works with any Hugging Face sentence-transformers checkpoint, by hub name
+    or local directory. Texts are encoded in batches sorted by length, so
+    each batch pads as little as possible. The model, and torch/transformers,
+    are loaded on first use.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, max_length: int = 256,
+                 device: Optional[str] = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.device = device
+        self.tokenizer = None
+        self.model = None
+        self._load_lock = threading.Lock()
+
+    def _load_model(self) -> None:
+        if self.model is not None:
+            return
+        with self._load_lock:
+            if self.model is not None:
+                return
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+
+            with stage_timer("model_load"):
+                logger.info(f"Loading local embedding model {self.model_name}...")
+                self.device = torch.device(self.device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                model = AutoModel.from_pretrained(self.model_name).to(self.device).eval()
+                for param in model.parameters():
+                    param.requires_grad_(False)
+                self.model = model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        import torch
+
+        self._load_model()
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch = self.tokenizer(
+                [texts[index] for index in indices],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors='pt'
+            ).to(self.device)
+            with torch.inference_mode():
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                pooled = torch.nn.functional.normalize(pooled, dim=1)
+            for index, vector in zip(indices, pooled.cpu().tolist()):
+                vectors[index] = vector
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def warm_up(self) -> None:
+        self.embed_query("warm-up")
+
+
+_local_embeddings: Optional[LocalSentenceEmbeddings] = None
+_local_lock = threading.Lock()
+
+
+def create_embeddings() -> Embeddings:
+    """
+    Build the embeddings provider configured in settings
+
+    The local model is shared by every caller in the process.
+    """
+    global _local_embeddings
+    if settings.EMBEDDINGS_PROVIDER == "local":
+        with _local_lock:
+            if _local_embeddings is None:
+                _local_embeddings = LocalSentenceEmbeddings(
+                    settings.EMBEDDINGS_LOCAL_MODEL,
+                    batch_size=settings.EMBEDDINGS_BATCH_SIZE,
+                    max_length=settings.EMBEDDINGS_MAX_LENGTH
+                )
+            return _local_embeddings
+    if settings.EMBEDDINGS_PROVIDER != "openai":
+        raise ValueError(f"Unknown EMBEDDINGS_PROVIDER {settings.EMBEDDINGS_PROVIDER!r} (expected 'openai' or 'local')")
+    from langchain.embeddings import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        openai_api_key=settings.OPENAI_API_KEY,
+        chunk_size=settings.EMBEDDINGS_BATCH_SIZE
+    )
@@ -0,0 +1,171 @@
+# HYBRID RETRIEVER
+# BM25 inverted index over the knowledge base, optionally fused with vector similarity
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+from app.core.config import settings
+from app.core.metrics import stage_timer
+from app.services.embeddings import create_embeddings
+
+RETRIEVAL_MODES = ("lexical", "vector", "hybrid")
+_CHROMA_BATCH = 1000  # documents per Chroma insert; large inserts exceed its batch limit
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i if in into is it its me my of on or
+should so that the their them these they this to was what when which with without you your
+""".split())
+_SUFFIXES = ("ing", "ion", "ed")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, lightly stemmed ("infections" and "infected" -> "infect")"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        for suffix in _SUFFIXES:
+            if len(token) > len(suffix) + 3 and token.endswith(suffix):
+                token = token[:-len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed document list, with a precomputed inverted index"""
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(texts)
+        # term -> [(document index, term frequency)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for index, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings[term].append((index, frequency))
+        average = (sum(lengths) / len(lengths)) if lengths else 0.0
+        # Length normalization per document, so scoring only multiplies and adds
+        self._norms = [k1 * (1 - b + b * length / average) if average else k1 for length in lengths]
+        self.idf = {
+            term: math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """BM25 score of every document sharing at least one term with the query"""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self.postings[term]:
+                scores[index] += idf * frequency * (self.k1 + 1) / (frequency + self._norms[index])
+        return scores
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        return sorted(self.scores(query).items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def _min_max(scores: Dict[int, float]) -> Dict[int, float]:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {index: 1.0 for index in scores}
+    return {index: (score - low) / (high - low) for index, score in scores.items()}
+
+
+class HybridRetriever:
+    """
+    Knowledge-base retriever with three modes (RETRIEVAL_MODE)
+
+    - lexical: BM25 only; no embedding call, and no vector store is built
+    - vector: embedding similarity through Chroma (the original behaviour)
+    - hybrid: min-max normalized BM25 and vector scores, mixed with weight
+      RETRIEVAL_HYBRID_ALPHA on the vector side
+
+    `vectors` optionally supplies precomputed document embeddings (aligned
+    with documents, None where missing), e.g. from knowledge-base ingestion.
+    """
+
+    def __init__(self, documents: Sequence[Document], collection_name: str, mode: Optional[str] = None,
+                 alpha: Optional[float] = None, vectors: Optional[Sequence[Optional[Sequence[float]]]] = None):
+        self.mode = mode or settings.RETRIEVAL_MODE
+        if self.mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown RETRIEVAL_MODE {self.mode!r} (expected one of {', '.join(RETRIEVAL_MODES)})")
+        self.alpha = settings.RETRIEVAL_HYBRID_ALPHA if alpha is None else alpha
+
+        # Tag documents with their position so vector hits map back to the lexical index
+        self.documents = [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, 'doc_id': index})
+            for index, doc in enumerate(documents)
+        ]
+        self.index = BM25Index([doc.page_content for doc in self.documents])
+
+        self.embeddings = None
+        self.vectorstore = None
+        if self.mode != "lexical":
+            self.embeddings = create_embeddings()
+            self.vectorstore = self._build_vectorstore(collection_name, vectors)
+
+    def _build_vectorstore(self, collection_name: str, vectors: Optional[Sequence[Optional[Sequence[float]]]]):
+        # Deferred: chromadb is only imported by the vector and hybrid modes
+        from langchain.vectorstores import Chroma
+
+        if vectors is None:
+            return Chroma.from_documents(self.documents, self.embeddings, collection_name=collection_name)
+
+        vectors = list(vectors)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.embeddings.embed_documents([self.documents[index].page_content for index in missing])
+            for index, vector in zip(missing, embedded):
+                vectors[index] = vector
+
+        vectorstore = Chroma(collection_name=collection_name, embedding_function=self.embeddings)
+        for start in range(0, len(self.documents), _CHROMA_BATCH):
+            batch = self.documents[start:start + _CHROMA_BATCH]
+            vectorstore._collection.upsert(
+                ids=[str(doc.metadata['doc_id']) for doc in batch],
+                embeddings=[[float(x) for x in vector] for vector in vectors[start:start + _CHROMA_BATCH]],
+                documents=[doc.page_content for doc in batch],
+                metadatas=[doc.metadata for doc in batch]
+            )
+        return vectorstore
+
+    def retrieve(self, query: str, k: int = 3) -> List[Document]:
+        """The k passages most relevant to the query, best first"""
+        if self.mode == "lexical":
+            with stage_timer("retrieval"):
+                return [self.documents[index] for index, _ in self.index.search(query, k)]
+
+        with stage_timer("embedding"):
+            query_embedding = self.embeddings.embed_query(query)
+
+        with stage_timer("retrieval"):
+            if self.mode == "vector":
+                return self.vectorstore.similarity_search_by_vector(query_embedding, k=k)
+
+            candidates = min(len(self.documents), max(4 * k, 20))
+            hits = self.vectorstore.similarity_search_by_vector_with_relevance_scores(query_embedding, k=candidates)
+            # Chroma returns distances; smaller is closer
+            vector = _min_max({doc.metadata['doc_id']: -distance for doc, distance in hits})
+            lexical = _min_max(self.index.scores(query))
+
+            fused = {
+                index: self.alpha * vector.get(index, 0.0) + (1 - self.alpha) * lexical.get(index, 0.0)
+                for index in set(vector) | set(lexical)
+            }
+            ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
+            return [self.documents[index] for index, _ in ranked]
@@ -0,0 +1,120 @@
+# INFERENCE PROFILES
+# Named speed/accuracy presets shared by the vision model services
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class CaptionPreset:
+    """BLIP decoding settings"""
+
+    name: str
+    max_length: int
+    num_beams: int
+
+
+CAPTION_PRESETS: Dict[str, CaptionPreset] = {
+    # Greedy decoding of a short caption; the cheapest useful description
+    "greedy-short": CaptionPreset(name="greedy-short", max_length=20, num_beams=1),
+    "greedy": CaptionPreset(name="greedy", max_length=50, num_beams=1),
+    # Beam search; several times the decoder cost of greedy
+    "beam": CaptionPreset(name="beam", max_length=50, num_beams=3),
+}
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    """Inference knobs applied consistently across the model services"""
+
+    name: str
+
+    # Faster R-CNN nail detector (torchvision test-time defaults are 1000/1000/100)
+    rpn_pre_nms_top_n: int
+    rpn_post_nms_top_n: int
+    detections_per_img: int
+    # The same in every profile: a calibration of the trained detector; detections_per_img
+    # already bounds the nails regressed, so raising it would only drop nails, not time
+    nail_confidence_threshold: float
+
+    # ResNet18 classifiers (hemoglobin regressor and pattern classifier)
+    classifier_input_size: int
+
+    # Contour-based droplet detection (crops are resized to classifier_input_size whatever
+    # the expand ratio, so it costs no time; a wider merge distance folds contour fragments
+    # of one droplet into one crop, and can join droplets lying closer than it)
+    pattern_expand_ratio: float
+    pattern_merge_distance: int
+
+    # BLIP captioning (a CAPTION_PRESETS name)
+    caption_preset: str
+
+    @property
+    def caption(self) -> CaptionPreset:
+        return CAPTION_PRESETS[self.caption_preset]
+
+
+INFERENCE_PROFILES: Dict[str, InferenceProfile] = {
+    # Fewer proposals, smaller classifier inputs and fewer droplet crops; noticeably faster on CPU
+    "fast": InferenceProfile(
+        name="fast",
+        rpn_pre_nms_top_n=300,
+        rpn_post_nms_top_n=100,
+        detections_per_img=10,
+        nail_confidence_threshold=0.5,
+        classifier_input_size=160,
+        pattern_expand_ratio=0.4,
+        pattern_merge_distance=45,
+        caption_preset="greedy-short"
+    ),
+    # Training-time input size, proposal counts sized for at most 10 nails
+    "balanced": InferenceProfile(
+        name="balanced",
+        rpn_pre_nms_top_n=500,
+        rpn_post_nms_top_n=200,
+        detections_per_img=10,
+        nail_confidence_threshold=0.5,
+        classifier_input_size=224,
+        pattern_expand_ratio=0.4,
+        pattern_merge_distance=30,
+        caption_preset="greedy"
+    ),
+    # Library defaults everywhere, beam search for captions
+    "accurate": InferenceProfile(
+        name="accurate",
+        rpn_pre_nms_top_n=1000,
+        rpn_post_nms_top_n=1000,
+        detections_per_img=100,
+        nail_confidence_threshold=0.5,
+        classifier_input_size=224,
+        pattern_expand_ratio=0.4,
+        pattern_merge_distance=30,
+        caption_preset="beam"
+    ),
+}
+
+
+def get_inference_profile(profile: Optional[Union[str, InferenceProfile]] = None) -> InferenceProfile:
+    """
+    Resolve an inference profile
+
+    Args:
+        profile: Profile name, an InferenceProfile, or None for the deployment default
+
+    Returns:
+        InferenceProfile: The resolved profile
+
+    Raises:
+        ValueError: If the profile name is unknown
+    """
+    if isinstance(profile, InferenceProfile):
+        return profile
+
+    name = profile or settings.INFERENCE_PROFILE
+    if name not in INFERENCE_PROFILES:
+        raise ValueError(
+            f"Unknown inference profile '{name}'. Available profiles: {', '.join(INFERENCE_PROFILES)}"
+        )
+    return INFERENCE_PROFILES[name]
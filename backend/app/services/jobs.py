@@ -0,0 +1,363 @@
+# BACKGROUND JOBS
+# Durable SQLite-backed job store and a local runner for async analyses
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import endpoint_context, registry
+
+logger = logging.getLogger(__name__)
+
+# (upload bytes, params) -> (HTTP status code, JSON body)
+JobHandler = Callable[[bytes, Dict[str, Any]], Awaitable[Tuple[int, Any]]]
+
+_UPLOAD_LENGTH = struct.Struct('>Q')
+
+JOBS_SUBMITTED = registry.counter('luna_jobs_submitted_total', 'Background jobs submitted', ('endpoint',))
+JOBS_FINISHED = registry.counter('luna_jobs_finished_total', 'Background jobs finished, by outcome', ('endpoint', 'status'))
+JOB_DURATION = registry.histogram('luna_job_duration_seconds', 'Background job run time', ('endpoint',))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    payload BLOB,
+    status_code INTEGER,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# Columns added after the first schema, for databases created before them
+_ADDED_COLUMNS = {'owner': 'TEXT', 'lease_until': 'REAL'}
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+
+def pack_uploads(uploads: List[bytes]) -> bytes:
+    """One job payload holding several uploaded files (sequence endpoints), each prefixed with its length"""
+    return b''.join(_UPLOAD_LENGTH.pack(len(upload)) + upload for upload in uploads)
+
+
+def unpack_uploads(payload: bytes) -> List[bytes]:
+    """The uploaded files of a payload built by pack_uploads, in order"""
+    uploads, offset = [], 0
+    while offset < len(payload):
+        (length,) = _UPLOAD_LENGTH.unpack_from(payload, offset)
+        offset += _UPLOAD_LENGTH.size
+        uploads.append(payload[offset:offset + length])
+        offset += length
+    return uploads
+
+
+class RetryJob(Exception):
+    """Raised by a handler to put its job back in the queue after a delay"""
+
+    def __init__(self, delay_seconds: float):
+        super().__init__(f"retry in {delay_seconds}s")
+        self.delay_seconds = delay_seconds
+
+
+class JobStore:
+    """
+    Jobs persisted in a local SQLite database
+
+    The uploaded image is kept until the job finishes so queued and running
+    jobs can be resumed after a restart. Every method blocks on SQLite;
+    JobRunner calls them on executor threads, never on the event loop.
+
+    A running job is owned by the process running it, under a lease its
+    runner keeps renewing. Several processes can share the database: a job
+    is only run by the process that claims it, and a running job is only
+    taken over once its owner's lease has lapsed (the owner died).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        if self._conn is not None:
+            return
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _execute(self, sql: str, args: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, args).rowcount
+
+    def _fetch(self, sql: str, args: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def create(self, endpoint: str, payload: bytes, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, endpoint, status, params, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, endpoint, QUEUED, json.dumps(params), payload, now, now)
+        )
+        return job_id
+
+    def get(self, job_id: str, include_payload: bool = False) -> Optional[Dict[str, Any]]:
+        rows = self._fetch("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+
+        job = {
+            'job_id': row['id'],
+            'endpoint': row['endpoint'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+        if row['status'] in FINISHED_STATUSES:
+            job['result_status_code'] = row['status_code']
+            job['result'] = json.loads(row['result']) if row['result'] is not None else None
+            job['error'] = row['error']
+        if include_payload:
+            job['params'] = json.loads(row['params'])
+            job['payload'] = row['payload']
+        return job
+
+    def claim(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """Mark a queued job (or a running one whose owner's lease lapsed) running under owner; False if not claimable"""
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ? AND (status = ? OR (status = ? AND (lease_until IS NULL OR lease_until < ?)))",
+            (RUNNING, owner, now + lease_seconds, now, job_id, QUEUED, RUNNING, now)
+        ) == 1
+
+    def renew(self, owner: str, lease_seconds: float) -> int:
+        """Extend the lease on every job owner is running"""
+        return self._execute(
+            "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?", (time.time() + lease_seconds, owner, RUNNING)
+        )
+
+    def requeue(self, job_id: str) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? WHERE id = ?",
+            (QUEUED, time.time(), job_id)
+        )
+
+    def finish(self, job_id: str, status: str, status_code: int, result: Any = None, error: Optional[str] = None) -> None:
+        # The image is no longer needed once the job has a result
+        self._execute(
+            "UPDATE jobs SET status = ?, status_code = ?, result = ?, error = ?, payload = NULL, updated_at = ? WHERE id = ?",
+            (status, status_code, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def unfinished(self) -> List[str]:
+        """Queued jobs and running jobs whose owner's lease lapsed, oldest first"""
+        rows = self._fetch(
+            "SELECT id FROM jobs WHERE status = ? OR (status = ? AND (lease_until IS NULL OR lease_until < ?)) "
+            "ORDER BY created_at",
+            (QUEUED, RUNNING, time.time())
+        )
+        return [row['id'] for row in rows]
+
+    def expire(self, ttl_seconds: float) -> Tuple[int, int]:
+        """Fail unfinished jobs and delete finished jobs older than the TTL"""
+        cutoff = time.time() - ttl_seconds
+        failed = self._execute(
+            "UPDATE jobs SET status = ?, status_code = 504, error = 'expired', payload = NULL, updated_at = ? "
+            "WHERE status IN (?, ?) AND created_at < ?",
+            (FAILED, time.time(), QUEUED, RUNNING, cutoff)
+        )
+        deleted = self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (SUCCEEDED, FAILED, cutoff)
+        )
+        return failed, deleted
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._fetch("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        return {row['status']: row['n'] for row in rows}
+
+
+class JobRunner:
+    """
+    Runs stored jobs on a fixed number of asyncio workers
+
+    Inference inside a job still goes through the inference executor, worker
+    processes and admission control like a normal request; the runner only
+    bounds how many jobs are in progress at once.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 2, ttl_seconds: float = 86400,
+                 cleanup_interval: float = 600, lease_seconds: float = 60):
+        self.store = store
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        self.lease_seconds = lease_seconds
+        # Owner recorded on the jobs this process runs
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    @classmethod
+    def from_settings(cls) -> "JobRunner":
+        return cls(
+            JobStore(settings.JOBS_DB_PATH),
+            workers=settings.JOBS_WORKERS,
+            ttl_seconds=settings.JOBS_TTL_SECONDS,
+            cleanup_interval=settings.JOBS_CLEANUP_INTERVAL_SECONDS,
+            lease_seconds=settings.JOBS_LEASE_SECONDS
+        )
+
+    def register(self, endpoint: str, handler: JobHandler) -> None:
+        self._handlers[endpoint] = handler
+
+    async def _store(self, method: Callable, *args, **kwargs) -> Any:
+        """Run a JobStore method on an executor thread (SQLite calls, and the upload blobs, stay off the loop)"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+    async def start(self) -> None:
+        await self._store(self.store.open)
+        self._queue = asyncio.Queue()
+
+        # Resume queued jobs, and jobs interrupted mid-run whose owner's lease has lapsed
+        await self._store(self.store.expire, self.ttl_seconds)
+        resumed = await self._store(self.store.unfinished)
+        for job_id in resumed:
+            self._queue.put_nowait(job_id)
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} unfinished job(s)")
+
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._cleanup()))
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._store(self.store.close)
+
+    async def submit(self, endpoint: str, payload: bytes, params: Dict[str, Any]) -> str:
+        job_id = await self._store(self.store.create, endpoint, payload, params)
+        self._queue.put_nowait(job_id)
+        JOBS_SUBMITTED.inc(endpoint=endpoint)
+        return job_id
+
+    async def wait(self, job_id: str, timeout: float = 0) -> Optional[Dict[str, Any]]:
+        """Current state of a job, waiting up to timeout seconds for it to finish"""
+        job = await self._store(self.store.get, job_id)
+        if job is None or job['status'] in FINISHED_STATUSES or timeout <= 0:
+            return job
+
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await self._store(self.store.get, job_id)
+
+    def _notify(self, job_id: str) -> None:
+        event = self._finished.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception(f"Job {job_id} could not be run")
+
+    async def _run(self, job_id: str) -> None:
+        # Another process (or an earlier queue entry) may have run it already
+        if not await self._store(self.store.claim, job_id, self.owner, self.lease_seconds):
+            return
+        job = await self._store(self.store.get, job_id, include_payload=True)
+
+        endpoint = job['endpoint']
+        handler = self._handlers.get(endpoint)
+        if handler is None:
+            await self._store(self.store.finish, job_id, FAILED, 500, error=f"No handler for {endpoint}")
+            self._notify(job_id)
+            return
+
+        start = time.perf_counter()
+        try:
+            with endpoint_context(f"job:{endpoint}"):
+                status_code, body = await handler(job['payload'], job['params'])
+        except RetryJob as retry:
+            # Overloaded; go back to the queue instead of failing the job
+            await self._store(self.store.requeue, job_id)
+            asyncio.get_running_loop().call_later(retry.delay_seconds, self._queue.put_nowait, job_id)
+            return
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({endpoint}) failed")
+            status_code, body, error = 500, None, str(e)
+        else:
+            error = None
+
+        status = SUCCEEDED if status_code < 400 else FAILED
+        await self._store(self.store.finish, job_id, status, status_code, result=body, error=error)
+        JOB_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+        JOBS_FINISHED.inc(endpoint=endpoint, status=status)
+        self._notify(job_id)
+
+    async def _cleanup(self) -> None:
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                failed, deleted = await self._store(self.store.expire, self.ttl_seconds)
+                if failed or deleted:
+                    logger.info(f"Expired {failed} stale job(s), deleted {deleted} finished job(s)")
+            except sqlite3.Error:
+                logger.exception("Job cleanup failed")
+
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._store(self.store.renew, self.owner, self.lease_seconds)
+            except sqlite3.Error:
+                logger.exception("Job lease renewal failed")
+
+
+job_runner = JobRunner.from_settings()
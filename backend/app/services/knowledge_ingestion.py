@@ -0,0 +1,341 @@
+# KNOWLEDGE BASE INGESTION
+# Chunks a directory of reference documents and embeds only new or changed chunks
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.embeddings import create_embeddings
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+
+KB_CHUNKS = registry.counter(
+    'luna_kb_ingest_chunks_total', 'Knowledge-base chunks seen by ingestion, by outcome', ('outcome',)
+)
+KB_THROUGHPUT = registry.gauge(
+    'luna_kb_ingest_chunks_per_second', 'Chunks embedded per second in the last knowledge-base ingestion'
+)
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Chunk:
+    """One embeddable passage of a source document"""
+    chunk_id: str  # "<relative path>#<position>"
+    source: str
+    text: str
+    content_hash: str
+
+
+@dataclass
+class IngestionReport:
+    files: int = 0
+    chunks: int = 0
+    embedded: int = 0  # new or changed chunks sent to the embeddings provider
+    reused: int = 0  # unchanged chunks whose stored embedding was kept
+    removed: int = 0  # stored embeddings no longer referenced by any chunk
+    failed: int = 0  # chunks whose embedding batch failed; retried on the next run
+    seconds: float = 0.0
+    embedding_seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def embedded_per_second(self) -> float:
+        return self.embedded / self.embedding_seconds if self.embedding_seconds else 0.0
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            **asdict(self),
+            'seconds': round(self.seconds, 3),
+            'embedding_seconds': round(self.embedding_seconds, 3),
+            'chunks_per_second': round(self.chunks_per_second, 1),
+            'embedded_per_second': round(self.embedded_per_second, 1),
+        }
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def embedder_id(embeddings: Embeddings) -> str:
+    """Identity of the embedding model; stored vectors are only reused by the same model"""
+    model = getattr(embeddings, 'model_name', None) or getattr(embeddings, 'model', None) or ''
+    return f"{type(embeddings).__name__}:{model}"
+
+
+def _split_long(text: str, chunk_size: int) -> List[str]:
+    """Split a paragraph longer than chunk_size at sentence, then word, boundaries"""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > chunk_size:
+            cut = sentence.rfind(" ", 0, chunk_size)
+            cut = cut if cut > 0 else chunk_size
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > chunk_size:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
+    """
+    Pack paragraphs into chunks of at most about chunk_size characters
+
+    Consecutive chunks share up to `overlap` trailing characters (cut at a
+    word boundary), so a passage split across chunks stays retrievable.
+    """
+    # Long paragraphs are cut short enough to leave room for the overlap
+    limit = max(chunk_size - overlap, chunk_size // 2)
+    pieces: List[str] = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(paragraph.split())
+        if paragraph:
+            pieces.extend(_split_long(paragraph, limit) if len(paragraph) > limit else [paragraph])
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > chunk_size:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap > 0 else ""
+            tail = tail[tail.find(" ") + 1:] if " " in tail else ""
+            current = f"{tail} {piece}" if tail and len(tail) + 1 + len(piece) <= chunk_size else piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def read_documents(directory: str) -> Iterator[Tuple[str, str]]:
+    """(relative path, text) of every document under the directory, in path order"""
+    root = Path(directory)
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and path.suffix.lower() in DOCUMENT_EXTENSIONS:
+            yield path.relative_to(root).as_posix(), path.read_text(encoding='utf-8', errors='replace')
+
+
+class KnowledgeStore:
+    """
+    Chunks and embeddings from the last ingestion, on local disk
+
+    manifest.json lists the chunks and the embedding model; the vectors file
+    holds one row per distinct chunk content, keyed by content hash, so an
+    unchanged chunk keeps its embedding even if it moves between files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / "manifest.json"
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    def load(self) -> Tuple[Optional[str], List[Chunk], Dict[str, np.ndarray]]:
+        """(embedder id, chunks, content hash -> vector); empty if nothing was ingested yet"""
+        if not self.exists():
+            return None, [], {}
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            chunks = [Chunk(**entry) for entry in manifest['chunks']]
+            vectors = {}
+            if manifest['vector_hashes']:
+                matrix = np.load(self.directory / manifest['vectors_file'], mmap_mode='r')
+                vectors = {h: matrix[row] for row, h in enumerate(manifest['vector_hashes'])}
+            return manifest['embedder'], chunks, vectors
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable knowledge store {self.directory}: {e}")
+            return None, [], {}
+
+    def save(self, embedder: Optional[str], chunks: Sequence[Chunk], vectors: Dict[str, np.ndarray]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        hashes = sorted(vectors)
+        matrix = np.stack([vectors[h] for h in hashes]).astype(np.float32) if hashes else np.zeros((0, 0), np.float32)
+
+        # Each save writes a new vectors file and then switches the manifest to it,
+        # so a reader never pairs a manifest with another run's rows
+        vectors_file = f"vectors-{content_hash((embedder or '') + ''.join(hashes))[:16]}.npy"
+        tmp_vectors = self.directory / f"{vectors_file}.tmp"
+        with open(tmp_vectors, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp_vectors, self.directory / vectors_file)
+
+        tmp_manifest = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_manifest, 'w') as f:
+            json.dump({
+                'embedder': embedder,
+                'vectors_file': vectors_file,
+                'vector_hashes': hashes,
+                'chunks': [asdict(chunk) for chunk in chunks]
+            }, f)
+        os.replace(tmp_manifest, self.manifest_path)
+
+        for stale in self.directory.glob("vectors-*.npy"):
+            if stale.name != vectors_file:
+                stale.unlink(missing_ok=True)
+
+
+class KnowledgeIngestor:
+    """
+    Incremental ingestion of a document directory into a KnowledgeStore
+
+    Each run re-chunks every document, but sends only chunks whose content
+    hash has no stored embedding to the provider, in batches of batch_size
+    with at most `concurrency` batches in flight. With embed=False (lexical
+    retrieval) chunks are recorded without embedding them.
+    """
+
+    def __init__(self, store: KnowledgeStore, embeddings: Optional[Embeddings] = None, chunk_size: int = 800,
+                 overlap: int = 100, batch_size: int = 32, concurrency: int = 4, embed: bool = True):
+        self.store = store
+        self.embeddings = embeddings
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.embed = embed
+
+    @classmethod
+    def from_settings(cls) -> "KnowledgeIngestor":
+        embed = settings.RETRIEVAL_MODE != "lexical"
+        return cls(
+            KnowledgeStore(settings.KNOWLEDGE_STORE_DIR),
+            embeddings=create_embeddings() if embed else None,
+            chunk_size=settings.KNOWLEDGE_CHUNK_SIZE,
+            overlap=settings.KNOWLEDGE_CHUNK_OVERLAP,
+            batch_size=settings.EMBEDDINGS_BATCH_SIZE,
+            concurrency=settings.KNOWLEDGE_INGEST_CONCURRENCY,
+            embed=embed
+        )
+
+    def chunk_directory(self, directory: str) -> Tuple[int, List[Chunk]]:
+        files, chunks = 0, []
+        for source, text in read_documents(directory):
+            files += 1
+            for position, passage in enumerate(chunk_text(text, self.chunk_size, self.overlap)):
+                chunks.append(Chunk(f"{source}#{position}", source, passage, content_hash(passage)))
+        return files, chunks
+
+    async def _embed_batch(self, semaphore: asyncio.Semaphore, texts: List[str]) -> List[List[float]]:
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.embeddings.embed_documents, texts)
+
+    async def ingest(self, directory: str) -> IngestionReport:
+        report = IngestionReport()
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        report.files, chunks = await loop.run_in_executor(None, self.chunk_directory, directory)
+        report.chunks = len(chunks)
+
+        stored_embedder, _, stored_vectors = await loop.run_in_executor(None, self.store.load)
+        embedder = embedder_id(self.embeddings) if self.embed else stored_embedder
+        if stored_embedder != embedder:
+            if stored_vectors:
+                logger.info(f"Embedding model changed ({stored_embedder} -> {embedder}); re-embedding every chunk")
+            stored_vectors = {}
+
+        live = {chunk.content_hash for chunk in chunks}
+        vectors = {h: np.asarray(v, dtype=np.float32) for h, v in stored_vectors.items() if h in live}
+        report.removed = len(stored_vectors) - len(vectors)
+
+        # One embedding per distinct content, however many chunks share it
+        pending: Dict[str, str] = {}
+        for chunk in chunks:
+            if chunk.content_hash not in vectors:
+                pending.setdefault(chunk.content_hash, chunk.text)
+        report.reused = sum(1 for chunk in chunks if chunk.content_hash in vectors)
+
+        if self.embed and pending:
+            hashes = list(pending)
+            batches = [hashes[i:i + self.batch_size] for i in range(0, len(hashes), self.batch_size)]
+            semaphore = asyncio.Semaphore(self.concurrency)
+            embed_start = time.perf_counter()
+            results = await asyncio.gather(
+                *(self._embed_batch(semaphore, [pending[h] for h in batch]) for batch in batches),
+                return_exceptions=True
+            )
+            report.embedding_seconds = time.perf_counter() - embed_start
+
+            for batch, result in zip(batches, results):
+                if isinstance(result, BaseException):
+                    report.errors.append(f"{type(result).__name__}: {result}")
+                    continue
+                for h, vector in zip(batch, result):
+                    vectors[h] = np.asarray(vector, dtype=np.float32)
+            report.embedded = sum(1 for chunk in chunks if chunk.content_hash in pending and chunk.content_hash in vectors)
+            report.failed = sum(1 for chunk in chunks if chunk.content_hash in pending and chunk.content_hash not in vectors)
+            if report.errors:
+                logger.warning(f"{len(report.errors)} embedding batches failed; their chunks are retried on the next run")
+
+        # Progress is saved even after failed batches, so a re-run only embeds what is still missing
+        await loop.run_in_executor(None, self.store.save, embedder, chunks, vectors)
+        report.seconds = time.perf_counter() - start
+
+        KB_CHUNKS.inc(report.embedded, outcome='embedded')
+        KB_CHUNKS.inc(report.reused, outcome='reused')
+        KB_CHUNKS.inc(report.failed, outcome='failed')
+        if report.embedded:
+            KB_THROUGHPUT.set(report.embedded_per_second)
+        logger.info(
+            f"Ingested {report.files} files: {report.chunks} chunks, {report.embedded} embedded, "
+            f"{report.reused} reused, {report.removed} removed in {report.seconds:.2f}s "
+            f"({report.chunks_per_second:.0f} chunks/s, {report.embedded_per_second:.0f} embedded/s)"
+        )
+        return report
+
+
+def load_knowledge_base(embeddings: Optional[Embeddings] = None) -> Tuple[List[Document], Optional[List[Optional[np.ndarray]]]]:
+    """
+    Documents from the last ingestion of KNOWLEDGE_BASE_DIR, with their stored embeddings
+
+    Vectors are returned only if they came from the given embeddings model;
+    chunks without one are embedded by the retriever that indexes them.
+    """
+    if not settings.KNOWLEDGE_BASE_DIR:
+        return [], None
+    embedder, chunks, vectors = KnowledgeStore(settings.KNOWLEDGE_STORE_DIR).load()
+    documents = [
+        Document(page_content=chunk.text, metadata={'source': chunk.source, 'chunk_id': chunk.chunk_id})
+        for chunk in chunks
+    ]
+    if embeddings is None:
+        return documents, None
+    if embedder != embedder_id(embeddings):
+        if documents:
+            logger.warning(
+                f"Knowledge store was embedded with {embedder}, not {embedder_id(embeddings)}; "
+                "all chunks will be embedded at start-up until the next ingestion"
+            )
+        return documents, None
+    return documents, [vectors.get(chunk.content_hash) for chunk in chunks]
@@ -1,42 +1,104 @@
 import openai
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain.llms import OpenAI
+from langchain.schema import Document
+from fastapi import HTTPException
 from typing import Dict, Any, Optional
+import asyncio
+import hashlib
 import json
 from app.core.config import settings
-from typing import List, Optional
+from app.core.metrics import registry, stage_timer
+from app.core.single_flight import SingleFlight
+from app.services.embeddings import create_embeddings
+from app.services.hybrid_retriever import HybridRetriever
+from app.services.knowledge_ingestion import KnowledgeIngestor, load_knowledge_base
+from app.services.prompt_builder import BuiltPrompt, PromptBuilder, fmt_number, format_nail_readings
+from typing import AsyncContextManager, Callable, List, Optional
+
+LLM_MODEL = "gpt-3.5-turbo"
+
+LLM_PROMPT_TOKENS = registry.histogram(
+    'luna_llm_prompt_tokens', 'Input tokens of compact LLM prompts, by prompt type', ('prompt',),
+    buckets=(100, 200, 300, 400, 500, 600, 800, 1000, 1500, 2000)
+)
+LLM_CONTEXT_PASSAGES_DROPPED = registry.counter(
+    'luna_llm_context_passages_dropped_total', 'Retrieved passages left out to fit the prompt token budget', ('prompt',)
+)
+
+# Basic women's health knowledge seeded into the vector store
+HEALTH_KNOWLEDGE = [
+    "Normal vaginal discharge is usually clear or white and doesn't have a strong odor.",
+    "Yellow or green discharge may indicate an infection and should be evaluated by a healthcare provider.",
+    "Skin redness and irritation can be caused by allergies, infections, or hormonal changes.",
+    "Acne during menstrual cycles is common due to hormonal fluctuations.",
+    "Any sudden changes in discharge color, consistency, or odor should be monitored.",
+    "Itching accompanied by discharge changes may indicate a yeast infection or bacterial vaginosis."
+]
+
+# Compact prompt texts (LLM_COMPACT_PROMPTS); the JSON keys match the response parsers
+HEMOGLOBIN_KNOWLEDGE = """
+Women: normal 120-160 g/L; mild anemia 100-119; moderate 70-99; severe <70.
+Causes of low Hb: iron deficiency (most common in women), heavy periods, poor iron absorption or intake, pregnancy, chronic disease, blood loss.
+Anemia symptoms: fatigue, weakness, pale skin/nails/inner eyelids, shortness of breath, cold hands and feet, brittle or spoon-shaped nails, ice or starch cravings, rapid or irregular heartbeat.
+"""
+
+HEALTH_RESPONSE_FORMAT = """
+Explain the likely (educational, not diagnostic) cause of what was observed. Reply with JSON only, keys:
+condition_overview (brief), severity (low|moderate|high), possible_causes (list), self_care (list), seek_care_if (list of warning signs), additional_notes.
+"""
+
+HEMOGLOBIN_RESPONSE_FORMAT = """
+Interpret the level and stress that a blood test is needed to confirm it. Reply with JSON only, keys:
+condition_overview (brief interpretation), severity (low|moderate|high by anemia risk), possible_causes (list), self_care (list of diet and lifestyle tips), seek_care_if (list of warning signs), follow_up (monitoring advice), additional_notes.
+"""
+
+CYCLE_RESPONSE_FORMAT = """
+Focus on this phase's benefits and practical advice, tailored to the goals if given. Reply with JSON only:
+{"title": "2-4 word title", "description": "1-2 sentences with actionable advice", "type": "success (ovulatory/fertile) | info | warning", "action": "suggested action"}
+"""
 
 class LLMHealthService:
     def __init__(self):
         openai.api_key = settings.OPENAI_API_KEY
-        self.embeddings = OpenAIEmbeddings()
+        self._single_flight = SingleFlight("llm")
+        self._knowledge_generation = 0
+        self._ingest_lock = asyncio.Lock()
         
-        # Initialize vector store with women's health knowledge
-        # For demo, we'll use in-memory store
+        # Initialize retriever over women's health knowledge, plus the
+        # ingested reference documents when KNOWLEDGE_BASE_DIR is set
         self.health_knowledge = self._initialize_health_knowledge()
         
-    def _initialize_health_knowledge(self):
-        """Initialize with basic women's health knowledge"""
-        # In production, load from comprehensive medical database
-        documents = [
-            "Normal vaginal discharge is usually clear or white and doesn't have a strong odor.",
-            "Yellow or green discharge may indicate an infection and should be evaluated by a healthcare provider.",
-            "Skin redness and irritation can be caused by allergies, infections, or hormonal changes.",
-            "Acne during menstrual cycles is common due to hormonal fluctuations.",
-            "Any sudden changes in discharge color, consistency, or odor should be monitored.",
-            "Itching accompanied by discharge changes may indicate a yeast infection or bacterial vaginosis."
-        ]
-        
-        # Create vector store
-        vectorstore = Chroma.from_texts(
-            documents,
-            self.embeddings,
-            collection_name="womens_health"
-        )
-        
-        return vectorstore
+    def _initialize_health_knowledge(self, collection_name: str = "womens_health") -> HybridRetriever:
+        """Initialize with basic women's health knowledge and the last knowledge-base ingestion"""
+        documents = [Document(page_content=text) for text in HEALTH_KNOWLEDGE]
+        embeddings = create_embeddings() if settings.RETRIEVAL_MODE != "lexical" else None
+        ingested, vectors = load_knowledge_base(embeddings)
+        if vectors is not None:
+            vectors = [None] * len(documents) + vectors
+        return HybridRetriever(documents + ingested, collection_name=collection_name, vectors=vectors)
+    
+    async def ingest_knowledge(self) -> Dict[str, Any]:
+        """
+        Ingest KNOWLEDGE_BASE_DIR (embedding only new or changed chunks) and
+        swap in a retriever over the result
+        """
+        if not settings.KNOWLEDGE_BASE_DIR:
+            raise ValueError("KNOWLEDGE_BASE_DIR is not set")
+        async with self._ingest_lock:
+            report = await KnowledgeIngestor.from_settings().ingest(settings.KNOWLEDGE_BASE_DIR)
+            self._knowledge_generation += 1
+            loop = asyncio.get_running_loop()
+            retriever = await loop.run_in_executor(
+                None, self._initialize_health_knowledge, f"womens_health_{self._knowledge_generation}"
+            )
+            # Retrieval runs on the event loop, so no query is mid-flight on the old index here
+            previous, self.health_knowledge = self.health_knowledge, retriever
+            if previous.vectorstore is not None:
+                previous.vectorstore.delete_collection()
+        return {**report.describe(), 'indexed_passages': len(retriever.documents)}
+    
+    def _retrieve(self, query: str, k: int = 3) -> List:
+        """Retrieve the k most relevant knowledge passages (lexical, vector or hybrid per RETRIEVAL_MODE)"""
+        return self.health_knowledge.retrieve(query, k=k)
     
     async def analyze_with_context(
         self,
@@ -48,7 +110,7 @@ class LLMHealthService:
         """Analyze health condition with LLM and medical context"""
         
         # Retrieve relevant medical knowledge
-        relevant_docs = self.health_knowledge.similarity_search(
+        relevant_docs = self._retrieve(
             f"{analysis_type} {image_analysis.get('description', '')} {' '.join(user_symptoms or [])}",
             k=3
         )
@@ -93,6 +155,20 @@ class LLMHealthService:
         medical_docs: List
     ) -> str:
         """Create comprehensive prompt for health analysis"""
+        if settings.LLM_COMPACT_PROMPTS:
+            concerns = image_analysis.get('skin_concerns', []) or image_analysis.get('health_indicators', [])
+            builder = PromptBuilder()
+            builder.section(None, "You are a women's health assistant giving educational information, not a diagnosis.")
+            builder.section("Image analysis", f"""
+                type: {analysis_type}
+                description: {image_analysis.get('description', 'n/a')}
+                concerns: {', '.join(concerns) or 'none'}
+                confidence: {fmt_number(image_analysis.get('confidence', 0), 2)}
+                symptoms: {', '.join(symptoms) if symptoms else 'none reported'}
+            """)
+            builder.context("Medical knowledge", [doc.page_content for doc in medical_docs])
+            builder.section("Task", HEALTH_RESPONSE_FORMAT)
+            return self._finish_prompt("health", builder.build())
         
         medical_context = "\n".join([doc.page_content for doc in medical_docs])
         
@@ -131,19 +207,55 @@ class LLMHealthService:
         
         return prompt
     
-    async def _get_llm_response(self, prompt: str) -> str:
-        """Get response from OpenAI"""
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful women's health education assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=800
-        )
+    @staticmethod
+    def _finish_prompt(prompt_type: str, prompt: BuiltPrompt) -> str:
+        """Record a compact prompt's size and return its text"""
+        LLM_PROMPT_TOKENS.observe(prompt.tokens, prompt=prompt_type)
+        if prompt.passages_dropped:
+            LLM_CONTEXT_PASSAGES_DROPPED.inc(prompt.passages_dropped, prompt=prompt_type)
+        return prompt.text
+    
+    async def _get_llm_response(
+        self, prompt: str, admit: Optional[Callable[[], AsyncContextManager[None]]] = None
+    ) -> str:
+        """
+        Get response from OpenAI, sharing one upstream call among identical concurrent prompts
         
-        return response.choices[0].message.content
+        `admit`, if given, is entered around the upstream call only, so requests
+        joining an in-flight call do not take an admission slot of their own.
+        """
+        messages = [
+            {"role": "system", "content": "You are a helpful women's health education assistant."},
+            {"role": "user", "content": prompt}
+        ]
+        
+        async def complete() -> str:
+            if admit is not None:
+                async with admit():
+                    return await request()
+            return await request()
+        
+        async def request() -> str:
+            response = await openai.ChatCompletion.acreate(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=800
+            )
+            return response.choices[0].message.content
+        
+        with stage_timer("llm"):
+            return await self._single_flight.do(self._coalescing_key(messages), complete)
+    
+    @staticmethod
+    def _coalescing_key(messages: List[Dict[str, str]]) -> str:
+        """Key of an upstream request; prompts differing only in whitespace share one call"""
+        normalized = [(m["role"], " ".join(m["content"].split())) for m in messages]
+        return hashlib.sha256(json.dumps([LLM_MODEL, normalized]).encode()).hexdigest()
+    
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """Upstream LLM calls made, and calls saved by joining an identical in-flight one"""
+        return self._single_flight.stats()
     
     def _parse_health_response(self, response: str) -> Dict[str, Any]:
         """Parse LLM response into structured format"""
@@ -177,7 +289,7 @@ class LLMHealthService:
         
         # Retrieve relevant medical knowledge about anemia and hemoglobin
         hemoglobin_query = f"hemoglobin anemia iron deficiency women health {avg_hemoglobin} g/L"
-        relevant_docs = self.health_knowledge.similarity_search(hemoglobin_query, k=3)
+        relevant_docs = self._retrieve(hemoglobin_query, k=3)
         
         # Add hemoglobin-specific knowledge
         hemoglobin_context = self._get_hemoglobin_knowledge()
@@ -218,6 +330,8 @@ class LLMHealthService:
     
     def _get_hemoglobin_knowledge(self) -> str:
         """Get hemoglobin-specific medical knowledge"""
+        if settings.LLM_COMPACT_PROMPTS:
+            return HEMOGLOBIN_KNOWLEDGE
         return """
         HEMOGLOBIN REFERENCE RANGES:
         - Normal for women: 120-160 g/L (12-16 g/dL)
@@ -258,6 +372,23 @@ class LLMHealthService:
         avg_hemoglobin = nail_analysis.get('average_hemoglobin_g_per_L', 0)
         num_nails = nail_analysis.get('num_nails_detected', 0)
         
+        if settings.LLM_COMPACT_PROMPTS:
+            builder = PromptBuilder()
+            builder.section(None, "You are a women's health assistant giving educational information about hemoglobin levels, not a diagnosis.")
+            builder.section("Nail-based hemoglobin screening", f"""
+                nails analyzed: {num_nails}
+                average: {fmt_number(avg_hemoglobin)} g/L
+                {format_nail_readings(nail_analysis.get('individual_predictions', []))}
+            """)
+            builder.section("User", f"""
+                age: {context.get('age') if context and context.get('age') is not None else 'not provided'}
+                symptoms: {', '.join(symptoms) if symptoms else 'none reported'}
+            """)
+            builder.section("Hemoglobin reference", hemoglobin_context)
+            builder.context("General health knowledge", [doc.page_content for doc in medical_docs])
+            builder.section("Task", HEMOGLOBIN_RESPONSE_FORMAT)
+            return self._finish_prompt("hemoglobin", builder.build())
+        
         medical_knowledge = "\n".join([doc.page_content for doc in medical_docs])
         
         prompt = f"""
@@ -356,9 +487,10 @@ class LLMHealthService:
         period_length: int,
         last_period_date: str,
         health_goals: Optional[List[str]] = None,
-        reproductive_stage: Optional[str] = None
+        reproductive_stage: Optional[str] = None,
+        admit: Optional[Callable[[], AsyncContextManager[None]]] = None
     ) -> Dict[str, Any]:
-        """Generate personalized cycle insight based on current cycle data"""
+        """Generate personalized cycle insight based on current cycle data; `admit` guards the upstream call"""
         
         # Calculate cycle phase
         follicular_end = cycle_length // 2 - 2
@@ -381,8 +513,11 @@ class LLMHealthService:
         )
         
         try:
-            response = await self._get_llm_response(prompt)
+            response = await self._get_llm_response(prompt, admit)
             return self._parse_cycle_insight_response(response, phase)
+        except HTTPException:
+            # Admission rejected (503); shed the request rather than answering with the fallback
+            raise
         except Exception as e:
             print(f"Error generating cycle insight: {e}")
             return self._get_fallback_cycle_insight(phase, current_cycle_day)
@@ -397,6 +532,17 @@ class LLMHealthService:
         reproductive_stage: Optional[str]
     ) -> str:
         """Create a personalized prompt for cycle insights"""
+        if settings.LLM_COMPACT_PROMPTS:
+            builder = PromptBuilder()
+            builder.section(None, "You are a women's health assistant. Write a personalized, encouraging insight for the user's current menstrual cycle.")
+            cycle = f"day {cycle_day} of {cycle_length}, {phase} phase, period length {period_length} days"
+            if reproductive_stage:
+                cycle += f"\nreproductive stage: {reproductive_stage}"
+            if health_goals:
+                cycle += f"\nhealth goals: {', '.join(health_goals)}"
+            builder.section("Cycle", cycle)
+            builder.section("Task", CYCLE_RESPONSE_FORMAT)
+            return self._finish_prompt("cycle", builder.build())
         
         goals_text = ""
         if health_goals:
@@ -0,0 +1,230 @@
+# MODEL OPTIMIZATION
+# Load-time rewrites of eval-mode models: BN folding, channels_last, TorchScript freezing, bfloat16 autocast
+
+import contextlib
+import logging
+from typing import Any, ContextManager, Optional, Sequence
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_weights
+from torchvision.models.resnet import BasicBlock, Bottleneck, ResNet
+from torchvision.models._utils import IntermediateLayerGetter
+from torchvision.ops import FrozenBatchNorm2d
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_BATCHNORMS = (nn.BatchNorm2d, FrozenBatchNorm2d)
+
+# Modules whose forward applies bnK directly to the output of convK
+_NAMED_CONV_BN_MODULES = (ResNet, BasicBlock, Bottleneck, IntermediateLayerGetter)
+
+
+def _fold_into_conv(conv: nn.Conv2d, bn: nn.Module) -> None:
+    """Fold an eval-mode BatchNorm into the preceding convolution, in place"""
+    weight, bias = fuse_conv_bn_weights(
+        conv.weight, conv.bias, bn.running_mean, bn.running_var, bn.eps, bn.weight, bn.bias
+    )
+    conv.weight = weight
+    conv.bias = bias
+
+
+def fold_batchnorm(model: nn.Module) -> int:
+    """
+    Fold every BatchNorm that directly follows a Conv2d into it
+
+    Only module types whose forward order is known are rewritten: the
+    torchvision ResNet family (including the detector backbone body) and
+    Sequential containers. Folded BatchNorms are replaced with Identity.
+
+    Returns:
+        int: Number of BatchNorm layers folded
+    """
+    folded = 0
+    for module in list(model.modules()):
+        if isinstance(module, _NAMED_CONV_BN_MODULES):
+            for index in (1, 2, 3):
+                conv = getattr(module, f'conv{index}', None)
+                bn = getattr(module, f'bn{index}', None)
+                if isinstance(conv, nn.Conv2d) and isinstance(bn, _BATCHNORMS):
+                    _fold_into_conv(conv, bn)
+                    setattr(module, f'bn{index}', nn.Identity())
+                    folded += 1
+        elif isinstance(module, nn.Sequential):
+            names = list(module._modules)
+            for name, next_name in zip(names, names[1:]):
+                conv, bn = module._modules[name], module._modules[next_name]
+                if isinstance(conv, nn.Conv2d) and isinstance(bn, _BATCHNORMS):
+                    _fold_into_conv(conv, bn)
+                    module._modules[next_name] = nn.Identity()
+                    folded += 1
+    return folded
+
+
+def fold_output_affine(linear: nn.Linear, scale: float, shift: float) -> nn.Linear:
+    """Fold `y * scale + shift` applied to a Linear layer's output into the layer itself"""
+    with torch.no_grad():
+        linear.weight.mul_(float(scale))
+        if linear.bias is None:
+            linear.bias = nn.Parameter(torch.zeros(linear.out_features, device=linear.weight.device))
+        linear.bias.mul_(float(scale)).add_(float(shift))
+    return linear
+
+
+def _freeze(model: nn.Module, example: torch.Tensor) -> Optional[torch.jit.ScriptModule]:
+    """Trace and freeze a model, or None if the architecture cannot be traced"""
+    try:
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        return torch.jit.freeze(traced.eval())
+    except Exception as e:
+        logger.warning(f"Could not freeze {type(model).__name__}, serving it eagerly: {e}")
+        return None
+
+
+def _to_float32(output: Any) -> Any:
+    """Cast the floating-point tensors of a module output (tensor, dict or sequence) to fp32"""
+    if isinstance(output, torch.Tensor):
+        return output.float() if output.is_floating_point() else output
+    if isinstance(output, dict):
+        return type(output)((key, _to_float32(value)) for key, value in output.items())
+    if isinstance(output, (list, tuple)):
+        return type(output)(_to_float32(value) for value in output)
+    return output
+
+
+class _Precision(nn.Module):
+    """
+    Run the wrapped module in bfloat16 autocast (reduced=True) or in plain fp32
+    (reduced=False, also inside an enclosing autocast region); outputs are fp32
+    """
+
+    def __init__(self, module: nn.Module, reduced: bool):
+        super().__init__()
+        self.module = module
+        self.reduced = reduced
+        # FasterRCNN and friends read these from their backbone
+        if hasattr(module, 'out_channels'):
+            self.out_channels = module.out_channels
+
+    def forward(self, x: torch.Tensor) -> Any:
+        if self.reduced:
+            with torch.autocast(device_type=x.device.type, dtype=torch.bfloat16):
+                return _to_float32(self.module(x))
+        with torch.autocast(device_type=x.device.type, enabled=False):
+            return self.module(x.float())
+
+
+def inference_autocast(device: torch.device) -> ContextManager:
+    """bfloat16 autocast for the block if MODEL_BF16_AUTOCAST is enabled, else a no-op"""
+    if not settings.MODEL_BF16_AUTOCAST:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=torch.device(device).type, dtype=torch.bfloat16)
+
+
+def keep_float32(model: nn.Module, fp32_modules: Sequence[str]) -> nn.Module:
+    """
+    Make the named submodules (dotted paths) run in fp32 inside autocast regions
+
+    No-op unless MODEL_BF16_AUTOCAST is enabled. Wrapping renames their
+    parameters, so call it after the weights are loaded.
+    """
+    if not settings.MODEL_BF16_AUTOCAST:
+        return model
+    for path in fp32_modules:
+        *parents, name = path.split('.')
+        parent = model.get_submodule('.'.join(parents)) if parents else model
+        setattr(parent, name, _Precision(getattr(parent, name), reduced=False))
+    return model
+
+
+def reduced_precision(model: nn.Module, fp32_modules: Sequence[str] = ('fc',)) -> nn.Module:
+    """
+    Serve a model under bfloat16 CPU autocast, with fp32_modules and the output kept in fp32
+
+    Autocast runs convolutions and matmuls in bfloat16 (about half the
+    activation memory; faster on CPUs with AVX512-BF16/AMX, slower on older
+    ones) and keeps reductions and normalizations in fp32. The output head
+    stays in fp32, so folded scale/shift corrections and the softmax over its
+    logits are computed at full precision. No-op unless MODEL_BF16_AUTOCAST
+    is enabled.
+    """
+    if not settings.MODEL_BF16_AUTOCAST:
+        return model
+    return _Precision(keep_float32(model, fp32_modules), reduced=True).eval()
+
+
+def optimize_classifier(model: nn.Module, device: torch.device, input_size: int = 224,
+                        fp32_modules: Sequence[str] = ('fc',)) -> nn.Module:
+    """
+    Optimize an image classifier/regressor for inference
+
+    Folds BatchNorm into convolutions, converts weights to channels_last and,
+    if enabled, traces and freezes the model so its weights become constants.
+    Convolutional classifiers trace shape-independently, so the frozen module
+    still accepts every profile's input size.
+
+    With MODEL_BF16_AUTOCAST the model is served eagerly under bfloat16
+    autocast instead of frozen (see reduced_precision); fp32_modules name the
+    precision-sensitive head layers.
+    """
+    model.eval()
+    if not settings.MODEL_OPTIMIZATION_ENABLED:
+        return reduced_precision(model, fp32_modules)
+
+    for param in model.parameters():
+        param.requires_grad_(False)
+    folded = fold_batchnorm(model)
+    model = model.to(memory_format=torch.channels_last)
+
+    if settings.MODEL_BF16_AUTOCAST:
+        logger.info(f"Optimized {type(model).__name__}: folded {folded} BatchNorm layers, channels_last, "
+                    f"bfloat16 autocast (not frozen)")
+        return reduced_precision(model, fp32_modules)
+
+    if settings.MODEL_FREEZE_ENABLED:
+        example = torch.randn(1, 3, input_size, input_size, device=device).to(memory_format=torch.channels_last)
+        frozen = _freeze(model, example)
+        if frozen is not None:
+            logger.info(f"Optimized {type(model).__name__}: folded {folded} BatchNorm layers, channels_last, frozen")
+            return frozen
+
+    logger.info(f"Optimized {type(model).__name__}: folded {folded} BatchNorm layers, channels_last")
+    return model
+
+
+def optimize_detector(model: nn.Module) -> nn.Module:
+    """
+    Optimize the Faster R-CNN nail detector for inference
+
+    The backbone's FrozenBatchNorm layers are folded and its weights moved to
+    channels_last. The detector is not frozen: its RPN and ROI heads have
+    data-dependent control flow and the per-profile views patch their
+    attributes at run time.
+
+    With MODEL_BF16_AUTOCAST only the backbone (ResNet body + FPN, nearly all
+    of the compute) runs under bfloat16 autocast; its feature maps are cast
+    back to fp32, so the RPN, anchor and box decoding, NMS and ROI heads stay
+    in fp32.
+    """
+    model.eval()
+    if settings.MODEL_OPTIMIZATION_ENABLED:
+        for param in model.parameters():
+            param.requires_grad_(False)
+        folded = fold_batchnorm(model.backbone)
+        model.backbone.body.to(memory_format=torch.channels_last)
+        logger.info(f"Optimized {type(model).__name__}: folded {folded} BatchNorm layers, channels_last backbone")
+
+    if settings.MODEL_BF16_AUTOCAST:
+        model.backbone = _Precision(model.backbone, reduced=True)
+        logger.info(f"Serving the {type(model).__name__} backbone under bfloat16 autocast")
+    return model
+
+
+def to_model_input(tensor: torch.Tensor) -> torch.Tensor:
+    """Match an NCHW input batch to the memory format of optimized models"""
+    if settings.MODEL_OPTIMIZATION_ENABLED:
+        return tensor.contiguous(memory_format=torch.channels_last)
+    return tensor
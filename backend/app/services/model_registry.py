@@ -0,0 +1,405 @@
+# MODEL REGISTRY
+# Versioned model checkpoints with background reload, warm-up and an atomic swap that lets in-flight requests finish
+
+import ctypes
+import ctypes.util
+import functools
+import gc
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.metrics import record_error, registry
+
+logger = logging.getLogger(__name__)
+
+UNVERSIONED = "unversioned"
+
+# A checkpoint modified more recently than this may still be being copied in
+SETTLE_SECONDS = 2.0
+
+# Checkpoint versions read on the request path are re-hashed in the background once older than this
+CHECKPOINT_REFRESH_SECONDS = 1.0
+
+# Free memory a reload needs, as a multiple of the checkpoint size (new weights + load buffers)
+RELOAD_MEMORY_FACTOR = 2.0
+
+MODEL_RELOADS = registry.counter(
+    'luna_model_reloads_total', 'Model hot reloads, by outcome', ('model', 'outcome')
+)
+MODELS_RETIRED = registry.gauge(
+    'luna_models_retired', 'Swapped-out model versions still held by in-flight requests', ('model',)
+)
+
+Loader = Callable[[str], Tuple[Any, Dict[str, Any]]]
+
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# path -> (signature, version), so a checkpoint is only hashed again after it changed
+_versions: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_versions_lock = threading.Lock()
+
+
+def checkpoint_version(path: str) -> Optional[str]:
+    """Short content hash of a checkpoint file (None if missing); identical files get identical versions"""
+    signature = _signature(path)
+    if signature is None:
+        return None
+    with _versions_lock:
+        cached = _versions.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    version = digest.hexdigest()[:12]
+    with _versions_lock:
+        _versions[path] = (signature, version)
+    return version
+
+
+def _available_memory_bytes() -> Optional[int]:
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def release_memory() -> None:
+    """Return memory freed by a dropped model to the allocator pools and the OS"""
+    gc.collect()
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        torch.cuda.empty_cache()
+    libc_name = ctypes.util.find_library('c')
+    if libc_name:
+        try:
+            # glibc keeps freed weight buffers in its arenas unless asked to trim them
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def pinned_models(result_key: str):
+    """
+    Run a service method with the service's models pinned (self.models.pinned())
+
+    The versions it used are reported as result[result_key]['model_versions'].
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.models.pinned() as pinned:
+                result = method(self, *args, **kwargs)
+                versions = {name: version.version for name, version in pinned.items()}
+            analysis = result.get(result_key) if isinstance(result, dict) else None
+            if analysis:
+                analysis['model_versions'] = versions
+            return result
+        return wrapper
+    return decorate
+
+
+@dataclass
+class ModelVersion:
+    name: str
+    model: Any
+    version: str = UNVERSIONED
+    path: Optional[str] = None
+    signature: Optional[Tuple[int, int]] = None
+    loaded_at: float = field(default_factory=time.time)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Slot:
+    path: Optional[str] = None
+    loader: Optional[Loader] = None
+    warm_up: Optional[Callable[[Any], None]] = None
+    current: Optional[ModelVersion] = None
+    retired: List[Tuple[str, weakref.ref]] = field(default_factory=list)  # (version, model) still alive
+    failed_signature: Optional[Tuple[int, int]] = None
+
+
+class ModelRegistry:
+    """
+    The model versions one service serves, with hot reload from their checkpoint files
+
+    Requests run inside pinned(): every model they read comes from the versions
+    current when the request started, even if a reload swaps in a new version
+    meanwhile. The swap is a single reference assignment; the old version is
+    dropped by the registry at once and freed (and its memory trimmed) as soon
+    as the last request pinned to it finishes.
+
+    Memory rules for reloads:
+
+    - a model is not reloaded while its previous version is still held by
+      in-flight requests, so at most two copies of a model are ever resident
+    - models are reloaded one at a time
+    - a reload is deferred while MemAvailable is below RELOAD_MEMORY_FACTOR
+      times the checkpoint size
+    - a checkpoint that fails to load or warm up keeps the current version
+      serving and is not retried until the file changes again
+    """
+
+    def __init__(self, family: str):
+        self.family = family
+        self._slots: Dict[str, _Slot] = {}
+        # Checkpoint versions last hashed off the request path
+        self._checkpoints: Dict[str, Optional[str]] = {}
+        self._checkpoints_refreshed = float('-inf')
+        self._refresher: Optional[threading.Thread] = None
+        self._lock = threading.RLock()  # re-entrant: a release finalizer may run while it is held
+        self._reload_lock = threading.Lock()
+        self._pinned: ContextVar[Optional[Dict[str, ModelVersion]]] = ContextVar(f'{family}_models', default=None)
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def register(self, name: str, path: str, loader: Loader,
+                 warm_up: Optional[Callable[[Any], None]] = None) -> None:
+        """Declare a model served from a checkpoint file; loader(path) returns (model, metadata)"""
+        with self._lock:
+            slot = self._slots.setdefault(name, _Slot())
+            slot.path, slot.loader, slot.warm_up = str(path), loader, warm_up
+
+    def load(self, name: str) -> ModelVersion:
+        """Load a registered model from its checkpoint and make it current (blocking)"""
+        slot = self._slots[name]
+        signature = _signature(slot.path)
+        version = checkpoint_version(slot.path) or UNVERSIONED
+        with self._lock:
+            self._checkpoints[name] = version
+        model, metadata = slot.loader(slot.path)
+        loaded = ModelVersion(name, model, version, slot.path, signature, metadata=metadata)
+        self._swap(name, loaded)
+        return loaded
+
+    def install(self, name: str, model: Any, version: str = UNVERSIONED,
+                metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Serve an already built model (None removes it)"""
+        self._swap(name, ModelVersion(name, model, version, metadata=metadata or {}) if model is not None else None)
+
+    def get(self, name: str) -> Optional[ModelVersion]:
+        """The version pinned by the running request, else the current one"""
+        pinned = self._pinned.get()
+        if pinned is not None and name in pinned:
+            return pinned[name]
+        slot = self._slots.get(name)
+        current = slot.current if slot is not None else None
+        if pinned is not None and current is not None:
+            # Loaded after the request started (first use): pinned from its first read on
+            pinned[name] = current
+        return current
+
+    def model(self, name: str) -> Any:
+        version = self.get(name)
+        return version.model if version is not None else None
+
+    def checkpoint_versions(self) -> Dict[str, Optional[str]]:
+        """
+        Versions of the checkpoint files on disk (what a reload would serve), as last hashed
+
+        Reads no files, so it is safe on the event loop. Versions are published
+        when a model loads and on every reload, and re-hashed in a background
+        thread once older than CHECKPOINT_REFRESH_SECONDS (also in a process
+        whose models are served by inference workers). Models not hashed yet
+        are missing.
+        """
+        with self._lock:
+            versions = dict(self._checkpoints)
+            if self._refresher is None and time.monotonic() - self._checkpoints_refreshed >= CHECKPOINT_REFRESH_SECONDS:
+                self._refresher = threading.Thread(
+                    target=self._refresh_in_background, daemon=True, name=f"luna-{self.family}-checkpoint-versions"
+                )
+                self._refresher.start()
+        return versions
+
+    def refresh_checkpoint_versions(self) -> Dict[str, Optional[str]]:
+        """Hash the registered checkpoint files and publish their versions (blocking; unchanged files are not re-read)"""
+        versions = {name: checkpoint_version(slot.path) for name, slot in list(self._slots.items()) if slot.path}
+        with self._lock:
+            self._checkpoints.update(versions)
+            self._checkpoints_refreshed = time.monotonic()
+        return versions
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh_checkpoint_versions()
+        except Exception:
+            logger.exception(f"Hashing {self.family} model checkpoints failed")
+        finally:
+            with self._lock:
+                self._refresher = None
+
+    @contextmanager
+    def pinned(self) -> Iterator[Dict[str, ModelVersion]]:
+        """
+        Pin the current version of every model for the block
+
+        Yields the pinned versions by name; models loaded during the block are
+        added on first use.
+        """
+        outer = self._pinned.get()
+        if outer is not None:
+            yield outer
+            return
+
+        with self._lock:
+            snapshot = {name: slot.current for name, slot in self._slots.items() if slot.current is not None}
+        token = self._pinned.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            self._pinned.reset(token)
+
+    def _swap(self, name: str, new: Optional[ModelVersion]) -> None:
+        with self._lock:
+            slot = self._slots.setdefault(name, _Slot())
+            old, slot.current = slot.current, new
+            if old is not None and old.version != UNVERSIONED:
+                self._retire(name, slot, old)
+
+    def _retire(self, name: str, slot: _Slot, old: ModelVersion) -> None:
+        """Track a swapped-out version until the last request holding it finishes, then trim memory"""
+        try:
+            reference = weakref.ref(old.model)
+        except TypeError:
+            return
+        slot.retired.append((old.version, reference))
+        MODELS_RETIRED.set(len(slot.retired), model=name)
+        weakref.finalize(old.model, self._released, name, old.version)
+
+    def _released(self, name: str, version: str) -> None:
+        with self._lock:
+            slot = self._slots.get(name)
+            if slot is not None:
+                slot.retired = [(v, ref) for v, ref in slot.retired if ref() is not None]
+                MODELS_RETIRED.set(len(slot.retired), model=name)
+        logger.info(f"Released {self.family} model {name} version {version}")
+        # Off the request thread that dropped the last reference
+        threading.Thread(target=release_memory, daemon=True, name="luna-model-release").start()
+
+    def _draining(self, slot: _Slot) -> bool:
+        if any(ref() is not None for _, ref in slot.retired):
+            # Break reference cycles that may be all that keeps a retired model alive
+            gc.collect()
+        return any(ref() is not None for _, ref in slot.retired)
+
+    def reload(self, force: bool = False) -> Dict[str, str]:
+        """
+        Reload every model whose checkpoint changed (or all of them with force)
+
+        Returns:
+            dict: Outcome per model ("reloaded <version>", "unchanged", "deferred: ...", "failed: ...")
+        """
+        outcomes = {}
+        with self._reload_lock:
+            self.refresh_checkpoint_versions()
+            for name, slot in list(self._slots.items()):
+                if slot.loader is not None:
+                    outcomes[name] = self._reload_slot(name, slot, force)
+        return outcomes
+
+    def _reload_slot(self, name: str, slot: _Slot, force: bool) -> str:
+        signature = _signature(slot.path)
+        if signature is None:
+            return "deferred: checkpoint missing"
+        current = slot.current
+        if not force and (
+            (current is not None and current.signature == signature) or signature == slot.failed_signature
+        ):
+            return "unchanged"
+        if time.time() - signature[0] / 1e9 < SETTLE_SECONDS:
+            return "deferred: checkpoint still being written"
+        if self._draining(slot):
+            MODEL_RELOADS.inc(model=name, outcome="deferred")
+            return "deferred: previous version still serving requests"
+        available = _available_memory_bytes()
+        if available is not None and available < signature[1] * RELOAD_MEMORY_FACTOR:
+            MODEL_RELOADS.inc(model=name, outcome="deferred")
+            return f"deferred: {available // 2 ** 20} MB available"
+
+        try:
+            version = checkpoint_version(slot.path) or UNVERSIONED
+            if not force and current is not None and current.version == version:
+                current.signature = signature  # touched, not changed
+                return "unchanged"
+
+            start = time.perf_counter()
+            model, metadata = slot.loader(slot.path)
+            if slot.warm_up is not None:
+                slot.warm_up(model)
+        except Exception as e:
+            logger.exception(f"Reloading {self.family} model {name} from {slot.path} failed; keeping the current version")
+            slot.failed_signature = signature
+            MODEL_RELOADS.inc(model=name, outcome="failed")
+            record_error("model_load")
+            return f"failed: {e}"
+
+        self._swap(name, ModelVersion(name, model, version, slot.path, signature, metadata=metadata))
+        del model
+        slot.failed_signature = None
+        MODEL_RELOADS.inc(model=name, outcome="reloaded")
+        previous = current.version if current is not None else None
+        logger.info(f"Swapped {self.family} model {name} {previous} -> {version} "
+                    f"(loaded and warmed up in {time.perf_counter() - start:.2f}s)")
+        return f"reloaded {version}"
+
+    def watch(self, interval: float) -> None:
+        """Poll the checkpoints every interval seconds in a background thread (idempotent)"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._stop_event.clear()
+            self._watcher = threading.Thread(
+                target=self._watch, args=(interval,), daemon=True, name=f"luna-{self.family}-model-watcher"
+            )
+            self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop_event.wait(interval):
+            try:
+                for name, outcome in self.reload().items():
+                    if outcome != "unchanged":
+                        logger.info(f"{self.family} model {name}: {outcome}")
+            except Exception:
+                logger.exception(f"Watching {self.family} model checkpoints failed")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.join()
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    'version': slot.current.version if slot.current is not None else None,
+                    'path': slot.path,
+                    'loaded_at': slot.current.loaded_at if slot.current is not None else None,
+                    'retired_versions_alive': [version for version, ref in slot.retired if ref() is not None]
+                }
+                for name, slot in self._slots.items()
+            }
@@ -4,54 +4,115 @@
 import torch
 import torch.nn as nn
 from torchvision import transforms, models
-from torchvision.models.detection import fasterrcnn_resnet50_fpn
+from torchvision.models.detection import FasterRCNN
+from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
 from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
+from torchvision.ops import FrozenBatchNorm2d
 from PIL import Image
+import cv2
 import numpy as np
 import os
+import copy
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 import logging
+import threading
 from pathlib import Path
 
+from app.core.config import settings
+from app.core.inference_executor import inference_executor
+from app.core.inference_workers import inference_workers
+from app.core.metrics import NAILS_DETECTED, current_endpoint, record_error, stage_timer
+from app.services.inference_profiles import INFERENCE_PROFILES, InferenceProfile, get_inference_profile
+from app.services.nail_tracking import NailTrack, NailTracker, summarize_estimates
+from app.services.model_optimization import (
+    fold_output_affine, optimize_classifier, optimize_detector, to_model_input
+)
+from app.services.model_registry import ModelRegistry, pinned_models
+from app.services.warmup import make_warmup_image
+
 logger = logging.getLogger(__name__)
 
 class NailDetector:
     """Nail detection model wrapper"""
     
-    def __init__(self, model_path: str, device: str = 'cpu'):
+    def __init__(self, model_path: Optional[str], device: str = 'cpu'):
         self.device = torch.device(device)
         self.model = self._load_model(model_path)
+        self._profile_models = {}
         
-    def _load_model(self, model_path: str):
-        """Load the trained nail detection model"""
-        # Create model architecture
-        model = fasterrcnn_resnet50_fpn(weights=None)
+    def _load_model(self, model_path: Optional[str]):
+        """Load the trained nail detection model (random weights if no path is given)"""
+        # Create model architecture (same as fasterrcnn_resnet50_fpn(weights=None), without
+        # downloading ImageNet backbone weights that the checkpoint overwrites anyway)
+        backbone = resnet_fpn_backbone(
+            backbone_name='resnet50',
+            weights=None,
+            norm_layer=FrozenBatchNorm2d,
+            trainable_layers=3
+        )
+        model = FasterRCNN(backbone, num_classes=91)
         in_features = model.roi_heads.box_predictor.cls_score.in_features
         model.roi_heads.box_predictor = FastRCNNPredictor(in_features, 2)  # 2 classes
         
         # Load trained weights
-        checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
-        if 'model_state_dict' in checkpoint:
-            model.load_state_dict(checkpoint['model_state_dict'])
-        else:
-            model.load_state_dict(checkpoint)
+        if model_path is not None:
+            checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
+            if 'model_state_dict' in checkpoint:
+                model.load_state_dict(checkpoint['model_state_dict'])
+            else:
+                model.load_state_dict(checkpoint)
         
         model.to(self.device)
-        model.eval()
-        return model
+        return optimize_detector(model)
+    
+    def _model_for_profile(self, profile: InferenceProfile):
+        """
+        Get a view of the detector configured for an inference profile
+        
+        Views are shallow copies that share every weight with the loaded model and
+        only override the RPN proposal counts and the detections-per-image cap, so
+        requests with different profiles never mutate shared state.
+        """
+        view = self._profile_models.get(profile.name)
+        if view is not None:
+            return view
+        
+        view = copy.copy(self.model)
+        view._modules = OrderedDict(self.model._modules)
+        
+        view.rpn = copy.copy(self.model.rpn)
+        view.rpn._pre_nms_top_n = dict(self.model.rpn._pre_nms_top_n, testing=profile.rpn_pre_nms_top_n)
+        view.rpn._post_nms_top_n = dict(self.model.rpn._post_nms_top_n, testing=profile.rpn_post_nms_top_n)
+        
+        view.roi_heads = copy.copy(self.model.roi_heads)
+        view.roi_heads.detections_per_img = profile.detections_per_img
+        
+        self._profile_models[profile.name] = view
+        return view
     
-    def detect_nails(self, image: Image.Image, confidence_threshold: float = 0.5) -> Dict[str, Any]:
+    def detect_nails(
+        self,
+        image: Image.Image,
+        confidence_threshold: Optional[float] = None,
+        profile: Optional[Union[str, InferenceProfile]] = None
+    ) -> Dict[str, Any]:
         """
         Detect nails in an image and return bounding boxes
         
         Args:
             image: PIL Image object
-            confidence_threshold: Minimum confidence for detections
+            confidence_threshold: Minimum confidence for detections (profile default if None)
+            profile: Inference profile name or object (deployment default if None)
             
         Returns:
             dict: Dictionary containing detection results
         """
+        profile = get_inference_profile(profile)
+        if confidence_threshold is None:
+            confidence_threshold = profile.nail_confidence_threshold
+        
         # Ensure RGB format
         if image.mode != 'RGB':
             image = image.convert('RGB')
@@ -59,8 +120,8 @@ class NailDetector:
         # Preprocess image
         image_tensor = transforms.ToTensor()(image).unsqueeze(0).to(self.device)
         
-        with torch.no_grad():
-            predictions = self.model(image_tensor)
+        with torch.inference_mode():
+            predictions = self._model_for_profile(profile)(image_tensor)
         
         # Extract predictions
         pred = predictions[0]
@@ -76,7 +137,6 @@ class NailDetector:
         return {
             'boxes': nail_boxes,
             'scores': nail_scores,
-            'image': image,
             'num_nails': len(nail_boxes),
             'image_size': image.size
         }
@@ -98,14 +158,18 @@ class ScaleCorrectedHemoglobinModel(nn.Module):
 class HemoglobinPredictor:
     """Hemoglobin prediction model wrapper"""
     
-    def __init__(self, model_path: str, device: str = 'cpu'):
+    def __init__(self, model_path: Optional[str], device: str = 'cpu'):
         self.device = torch.device(device)
         self.model = self._load_model(model_path)
+        self._transforms = {}
         self.transform = self._get_transform()
         
-    def _load_model(self, model_path: str):
-        """Load the trained hemoglobin prediction model"""
-        checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
+    def _load_model(self, model_path: Optional[str]):
+        """Load the trained hemoglobin prediction model (random weights if no path is given)"""
+        if model_path is not None:
+            checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
+        else:
+            checkpoint = {}
         
         # Create base ResNet model
         base_model = models.resnet18(weights=None)
@@ -122,7 +186,8 @@ class HemoglobinPredictor:
             )
         else:
             # Regular model (apply default scale correction)
-            base_model.load_state_dict(checkpoint['model_state_dict'] if 'model_state_dict' in checkpoint else checkpoint)
+            if checkpoint:
+                base_model.load_state_dict(checkpoint['model_state_dict'] if 'model_state_dict' in checkpoint else checkpoint)
             # Default scale correction values
             model = ScaleCorrectedHemoglobinModel(
                 base_model=base_model,
@@ -132,32 +197,62 @@ class HemoglobinPredictor:
         
         model.to(self.device)
         model.eval()
-        return model
+        if not settings.MODEL_OPTIMIZATION_ENABLED:
+            # Scale/shift is applied to base_model.fc's output, which stays fp32 under autocast
+            return optimize_classifier(model, self.device, fp32_modules=('base_model.fc',))
+        
+        # Serve the bare ResNet with the scale correction folded into its final Linear
+        fold_output_affine(model.base_model.fc, model.scale_factor, model.shift_factor)
+        return optimize_classifier(model.base_model, self.device)
     
-    def _get_transform(self):
+    def _get_transform(self, input_size: int = 224):
         """Get preprocessing transform for nail images"""
-        return transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        if input_size not in self._transforms:
+            self._transforms[input_size] = transforms.Compose([
+                transforms.Resize((input_size, input_size)),
+                transforms.ToTensor(),
+                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+            ])
+        return self._transforms[input_size]
     
-    def predict_hemoglobin(self, nail_image: Image.Image) -> float:
+    def predict_hemoglobin(self, nail_image: Image.Image, input_size: int = 224) -> float:
         """
         Predict hemoglobin level from nail image
         
         Args:
             nail_image: PIL Image of nail region
+            input_size: Side length the crop is resized to
             
         Returns:
             float: Predicted hemoglobin level in g/L
         """
         # Preprocess image
-        image_tensor = self.transform(nail_image).unsqueeze(0).to(self.device)
+        image_tensor = to_model_input(self._get_transform(input_size)(nail_image).unsqueeze(0).to(self.device))
         
-        with torch.no_grad():
+        with torch.inference_mode():
             prediction = self.model(image_tensor)
             return prediction.item()
+    
+    def predict_hemoglobin_batch(self, nail_images: List[Image.Image], input_size: int = 224,
+                                 batch_size: int = 32) -> List[float]:
+        """
+        Predict hemoglobin levels for many nail crops, batch_size crops per forward pass
+        
+        Args:
+            nail_images: PIL Images of nail regions
+            input_size: Side length the crops are resized to
+            batch_size: Maximum crops per forward pass
+            
+        Returns:
+            list: Predicted hemoglobin level in g/L for each crop
+        """
+        transform = self._get_transform(input_size)
+        predictions: List[float] = []
+        for start in range(0, len(nail_images), batch_size):
+            batch = torch.stack([transform(crop) for crop in nail_images[start:start + batch_size]])
+            with torch.inference_mode():
+                predictions.extend(self.model(to_model_input(batch.to(self.device))).flatten().tolist())
+        return predictions
 
 class NailHemoglobinService:
     """Complete service for nail detection and hemoglobin prediction"""
@@ -180,16 +275,50 @@ class NailHemoglobinService:
         logger.info(f"Nail model exists: {self.nail_model_path.exists()}")
         logger.info(f"Hemoglobin model exists: {self.hemoglobin_model_path.exists()}")
         
-        # Initialize models as None - they'll be loaded on first use
-        self.nail_detector = None
-        self.hemoglobin_predictor = None
+        # Versioned models, loaded on first use and hot-reloaded when their checkpoint changes
+        self.models = ModelRegistry('nail')
+        self.models.register(
+            'nail_detector', self.nail_model_path,
+            loader=lambda path: (NailDetector(path, self.device), {}),
+            warm_up=lambda detector: self._warm_detector(detector, make_warmup_image())
+        )
+        self.models.register(
+            'hemoglobin', self.hemoglobin_model_path,
+            loader=lambda path: (HemoglobinPredictor(path, self.device), {}),
+            warm_up=lambda predictor: self._warm_predictor(predictor, make_warmup_image())
+        )
         self._models_initialized = False
+        self._init_lock = threading.Lock()
+    
+    @property
+    def nail_detector(self) -> Optional[NailDetector]:
+        """Detector version of the running request (see ModelRegistry.pinned)"""
+        return self.models.model('nail_detector')
+    
+    @nail_detector.setter
+    def nail_detector(self, detector: Optional[NailDetector]) -> None:
+        self.models.install('nail_detector', detector)
+    
+    @property
+    def hemoglobin_predictor(self) -> Optional[HemoglobinPredictor]:
+        """Predictor version of the running request (see ModelRegistry.pinned)"""
+        return self.models.model('hemoglobin')
+    
+    @hemoglobin_predictor.setter
+    def hemoglobin_predictor(self, predictor: Optional[HemoglobinPredictor]) -> None:
+        self.models.install('hemoglobin', predictor)
         
     def _initialize_models(self):
         """Initialize both models - called only when needed"""
         if self._models_initialized:
             return
-            
+        
+        with self._init_lock:
+            if not self._models_initialized:
+                self._load_models()
+    
+    def _load_models(self):
+        """Load both models from disk"""
         try:
             if not self.nail_model_path.exists():
                 raise FileNotFoundError(f"Nail detection model not found: {self.nail_model_path}")
@@ -197,14 +326,18 @@ class NailHemoglobinService:
             if not self.hemoglobin_model_path.exists():
                 raise FileNotFoundError(f"Hemoglobin model not found: {self.hemoglobin_model_path}")
             
-            logger.info("Loading nail detection model...")
-            self.nail_detector = NailDetector(str(self.nail_model_path), self.device)
-            
-            logger.info("Loading hemoglobin prediction model...")
-            self.hemoglobin_predictor = HemoglobinPredictor(str(self.hemoglobin_model_path), self.device)
+            with stage_timer("model_load"):
+                logger.info("Loading nail detection model...")
+                self.models.load('nail_detector')
+                
+                logger.info("Loading hemoglobin prediction model...")
+                self.models.load('hemoglobin')
             
             self._models_initialized = True
-            logger.info("Nail hemoglobin service initialized successfully!")
+            logger.info(f"Nail hemoglobin service initialized successfully! Versions: {self.models.describe()}")
+            
+            if settings.MODEL_WATCH_ENABLED:
+                self.models.watch(settings.MODEL_WATCH_INTERVAL_SECONDS)
             
         except Exception as e:
             logger.error(f"Error initializing models: {str(e)}")
@@ -214,7 +347,8 @@ class NailHemoglobinService:
         self, 
         image: Image.Image, 
         user_age: Optional[int] = None,
-        symptoms: Optional[List[str]] = None
+        symptoms: Optional[List[str]] = None,
+        profile: Optional[Union[str, InferenceProfile]] = None
     ) -> Dict[str, Any]:
         """
         Complete pipeline: detect nails and predict hemoglobin
@@ -223,10 +357,19 @@ class NailHemoglobinService:
             image: PIL Image of finger/nail
             user_age: User's age for context
             symptoms: List of user-reported symptoms
+            profile: Inference profile name or object (deployment default if None)
             
         Returns:
             dict: Complete analysis results
         """
+        profile = get_inference_profile(profile)
+        if inference_workers.handles('nail'):
+            return await inference_workers.run('nail', '_analyze_hemoglobin_sync', image, profile)
+        return await inference_executor.run(self._analyze_hemoglobin_sync, image, profile)
+    
+    @pinned_models('nail_analysis')
+    def _analyze_hemoglobin_sync(self, image: Image.Image, profile: InferenceProfile) -> Dict[str, Any]:
+        """Blocking part of analyze_hemoglobin, run on an inference slot"""
         try:
             # Initialize models if not already done
             if not self._models_initialized:
@@ -236,7 +379,9 @@ class NailHemoglobinService:
             
             # Step 1: Detect nails
             logger.info("Detecting nails...")
-            nail_results = self.nail_detector.detect_nails(image, confidence_threshold=0.5)
+            with stage_timer("detection"):
+                nail_results = self.nail_detector.detect_nails(image, profile=profile)
+            NAILS_DETECTED.inc(nail_results['num_nails'], endpoint=current_endpoint())
             
             if nail_results['num_nails'] == 0:
                 logger.warning("No nails detected in image")
@@ -256,24 +401,27 @@ class NailHemoglobinService:
             logger.info("Predicting hemoglobin levels...")
             hemoglobin_predictions = []
             
-            for i, (box, score) in enumerate(zip(nail_results['boxes'], nail_results['scores'])):
-                x1, y1, x2, y2 = [int(coord) for coord in box]
-                
-                # Crop nail region
-                nail_crop = image.crop((x1, y1, x2, y2))
-                
-                # Predict hemoglobin
-                hb_level = self.hemoglobin_predictor.predict_hemoglobin(nail_crop)
-                
-                hemoglobin_predictions.append({
-                    'nail_id': i + 1,
-                    'bounding_box': box,
-                    'confidence': score,
-                    'hemoglobin_g_per_L': hb_level,
-                    'nail_size': nail_crop.size
-                })
-                
-                logger.info(f"Nail {i+1}: {hb_level:.1f} g/L (confidence: {score:.3f})")
+            # Crop nail regions
+            with stage_timer("crop"):
+                nail_crops = [
+                    image.crop(tuple(int(coord) for coord in box))
+                    for box in nail_results['boxes']
+                ]
+            
+            with stage_timer("classification"):
+                for i, (box, score, nail_crop) in enumerate(zip(nail_results['boxes'], nail_results['scores'], nail_crops)):
+                    # Predict hemoglobin
+                    hb_level = self.hemoglobin_predictor.predict_hemoglobin(nail_crop, profile.classifier_input_size)
+                    
+                    hemoglobin_predictions.append({
+                        'nail_id': i + 1,
+                        'bounding_box': box,
+                        'confidence': score,
+                        'hemoglobin_g_per_L': hb_level,
+                        'nail_size': nail_crop.size
+                    })
+                    
+                    logger.info(f"Nail {i+1}: {hb_level:.1f} g/L (confidence: {score:.3f})")
             
             # Calculate average hemoglobin
             avg_hemoglobin = np.mean([pred['hemoglobin_g_per_L'] for pred in hemoglobin_predictions])
@@ -288,7 +436,8 @@ class NailHemoglobinService:
                 'nail_analysis': {
                     'num_nails_detected': nail_results['num_nails'],
                     'individual_predictions': hemoglobin_predictions,
-                    'average_hemoglobin_g_per_L': float(avg_hemoglobin)
+                    'average_hemoglobin_g_per_L': float(avg_hemoglobin),
+                    'inference_profile': profile.name
                 },
                 'anemia_risk': anemia_risk,
                 'severity': severity,
@@ -300,6 +449,7 @@ class NailHemoglobinService:
             
         except Exception as e:
             logger.error(f"Error in hemoglobin analysis: {str(e)}")
+            record_error("analysis")
             return {
                 'success': False,
                 'message': f'Analysis failed: {str(e)}',
@@ -310,6 +460,189 @@ class NailHemoglobinService:
                 }
             }
     
+    async def analyze_hemoglobin_sequence(
+        self,
+        frames: List[Image.Image],
+        keyframe_interval: Optional[int] = None,
+        profile: Optional[Union[str, InferenceProfile]] = None
+    ) -> Dict[str, Any]:
+        """
+        Multi-frame pipeline: detect nails on keyframes, track them in between and
+        aggregate per-nail hemoglobin estimates over all frames
+        
+        Args:
+            frames: Frames of a short clip of the same hand, in order
+            keyframe_interval: Run the detector at least every this many frames (setting if None)
+            profile: Inference profile name or object (deployment default if None)
+            
+        Returns:
+            dict: Per-nail estimates with spread, and the overall estimate
+        """
+        profile = get_inference_profile(profile)
+        if keyframe_interval is None:
+            keyframe_interval = settings.NAIL_KEYFRAME_INTERVAL
+        if inference_workers.handles('nail'):
+            return await inference_workers.run(
+                'nail', '_analyze_hemoglobin_sequence_sync', frames, keyframe_interval, profile
+            )
+        return await inference_executor.run(self._analyze_hemoglobin_sequence_sync, frames, keyframe_interval, profile)
+    
+    @pinned_models('nail_analysis')
+    def _analyze_hemoglobin_sequence_sync(self, frames: List[Image.Image], keyframe_interval: int,
+                                          profile: InferenceProfile) -> Dict[str, Any]:
+        """Blocking part of analyze_hemoglobin_sequence, run on an inference slot"""
+        empty_analysis = {
+            'num_nails_detected': 0,
+            'individual_predictions': [],
+            'average_hemoglobin_g_per_L': 0
+        }
+        try:
+            if not self._models_initialized:
+                self._initialize_models()
+            
+            tracker = NailTracker(
+                min_match_score=settings.NAIL_TRACK_MIN_SCORE,
+                max_missed_keyframes=settings.NAIL_TRACK_MAX_MISSED_KEYFRAMES
+            )
+            crops: List[Image.Image] = []
+            owners: List[NailTrack] = []
+            detector_runs = 0
+            last_keyframe = None
+            
+            for index, frame in enumerate(frames):
+                if frame.mode != 'RGB':
+                    frame = frame.convert('RGB')
+                gray = cv2.cvtColor(np.asarray(frame), cv2.COLOR_RGB2GRAY)
+                
+                if last_keyframe is None or tracker.needs_detection or index - last_keyframe >= keyframe_interval:
+                    with stage_timer("detection"):
+                        nail_results = self.nail_detector.detect_nails(frame, profile=profile)
+                    tracker.update_from_detections(index, gray, nail_results['boxes'], nail_results['scores'])
+                    detector_runs += 1
+                    last_keyframe = index
+                else:
+                    with stage_timer("tracking"):
+                        tracker.track(index, gray)
+                
+                with stage_timer("crop"):
+                    for track in tracker.active:
+                        crops.append(frame.crop(tuple(int(coord) for coord in track.box)))
+                        owners.append(track)
+            
+            tracks = [track for track in tracker.tracks if track.observations]
+            NAILS_DETECTED.inc(len(tracks), endpoint=current_endpoint())
+            if not crops:
+                logger.warning("No nails detected in any frame")
+                return {
+                    'success': False,
+                    'message': 'No nails detected in the clip. Please ensure nails are clearly visible.',
+                    'nail_analysis': empty_analysis
+                }
+            
+            # One batched pass over every crop from every frame
+            with stage_timer("classification"):
+                estimates = self.hemoglobin_predictor.predict_hemoglobin_batch(
+                    crops, profile.classifier_input_size, settings.HEMOGLOBIN_BATCH_SIZE
+                )
+            
+            per_track: Dict[int, List[float]] = {}
+            for track, estimate in zip(owners, estimates):
+                per_track.setdefault(track.track_id, []).append(estimate)
+            
+            nail_predictions = []
+            for track in tracks:
+                values = per_track.get(track.track_id)
+                if not values:
+                    continue
+                nail_predictions.append({
+                    'nail_id': track.track_id,
+                    'bounding_box': list(track.box),
+                    'confidence': float(np.mean(track.detection_scores)),
+                    'first_frame': track.observations[0][0],
+                    'last_frame': track.observations[-1][0],
+                    'frames_detected': sum(1 for _, _, source in track.observations if source == 'detected'),
+                    'frames_tracked': sum(1 for _, _, source in track.observations if source == 'tracked'),
+                    'reliable': len(values) >= settings.NAIL_SEQUENCE_MIN_ESTIMATES,
+                    **summarize_estimates(values)
+                })
+            
+            # Nails seen in only a few frames are likely spurious; fall back to all nails if none qualifies
+            reliable = [pred for pred in nail_predictions if pred['reliable']] or nail_predictions
+            medians = [pred['median_hemoglobin_g_per_L'] for pred in reliable]
+            avg_hemoglobin = float(np.mean(medians))
+            
+            return {
+                'success': True,
+                'nail_analysis': {
+                    'num_nails_detected': len(nail_predictions),
+                    'num_nails_used': len(reliable),
+                    'individual_predictions': nail_predictions,
+                    'average_hemoglobin_g_per_L': avg_hemoglobin,
+                    'between_nail_std_g_per_L': float(np.std(medians, ddof=1)) if len(medians) > 1 else 0.0,
+                    'frames_analyzed': len(frames),
+                    'detector_runs': detector_runs,
+                    'crops_evaluated': len(crops),
+                    'inference_profile': profile.name
+                },
+                'anemia_risk': self._assess_anemia_risk(avg_hemoglobin),
+                'severity': self._assess_severity(avg_hemoglobin),
+                'timestamp': datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in multi-frame hemoglobin analysis: {str(e)}")
+            record_error("analysis")
+            return {
+                'success': False,
+                'message': f'Analysis failed: {str(e)}',
+                'nail_analysis': empty_analysis
+            }
+    
+    def warm_up(self, image: Image.Image) -> None:
+        """Load both models and run a dummy image through them at every profile's shapes"""
+        self._initialize_models()
+        
+        with self.models.pinned():
+            self._warm_detector(self.nail_detector, image)
+            self._warm_predictor(self.hemoglobin_predictor, image)
+    
+    def _warm_detector(self, detector: NailDetector, image: Image.Image) -> None:
+        for profile in INFERENCE_PROFILES.values():
+            detector.detect_nails(image, profile=profile)
+    
+    def _warm_predictor(self, predictor: HemoglobinPredictor, image: Image.Image) -> None:
+        nail_crop = image.crop((0, 0, 128, 128))
+        for profile in INFERENCE_PROFILES.values():
+            predictor.predict_hemoglobin(nail_crop, input_size=profile.classifier_input_size)
+    
+    async def reload_models(self, force: bool = False) -> Union[Dict[str, str], List[Dict[str, str]]]:
+        """
+        Reload the models whose checkpoint changed (all with force) and swap them in without downtime
+        
+        With nail worker processes every worker reloads and one outcome dict per worker is returned.
+        """
+        if inference_workers.handles('nail'):
+            return await inference_workers.broadcast('nail', '_reload_models_sync', force)
+        return await inference_executor.run(self._reload_models_sync, force)
+    
+    def _reload_models_sync(self, force: bool) -> Dict[str, str]:
+        if not self._models_initialized:
+            return {name: "not loaded yet (loads on first use)" for name in self.models.describe()}
+        return self.models.reload(force)
+    
+    async def describe_models(self) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """Served and on-disk version of each model (one dict per worker process with nail workers)"""
+        if inference_workers.handles('nail'):
+            return await inference_workers.broadcast('nail', '_describe_models_sync')
+        return await inference_executor.run(self._describe_models_sync)
+    
+    def _describe_models_sync(self) -> Dict[str, Any]:
+        return {'served': self.models.describe(), 'checkpoints': self.models.refresh_checkpoint_versions()}
+    
+    def checkpoint_versions(self) -> Dict[str, Optional[str]]:
+        """On-disk model versions, part of result cache keys so a reload invalidates cached results"""
+        return self.models.checkpoint_versions()
+    
     def _assess_anemia_risk(self, hemoglobin_level: float) -> str:
         """Assess anemia risk based on hemoglobin level"""
         if hemoglobin_level < 120:
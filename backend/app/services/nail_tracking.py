@@ -0,0 +1,195 @@
+# NAIL TRACKING
+# Multi-frame nail captures: detector runs on keyframes only, template tracking in between
+
+import math
+import os
+import tempfile
+from typing import Any, Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.services.droplet_tracking import bbox_iou_matrix
+
+# (x1, y1, x2, y2), as returned by NailDetector.detect_nails
+Box = Tuple[float, float, float, float]
+
+
+def read_video_frames(contents: bytes, max_frames: int) -> List[Image.Image]:
+    """
+    Decode an uploaded video clip into at most max_frames RGB frames, evenly spaced
+
+    OpenCV can only open videos from a path, so the upload is spooled to a
+    temporary file. Skipped frames are grabbed without being decoded.
+    """
+    fd, path = tempfile.mkstemp(suffix='.video')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contents)
+
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError("Could not decode video")
+        try:
+            total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or max_frames
+            stride = max(1, math.ceil(total / max_frames))
+
+            frames = []
+            index = 0
+            while len(frames) < max_frames:
+                if index % stride == 0:
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    frames.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+                elif not capture.grab():
+                    break
+                index += 1
+        finally:
+            capture.release()
+    finally:
+        os.unlink(path)
+
+    if not frames:
+        raise ValueError("Video contains no frames")
+    return frames
+
+
+def _to_xywh(boxes: Sequence[Box]) -> List[Tuple[float, float, float, float]]:
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in boxes]
+
+
+class NailTrack:
+    """One nail followed across frames"""
+
+    def __init__(self, track_id: int, box: Box, score: float, template: np.ndarray):
+        self.track_id = track_id
+        self.box = box
+        self.template = template
+        self.detection_scores = [score]
+        self.active = True
+        # Keyframes in a row on which the lost track found no detection
+        self.missed_keyframes = 0
+        # (frame index, box, "detected" or "tracked")
+        self.observations: List[Tuple[int, Box, str]] = []
+
+
+class NailTracker:
+    """
+    Keeps nail identities between detector keyframes
+
+    On a keyframe, detections are matched by IoU to active tracks and to
+    recently lost ones, and the tracks' boxes and grayscale templates are
+    refreshed; a matched lost track resumes under its old id. Unmatched
+    detections start new tracks. Unmatched tracks are lost, and a lost track
+    that misses more than max_missed_keyframes keyframes in a row ends for
+    good. Between keyframes each active track is located by normalized
+    cross-correlation of its template inside a window around its last box.
+    A track whose best match scores below min_match_score is lost and the
+    next frame becomes a keyframe.
+    """
+
+    def __init__(self, search_margin: float = 0.25, min_match_score: float = 0.6, iou_threshold: float = 0.3,
+                 max_missed_keyframes: int = 2):
+        self.search_margin = search_margin
+        self.min_match_score = min_match_score
+        self.iou_threshold = iou_threshold
+        self.max_missed_keyframes = max_missed_keyframes
+        self.tracks: List[NailTrack] = []
+        self.needs_detection = True
+        self._next_id = 1
+
+    @property
+    def active(self) -> List[NailTrack]:
+        return [track for track in self.tracks if track.active]
+
+    @property
+    def recoverable(self) -> List[NailTrack]:
+        """Active tracks and lost tracks still within the missed-keyframe grace period"""
+        return [track for track in self.tracks
+                if track.active or track.missed_keyframes <= self.max_missed_keyframes]
+
+    @staticmethod
+    def _template(gray: np.ndarray, box: Box) -> np.ndarray:
+        x1, y1, x2, y2 = (int(round(v)) for v in box)
+        return gray[max(0, y1):y2, max(0, x1):x2].copy()
+
+    def update_from_detections(self, frame_index: int, gray: np.ndarray, boxes: Sequence[Box],
+                               scores: Sequence[float]) -> None:
+        """Apply a keyframe's detections"""
+        live = self.recoverable
+        iou = bbox_iou_matrix(_to_xywh([track.box for track in live]), _to_xywh(boxes))
+
+        matched_tracks, matched_boxes = set(), set()
+        track_indices, box_indices = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[track_indices, box_indices], kind='stable')
+        for t, b in zip(track_indices[order].tolist(), box_indices[order].tolist()):
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            track = live[t]
+            track.active = True
+            track.missed_keyframes = 0
+            track.box = tuple(boxes[b])
+            track.template = self._template(gray, track.box)
+            track.detection_scores.append(scores[b])
+            track.observations.append((frame_index, track.box, 'detected'))
+
+        for t, track in enumerate(live):
+            if t not in matched_tracks:
+                track.active = False
+                track.missed_keyframes += 1
+
+        for b, box in enumerate(boxes):
+            if b in matched_boxes:
+                continue
+            track = NailTrack(self._next_id, tuple(box), scores[b], self._template(gray, box))
+            self._next_id += 1
+            track.observations.append((frame_index, track.box, 'detected'))
+            self.tracks.append(track)
+
+        self.needs_detection = False
+
+    def track(self, frame_index: int, gray: np.ndarray) -> None:
+        """Follow every active track into a frame without running the detector"""
+        height, width = gray.shape
+        for track in self.active:
+            template = track.template
+            th, tw = template.shape
+            x1, y1, x2, y2 = (int(round(v)) for v in track.box)
+            mx = int((x2 - x1) * self.search_margin) + 2
+            my = int((y2 - y1) * self.search_margin) + 2
+            sx1, sy1 = max(0, x1 - mx), max(0, y1 - my)
+            sx2, sy2 = min(width, x2 + mx), min(height, y2 + my)
+            window = gray[sy1:sy2, sx1:sx2]
+
+            if th < 4 or tw < 4 or window.shape[0] < th or window.shape[1] < tw:
+                score = -1.0
+            else:
+                result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+                _, score, _, (lx, ly) = cv2.minMaxLoc(result)
+
+            if score < self.min_match_score:
+                track.active = False
+                self.needs_detection = True
+                continue
+
+            track.box = (float(sx1 + lx), float(sy1 + ly), float(sx1 + lx + tw), float(sy1 + ly + th))
+            track.observations.append((frame_index, track.box, 'tracked'))
+
+
+def summarize_estimates(values: Sequence[float]) -> Dict[str, Any]:
+    """Central value and spread of one nail's per-frame hemoglobin estimates"""
+    array = np.asarray(values, dtype=np.float64)
+    q25, median, q75 = np.percentile(array, [25, 50, 75])
+    return {
+        'median_hemoglobin_g_per_L': float(median),
+        'mean_hemoglobin_g_per_L': float(array.mean()),
+        'std_g_per_L': float(array.std(ddof=1)) if len(array) > 1 else 0.0,
+        'iqr_g_per_L': float(q75 - q25),
+        'min_g_per_L': float(array.min()),
+        'max_g_per_L': float(array.max()),
+        'num_estimates': len(array)
+    }
@@ -0,0 +1,105 @@
+# PATTERN ANALYSIS CACHE
+# Parameter-independent intermediates of LC slide analysis per image, so parameter re-sweeps skip detection and classification
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+PATTERN_CACHE_REQUESTS = registry.counter(
+    'luna_pattern_cache_requests_total',
+    'Pattern analysis cache lookups: slide contours and per-crop class probabilities, by outcome',
+    ('kind', 'result')
+)
+
+BBox = Tuple[int, int, int, int]
+
+
+@dataclass
+class SlideContours:
+    """Every external contour of a thresholded slide, as the area/size filter needs them"""
+    areas: np.ndarray  # (N,) float64, cv2.contourArea
+    rects: np.ndarray  # (N, 4) int64 x, y, w, h, cv2.boundingRect
+    height: int
+    width: int
+
+
+@dataclass
+class SlideEntry:
+    """
+    Cached intermediates of one slide
+
+    probabilities maps (classifier input size, crop bbox) to the classifier's
+    softmax output: a crop is fully determined by its bbox on the same image,
+    so any parameter combination that yields the same bbox reuses it.
+    """
+    contours: SlideContours
+    probabilities: Dict[Tuple[int, BBox], List[float]] = field(default_factory=dict)
+    cached: bool = True  # False for the throwaway entries used while the cache is disabled
+
+    def lookup(self, img_size: int, bbox: BBox) -> Optional[List[float]]:
+        probabilities = self.probabilities.get((img_size, bbox))
+        if self.cached:
+            PATTERN_CACHE_REQUESTS.inc(kind="crop", result="hit" if probabilities is not None else "miss")
+        return probabilities
+
+
+def slide_key(image: np.ndarray) -> str:
+    """Fingerprint of a decoded slide array, hashed in place without copying the pixels"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.dtype}:{image.shape}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+class SlideCache:
+    """In-process LRU of SlideEntry objects keyed on slide_key()"""
+
+    def __init__(self, max_images: int = 32, enabled: bool = True):
+        self.max_images = max_images
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, SlideEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[SlideEntry]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        PATTERN_CACHE_REQUESTS.inc(kind="contours", result="hit" if entry is not None else "miss")
+        return entry
+
+    def put(self, key: str, contours: SlideContours) -> SlideEntry:
+        """Cache the contours of a slide; returns its entry (uncached when the cache is disabled)"""
+        entry = SlideEntry(contours, cached=self.enabled)
+        if not self.enabled:
+            return entry
+
+        with self._lock:
+            # A concurrent request for the same slide may have stored it first; share its probabilities
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_images:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        """Forget every slide (e.g. after the classifier changed)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def create_slide_cache() -> SlideCache:
+    return SlideCache(max_images=settings.PATTERN_CACHE_MAX_IMAGES, enabled=settings.PATTERN_CACHE_ENABLED)
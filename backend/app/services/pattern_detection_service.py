@@ -7,26 +7,72 @@ from PIL import Image, ImageEnhance
 import os
 import io
 import time
-from typing import Dict, List, Tuple, Optional, Union
+import threading
+from typing import Any, Dict, List, Tuple, Optional, Union
 import logging
 
+from app.core.config import settings
+from app.core.inference_executor import inference_executor
+from app.core.inference_workers import inference_workers
+from app.core.metrics import PATTERNS_DETECTED, current_endpoint, record_error, stage_timer
+from app.services.droplet_tracking import DropletTracker, crop_signature
+from app.services.inference_profiles import INFERENCE_PROFILES, InferenceProfile, get_inference_profile
+from app.services.model_optimization import optimize_classifier, to_model_input
+from app.services.model_registry import ModelRegistry, pinned_models
+from app.services.pattern_cache import BBox, SlideContours, create_slide_cache, slide_key
+from app.services.warmup import make_warmup_image
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Droplet crops cut and classified at a time on a slide, bounding how many RGB crops are alive at once
+CROP_CHUNK_SIZE = 64
+
+def to_bgr(image: Image.Image) -> np.ndarray:
+    """
+    BGR array of a PIL image with a single full-size copy
+
+    np.array() is the only copy: convert() is skipped for RGB input and the
+    channel swap is done in place.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    array = np.array(image)
+    return cv2.cvtColor(array, cv2.COLOR_RGB2BGR, dst=array)
+
 class PatternDetectionService:
     """
     Service for detecting and classifying LC droplet patterns using pattern-aware ResNet18
     """
     
     def __init__(self):
-        self.model = None
+        # Versioned classifier, loaded on first use and hot-reloaded when its checkpoint changes
+        self.models = ModelRegistry('pattern')
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.class_names = {0: 'bipolar-circle', 1: 'radial-cross'}
+        self.default_class_names = {0: 'bipolar-circle', 1: 'radial-cross'}
         self.model_path = None
         self._models_checked = False
+        self._load_lock = threading.Lock()
+        self.slide_cache = create_slide_cache()
         logger.info(f"PatternDetectionService initialized on device: {self.device}")
     
+    @property
+    def model(self) -> Optional[nn.Module]:
+        """Classifier version of the running request (see ModelRegistry.pinned)"""
+        return self.models.model('pattern_classifier')
+    
+    @model.setter
+    def model(self, model: Optional[nn.Module]) -> None:
+        self.models.install('pattern_classifier', model)
+    
+    @property
+    def class_names(self) -> Dict[int, str]:
+        """Class names stored with the classifier version in use (default mapping if it has none)"""
+        version = self.models.get('pattern_classifier')
+        names = version.metadata.get('class_names') if version is not None else None
+        return names or self.default_class_names
+    
     def create_pattern_aware_resnet18(self, num_classes=2, dropout_rate=0.5, pretrained=False):
         """Create the same pattern-aware ResNet18 architecture used in training"""
         model = models.resnet18(pretrained=pretrained)
@@ -76,6 +122,9 @@ class PatternDetectionService:
             logger.info(f"Checking for model at: {abs_path}")
             if os.path.exists(abs_path):
                 self.model_path = abs_path
+                self.models.register(
+                    'pattern_classifier', abs_path, loader=self._read_checkpoint, warm_up=self._warm_classifier
+                )
                 model_found = True
                 logger.info(f"Found model file: {abs_path}")
                 break
@@ -101,66 +150,87 @@ class PatternDetectionService:
             logger.error("Pattern detection model not available")
             return False
         
-        logger.info(f"Attempting to load model from: {self.model_path}")
-        
-        try:
-            # Load checkpoint
-            logger.info("Loading checkpoint...")
-            checkpoint = torch.load(self.model_path, map_location=self.device, weights_only=False)
-            logger.info("Checkpoint loaded successfully")
-            
-            # Create model with pattern-aware architecture
-            logger.info("Creating pattern-aware ResNet18 architecture...")
-            self.model = self.create_pattern_aware_resnet18(num_classes=2, dropout_rate=0.5, pretrained=False)
-            logger.info("Model architecture created")
-            
-            # Load trained weights
-            logger.info("Loading model state dict...")
-            if 'model_state_dict' in checkpoint:
-                self.model.load_state_dict(checkpoint['model_state_dict'])
-                logger.info("Loaded model_state_dict from checkpoint")
-            else:
-                self.model.load_state_dict(checkpoint)
-                logger.info("Loaded direct state dict from checkpoint")
-            
-            logger.info("Moving model to device...")
-            self.model = self.model.to(self.device)
-            self.model.eval()
-            logger.info("Model moved to device and set to eval mode")
-            
-            # Get class mapping from checkpoint and normalize to lowercase
-            if 'class_to_idx' in checkpoint:
-                class_to_idx = checkpoint['class_to_idx']
-                # Convert to lowercase for consistency (Bipolar-Circle -> bipolar-circle)
-                self.class_names = {v: k.lower() for k, v in class_to_idx.items()}
-                logger.info(f"Loaded class_to_idx: {class_to_idx}")
-                logger.info(f"Normalized class names: {self.class_names}")
-            elif 'idx_to_class' in checkpoint:
-                idx_to_class = checkpoint['idx_to_class']
-                if all(isinstance(k, str) for k in idx_to_class.keys()):
-                    # Convert to lowercase for consistency
-                    self.class_names = {int(k): v.lower() for k, v in idx_to_class.items()}
-                else:
-                    # Convert to lowercase for consistency
-                    self.class_names = {k: v.lower() for k, v in idx_to_class.items()}
-                logger.info(f"Loaded idx_to_class: {idx_to_class}")
-                logger.info(f"Normalized class names: {self.class_names}")
-            else:
-                # Use default mapping with lowercase
-                self.class_names = {0: 'bipolar-circle', 1: 'radial-cross'}
-                logger.info("Using default class mapping")
+        with self._load_lock:
+            if self.model is not None:
+                return True
             
-            logger.info(f"Pattern detection model loaded successfully!")
-            logger.info(f"Final class names: {self.class_names}")
-            return True
+            logger.info(f"Attempting to load model from: {self.model_path}")
             
+            with stage_timer("model_load"):
+                return self._load_checkpoint()
+    
+    def _load_checkpoint(self) -> bool:
+        """
+        Load the checkpoint at model_path and serve it
+        """
+        try:
+            version = self.models.load('pattern_classifier')
+            logger.info(f"Pattern detection model loaded successfully! Version: {version.version}")
+            logger.info(f"Final class names: {version.metadata['class_names']}")
         except Exception as e:
             logger.error(f"Error loading pattern detection model: {e}")
             logger.error(f"Error type: {type(e).__name__}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             self.model = None
+            record_error("model_load")
             return False
+        
+        if settings.MODEL_WATCH_ENABLED:
+            self.models.watch(settings.MODEL_WATCH_INTERVAL_SECONDS)
+        return True
+    
+    def _read_checkpoint(self, path: str) -> Tuple[nn.Module, Dict[str, Dict[int, str]]]:
+        """
+        Build the architecture and load weights and class names from a checkpoint
+        """
+        # Load checkpoint
+        logger.info("Loading checkpoint...")
+        checkpoint = torch.load(path, map_location=self.device, weights_only=False)
+        logger.info("Checkpoint loaded successfully")
+        
+        # Create model with pattern-aware architecture
+        logger.info("Creating pattern-aware ResNet18 architecture...")
+        model = self.create_pattern_aware_resnet18(num_classes=2, dropout_rate=0.5, pretrained=False)
+        logger.info("Model architecture created")
+        
+        # Load trained weights
+        logger.info("Loading model state dict...")
+        if 'model_state_dict' in checkpoint:
+            model.load_state_dict(checkpoint['model_state_dict'])
+            logger.info("Loaded model_state_dict from checkpoint")
+        else:
+            model.load_state_dict(checkpoint)
+            logger.info("Loaded direct state dict from checkpoint")
+        
+        logger.info("Moving model to device...")
+        model = model.to(self.device)
+        model = optimize_classifier(model, self.device)
+        logger.info("Model moved to device and optimized for inference")
+        
+        # Get class mapping from checkpoint and normalize to lowercase
+        if 'class_to_idx' in checkpoint:
+            class_to_idx = checkpoint['class_to_idx']
+            # Convert to lowercase for consistency (Bipolar-Circle -> bipolar-circle)
+            class_names = {v: k.lower() for k, v in class_to_idx.items()}
+            logger.info(f"Loaded class_to_idx: {class_to_idx}")
+            logger.info(f"Normalized class names: {class_names}")
+        elif 'idx_to_class' in checkpoint:
+            idx_to_class = checkpoint['idx_to_class']
+            if all(isinstance(k, str) for k in idx_to_class.keys()):
+                # Convert to lowercase for consistency
+                class_names = {int(k): v.lower() for k, v in idx_to_class.items()}
+            else:
+                # Convert to lowercase for consistency
+                class_names = {k: v.lower() for k, v in idx_to_class.items()}
+            logger.info(f"Loaded idx_to_class: {idx_to_class}")
+            logger.info(f"Normalized class names: {class_names}")
+        else:
+            # Use default mapping with lowercase
+            class_names = {0: 'bipolar-circle', 1: 'radial-cross'}
+            logger.info("Using default class mapping")
+        
+        return model, {'class_names': class_names}
     
     def preprocess_image(self, image: Image.Image, img_size: int = 224) -> torch.Tensor:
         """
@@ -180,19 +250,9 @@ class PatternDetectionService:
         # Resize to consistent size
         image = image.resize((img_size, img_size), Image.Resampling.LANCZOS)
         
-        # Convert to tensor manually
-        width, height = image.size
-        pixels = list(image.getdata())
-        
-        tensor_data = []
-        for i in range(height):
-            row = []
-            for j in range(width):
-                pixel = pixels[i * width + j]
-                row.append([pixel[0]/255.0, pixel[1]/255.0, pixel[2]/255.0])
-            tensor_data.append(row)
-        
-        tensor = torch.tensor(tensor_data, dtype=torch.float32)
+        # Convert to tensor (divided in float64 and rounded once, matching per-pixel Python division)
+        pixels = np.asarray(image, dtype=np.float64) / 255.0
+        tensor = torch.from_numpy(pixels.astype(np.float32))
         tensor = tensor.permute(2, 0, 1)  # (H, W, C) -> (C, H, W)
         
         # ImageNet normalization
@@ -202,10 +262,9 @@ class PatternDetectionService:
         
         return tensor
     
-    def detect_patterns_improved(self, image: np.ndarray, min_area: int = 50, max_area: int = 5000, 
-                                expand_ratio: float = 0.4, merge_distance: int = 30) -> List[Tuple[int, int, int, int]]:
+    def extract_contours(self, image: np.ndarray) -> SlideContours:
         """
-        Improved pattern detection that works better for both circular and cross patterns
+        Threshold a slide and measure every external contour (the parameter-independent part of detection)
         """
         # Convert to grayscale
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -227,23 +286,41 @@ class PatternDetectionService:
         # Find contours
         contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
+        areas = np.array([cv2.contourArea(contour) for contour in contours], dtype=np.float64)
+        rects = np.array([cv2.boundingRect(contour) for contour in contours], dtype=np.int64).reshape(-1, 4)
+        return SlideContours(areas, rects, height=image.shape[0], width=image.shape[1])
+    
+    def filter_contours(self, contours: SlideContours, min_area: int, max_area: int,
+                        expand_ratio: float = 0.4) -> List[BBox]:
+        """
+        Bounding boxes of the contours within the area range, expanded to capture the full pattern
+        """
+        keep = (contours.areas >= min_area) & (contours.areas <= max_area)
+        x, y, w, h = contours.rects[keep].T
+        
+        # Expand bounding box to capture full pattern
+        pad_w = (w * expand_ratio).astype(np.int64)
+        pad_h = (h * expand_ratio).astype(np.int64)
+        x = np.maximum(0, x - pad_w)
+        y = np.maximum(0, y - pad_h)
+        w = np.minimum(contours.width - x, w + 2 * pad_w)
+        h = np.minimum(contours.height - y, h + 2 * pad_h)
+        
+        return list(zip(x.tolist(), y.tolist(), w.tolist(), h.tolist()))
+    
+    def detect_patterns_improved(self, image: np.ndarray, min_area: int = 50, max_area: int = 5000, 
+                                expand_ratio: float = 0.4, merge_distance: int = 30,
+                                contours: Optional[SlideContours] = None) -> List[Tuple[int, int, int, int]]:
+        """
+        Improved pattern detection that works better for both circular and cross patterns
+
+        Pass the slide's cached contours to skip thresholding and contour extraction.
+        """
+        if contours is None:
+            contours = self.extract_contours(image)
+        
         # Filter contours based on area
-        candidate_bboxes = []
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            
-            if min_area <= area <= max_area:
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # Expand bounding box to capture full pattern
-                pad_w = int(w * expand_ratio)
-                pad_h = int(h * expand_ratio)
-                x = max(0, x - pad_w)
-                y = max(0, y - pad_h)
-                w = min(image.shape[1] - x, w + 2 * pad_w)
-                h = min(image.shape[0] - y, h + 2 * pad_h)
-                
-                candidate_bboxes.append((x, y, w, h))
+        candidate_bboxes = self.filter_contours(contours, min_area, max_area, expand_ratio)
         
         # Merge nearby bboxes
         merged_bboxes = self.merge_nearby_boxes(candidate_bboxes, merge_distance)
@@ -253,49 +330,43 @@ class PatternDetectionService:
     def merge_nearby_boxes(self, bboxes: List[Tuple[int, int, int, int]], distance_threshold: int = 30) -> List[Tuple[int, int, int, int]]:
         """
         Merge bounding boxes that are close to each other
+
+        Greedy in input order: each box not yet merged absorbs every other
+        unmerged box whose center is within distance_threshold of its own.
         """
         if len(bboxes) <= 1:
             return bboxes
         
+        boxes = np.asarray(bboxes, dtype=np.int64)
+        cx = boxes[:, 0] + boxes[:, 2] // 2
+        cy = boxes[:, 1] + boxes[:, 3] // 2
+        
         merged = []
-        used = [False] * len(bboxes)
+        used = np.zeros(len(bboxes), dtype=bool)
         
-        for i, bbox1 in enumerate(bboxes):
+        for i in range(len(bboxes)):
             if used[i]:
                 continue
-                
-            x1, y1, w1, h1 = bbox1
-            cx1, cy1 = x1 + w1//2, y1 + h1//2
             
-            group = [bbox1]
-            used[i] = True
+            distance = np.sqrt((cx[i] - cx) ** 2 + (cy[i] - cy) ** 2)
+            group = ~used & (distance < distance_threshold)
+            group[i] = True
+            used |= group
             
-            for j, bbox2 in enumerate(bboxes):
-                if used[j] or i == j:
-                    continue
-                    
-                x2, y2, w2, h2 = bbox2
-                cx2, cy2 = x2 + w2//2, y2 + h2//2
-                
-                distance = np.sqrt((cx1 - cx2)**2 + (cy1 - cy2)**2)
-                
-                if distance < distance_threshold:
-                    group.append(bbox2)
-                    used[j] = True
-            
-            if len(group) == 1:
-                merged.append(group[0])
+            if np.count_nonzero(group) == 1:
+                merged.append(bboxes[i])
             else:
-                min_x = min(x for x, y, w, h in group)
-                min_y = min(y for x, y, w, h in group)
-                max_x = max(x + w for x, y, w, h in group)
-                max_y = max(y + h for x, y, w, h in group)
+                members = boxes[group]
+                min_x, min_y = members[:, 0].min(), members[:, 1].min()
+                max_x = (members[:, 0] + members[:, 2]).max()
+                max_y = (members[:, 1] + members[:, 3]).max()
                 
-                merged.append((min_x, min_y, max_x - min_x, max_y - min_y))
+                merged.append((int(min_x), int(min_y), int(max_x - min_x), int(max_y - min_y)))
         
         return merged
     
-    def classify_pattern(self, crop_image: Image.Image, confidence_threshold: float = 0.5) -> Tuple[str, float]:
+    def classify_pattern(self, crop_image: Image.Image, confidence_threshold: float = 0.5,
+                         img_size: int = 224) -> Tuple[str, float]:
         """
         Classify a single pattern crop
         """
@@ -303,28 +374,128 @@ class PatternDetectionService:
             return "unknown", 0.0
         
         try:
-            # Transform image
-            input_tensor = self.preprocess_image(crop_image).unsqueeze(0).to(self.device)
-            
-            # Classify
-            with torch.no_grad():
-                outputs = self.model(input_tensor)
-                probabilities = torch.softmax(outputs, dim=1)
-                confidence, predicted = torch.max(probabilities, 1)
-                
-                class_idx = predicted.item()
-                confidence_score = confidence.item()
-                
+            probabilities = self.pattern_probabilities(crop_image, img_size)
+        except Exception as e:
+            logger.error(f"Classification error: {e}")
+            record_error("classification")
+            return "error", 0.0
+        
+        return self.label_probabilities(probabilities, confidence_threshold)
+    
+    def pattern_probabilities(self, crop_image: Image.Image, img_size: int = 224) -> List[float]:
+        """
+        Class probabilities of a single pattern crop (threshold-independent, so they can be cached)
+        """
+        # Transform image
+        input_tensor = to_model_input(self.preprocess_image(crop_image, img_size).unsqueeze(0).to(self.device))
+        
+        # Classify
+        with torch.inference_mode():
+            outputs = self.model(input_tensor)
+            return torch.softmax(outputs, dim=1)[0].tolist()
+    
+    def label_probabilities(self, probabilities: List[float], confidence_threshold: float) -> Tuple[str, float]:
+        """
+        Class name and confidence for class probabilities ("uncertain" below the threshold)
+        """
+        class_idx = max(range(len(probabilities)), key=probabilities.__getitem__)
+        confidence_score = probabilities[class_idx]
+        
+        if confidence_score >= confidence_threshold:
+            class_name = self.class_names.get(class_idx, f"class_{class_idx}")
+        else:
+            class_name = "uncertain"
+        
+        return class_name, confidence_score
+
+    def classify_patterns(self, crops: List[Optional[Image.Image]], confidence_threshold: float = 0.5,
+                          img_size: int = 224) -> List[Tuple[str, float]]:
+        """
+        Classify several pattern crops in one forward pass
+        """
+        results: List[Tuple[str, float]] = [("unknown", 0.0)] * len(crops)
+        valid = [index for index, crop in enumerate(crops) if crop is not None]
+        if not valid:
+            return results
+
+        try:
+            batch = torch.stack([self.preprocess_image(crops[index], img_size) for index in valid])
+            with torch.inference_mode():
+                probabilities = torch.softmax(self.model(to_model_input(batch.to(self.device))), dim=1)
+                confidences, predicted = torch.max(probabilities, 1)
+
+            for index, class_idx, confidence_score in zip(valid, predicted.tolist(), confidences.tolist()):
                 if confidence_score >= confidence_threshold:
                     class_name = self.class_names.get(class_idx, f"class_{class_idx}")
                 else:
                     class_name = "uncertain"
-                
-                return class_name, confidence_score
-        
+                results[index] = (class_name, confidence_score)
+            return results
+
         except Exception as e:
-            logger.error(f"Classification error: {e}")
-            return "error", 0.0
+            logger.error(f"Batch classification error: {e}")
+            record_error("classification")
+            return [("error", 0.0) if crop is not None else ("unknown", 0.0) for crop in crops]
+
+    def classify_boxes(self, image_cv: np.ndarray, bboxes: List[BBox],
+                       confidence_threshold: float = 0.5, img_size: int = 224) -> List[Tuple[str, float]]:
+        """
+        Cut and classify the crops of several boxes, CROP_CHUNK_SIZE crops per forward pass
+        """
+        results: List[Tuple[str, float]] = []
+        for start in range(0, len(bboxes), CROP_CHUNK_SIZE):
+            crops = [self.extract_pattern_crop(image_cv, bbox) for bbox in bboxes[start:start + CROP_CHUNK_SIZE]]
+            results += self.classify_patterns(crops, confidence_threshold, img_size=img_size)
+        return results
+
+    def warm_up(self, image: Image.Image) -> None:
+        """
+        Load the model and run a dummy slide through detection, and classification at every profile's input size
+        """
+        if not self.load_model():
+            raise RuntimeError("Pattern detection model not available")
+        
+        self.detect_patterns_improved(to_bgr(image))
+        crop = image.crop((0, 0, 64, 64))
+        for profile in INFERENCE_PROFILES.values():
+            self.classify_pattern(crop, img_size=profile.classifier_input_size)
+    
+    def _warm_classifier(self, model: nn.Module) -> None:
+        """Run a newly loaded classifier version at every profile's input size before it is swapped in"""
+        crop = make_warmup_image().crop((0, 0, 64, 64))
+        with torch.inference_mode():
+            for profile in INFERENCE_PROFILES.values():
+                batch = self.preprocess_image(crop, profile.classifier_input_size).unsqueeze(0)
+                model(to_model_input(batch.to(self.device)))
+    
+    async def reload_models(self, force: bool = False) -> Union[Dict[str, str], List[Dict[str, str]]]:
+        """
+        Reload the classifier if its checkpoint changed (always with force) and swap it in without downtime
+        
+        With pattern worker processes every worker reloads and one outcome dict per worker is returned.
+        """
+        if inference_workers.handles('pattern'):
+            return await inference_workers.broadcast('pattern', '_reload_models_sync', force)
+        return await inference_executor.run(self._reload_models_sync, force)
+    
+    def _reload_models_sync(self, force: bool) -> Dict[str, str]:
+        if self.model is None:
+            return {'pattern_classifier': "not loaded yet (loads on first use)"}
+        return self.models.reload(force)
+    
+    async def describe_models(self) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """Served and on-disk version of the classifier (one dict per worker process with pattern workers)"""
+        if inference_workers.handles('pattern'):
+            return await inference_workers.broadcast('pattern', '_describe_models_sync')
+        return await inference_executor.run(self._describe_models_sync)
+    
+    def _describe_models_sync(self) -> Dict[str, Any]:
+        self.check_models_available()
+        return {'served': self.models.describe(), 'checkpoints': self.models.refresh_checkpoint_versions()}
+    
+    def checkpoint_versions(self) -> Dict[str, Optional[str]]:
+        """On-disk classifier version, part of result cache keys so a reload invalidates cached results"""
+        return self.models.checkpoint_versions()
     
     def extract_pattern_crop(self, image: np.ndarray, bbox: Tuple[int, int, int, int]) -> Optional[Image.Image]:
         """
@@ -349,9 +520,33 @@ class PatternDetectionService:
     
     async def analyze_patterns(self, image: Union[Image.Image, io.BytesIO], 
                               min_area: int = 50, max_area: int = 5000,
-                              confidence_threshold: float = 0.5) -> Dict[str, any]:
+                              confidence_threshold: float = 0.5,
+                              profile: Optional[Union[str, InferenceProfile]] = None,
+                              include_detections: bool = True) -> Dict[str, any]:
         """
         Main analysis function - detect and classify patterns in an image
+
+        With include_detections=False only the counts are returned, without
+        the per-droplet individual_detections list.
+        """
+        profile = get_inference_profile(profile)
+        if inference_workers.handles('pattern'):
+            if not isinstance(image, Image.Image):
+                image = Image.open(image)
+            return await inference_workers.run(
+                'pattern', '_analyze_patterns_sync', image, min_area, max_area, confidence_threshold, profile,
+                include_detections
+            )
+        return await inference_executor.run(
+            self._analyze_patterns_sync, image, min_area, max_area, confidence_threshold, profile, include_detections
+        )
+    
+    @pinned_models('pattern_analysis')
+    def _analyze_patterns_sync(self, image: Union[Image.Image, io.BytesIO], min_area: int, max_area: int,
+                               confidence_threshold: float, profile: InferenceProfile,
+                               include_detections: bool = True) -> Dict[str, any]:
+        """
+        Blocking part of analyze_patterns, run on an inference slot
         """
         # Load model if not already loaded
         if not self.load_model():
@@ -364,14 +559,30 @@ class PatternDetectionService:
         try:
             # Convert PIL to opencv format
             if isinstance(image, Image.Image):
-                image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+                image_cv = to_bgr(image)
             else:
                 # If it's BytesIO, convert to PIL first then to OpenCV
-                pil_image = Image.open(image)
-                image_cv = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+                image_cv = to_bgr(Image.open(image))
+            
+            # Re-posts of a slide (e.g. sweeping min_area / confidence_threshold) reuse its
+            # contours and crop probabilities, and only re-filter, re-merge and re-threshold
+            # (keyed on the classifier version too: cached probabilities are only valid for the model that made them)
+            cache_key = (
+                f"{self.models.get('pattern_classifier').version}:{slide_key(image_cv)}"
+                if self.slide_cache.enabled else None
+            )
+            slide = self.slide_cache.get(cache_key) if cache_key else None
             
             # Detect pattern bounding boxes
-            bboxes = self.detect_patterns_improved(image_cv, min_area, max_area)
+            with stage_timer("detection"):
+                if slide is None:
+                    slide = self.slide_cache.put(cache_key, self.extract_contours(image_cv))
+                bboxes = self.detect_patterns_improved(
+                    image_cv, min_area, max_area,
+                    expand_ratio=profile.pattern_expand_ratio,
+                    merge_distance=profile.pattern_merge_distance,
+                    contours=slide.contours
+                )
             
             # Classify each detected pattern
             detections = []
@@ -382,25 +593,52 @@ class PatternDetectionService:
                 'error': 0
             }
             
-            for bbox in bboxes:
-                # Extract crop
-                crop = self.extract_pattern_crop(image_cv, bbox)
+            img_size = profile.classifier_input_size
+            for start in range(0, len(bboxes), CROP_CHUNK_SIZE):
+                chunk = bboxes[start:start + CROP_CHUNK_SIZE]
+                cached = [slide.lookup(img_size, bbox) for bbox in chunk]
                 
-                # Classify
-                class_name, confidence = self.classify_pattern(crop, confidence_threshold)
+                # Extract crops a chunk at a time, so a dense slide never holds all its crops at once;
+                # crops whose probabilities are cached are not cut at all
+                with stage_timer("crop"):
+                    crops = [
+                        self.extract_pattern_crop(image_cv, bbox) if probabilities is None else None
+                        for bbox, probabilities in zip(chunk, cached)
+                    ]
                 
-                # Store result
-                detections.append({
-                    'bbox': bbox,
-                    'class': class_name,
-                    'confidence': confidence
-                })
-                
-                # Update counts
-                if class_name in pattern_counts:
-                    pattern_counts[class_name] += 1
-                else:
-                    pattern_counts['uncertain'] += 1
+                with stage_timer("classification"):
+                    for bbox, crop, probabilities in zip(chunk, crops, cached):
+                        # Classify
+                        if probabilities is None and crop is not None:
+                            try:
+                                probabilities = self.pattern_probabilities(crop, img_size)
+                                slide.probabilities[(img_size, bbox)] = probabilities
+                            except Exception as e:
+                                logger.error(f"Classification error: {e}")
+                                record_error("classification")
+                        
+                        if probabilities is not None:
+                            class_name, confidence = self.label_probabilities(probabilities, confidence_threshold)
+                        else:
+                            class_name, confidence = ("unknown", 0.0) if crop is None else ("error", 0.0)
+                        
+                        # Store result
+                        if include_detections:
+                            detections.append({
+                                'bbox': bbox,
+                                'class': class_name,
+                                'confidence': confidence
+                            })
+                        
+                        # Update counts
+                        if class_name in pattern_counts:
+                            pattern_counts[class_name] += 1
+                        else:
+                            pattern_counts['uncertain'] += 1
+            
+            for class_name, count in pattern_counts.items():
+                if count:
+                    PATTERNS_DETECTED.inc(count, endpoint=current_endpoint(), pattern=class_name)
             
             # Create analysis result
             analysis_result = {
@@ -414,8 +652,10 @@ class PatternDetectionService:
                     'min_area': min_area,
                     'max_area': max_area
                 },
-                'individual_detections': detections
+                'inference_profile': profile.name
             }
+            if include_detections:
+                analysis_result['individual_detections'] = detections
             
             return {
                 'success': True,
@@ -426,8 +666,118 @@ class PatternDetectionService:
             
         except Exception as e:
             logger.error(f"Pattern analysis failed: {e}")
+            record_error("analysis")
             return {
                 'success': False,
                 'message': f'Pattern analysis failed: {str(e)}',
                 'pattern_analysis': {}
             }
+    
+    async def analyze_pattern_sequence(self, frames: List[Image.Image], min_area: int = 50, max_area: int = 5000,
+                                       confidence_threshold: float = 0.5,
+                                       change_threshold: float = 0.06, iou_threshold: float = 0.3,
+                                       frame_interval: Optional[float] = None,
+                                       profile: Optional[Union[str, InferenceProfile]] = None) -> Dict[str, any]:
+        """
+        Time-lapse analysis - track droplets across frames and classify only the ones that changed
+        """
+        profile = get_inference_profile(profile)
+        args = (min_area, max_area, confidence_threshold, change_threshold, iou_threshold, frame_interval, profile)
+        if inference_workers.handles('pattern'):
+            return await inference_workers.run('pattern', '_analyze_pattern_sequence_sync', frames, *args)
+        return await inference_executor.run(self._analyze_pattern_sequence_sync, frames, *args)
+    
+    @pinned_models('sequence_analysis')
+    def _analyze_pattern_sequence_sync(self, frames: List[Image.Image], min_area: int, max_area: int,
+                                       confidence_threshold: float, change_threshold: float,
+                                       iou_threshold: float, frame_interval: Optional[float],
+                                       profile: InferenceProfile) -> Dict[str, any]:
+        """
+        Blocking part of analyze_pattern_sequence, run on an inference slot
+        """
+        if not self.load_model():
+            return {
+                'success': False,
+                'message': 'Pattern detection model not available',
+                'sequence_analysis': {}
+            }
+        
+        try:
+            tracker = DropletTracker(iou_threshold=iou_threshold, change_threshold=change_threshold)
+            img_size = profile.classifier_input_size
+            
+            frame_summaries = []
+            for frame_index, frame in enumerate(frames):
+                image_cv = to_bgr(frame)
+                
+                with stage_timer("detection"):
+                    bboxes = self.detect_patterns_improved(
+                        image_cv, min_area, max_area,
+                        expand_ratio=profile.pattern_expand_ratio,
+                        merge_distance=profile.pattern_merge_distance
+                    )
+                
+                # Only the small signatures of the frame's crops are kept; each crop is dropped once signed,
+                # and the crops to (re)classify are cut again a chunk at a time by classify_boxes
+                with stage_timer("crop"):
+                    signatures = []
+                    for bbox in bboxes:
+                        crop = self.extract_pattern_crop(image_cv, bbox)
+                        signatures.append(crop_signature(crop) if crop is not None else None)
+                
+                with stage_timer("classification"):
+                    classify = lambda boxes: self.classify_boxes(image_cv, boxes, confidence_threshold, img_size)
+                    summary = tracker.step(frame_index, bboxes, signatures, classify)
+                
+                # Counts over the droplets visible in this frame
+                pattern_counts = {'bipolar-circle': 0, 'radial-cross': 0, 'uncertain': 0, 'error': 0}
+                for track in tracker.tracks:
+                    if track.last_frame == frame_index:
+                        key = track.pattern if track.pattern in pattern_counts else 'uncertain'
+                        pattern_counts[key] += 1
+                summary['pattern_counts'] = pattern_counts
+                frame_summaries.append(summary)
+            
+            classified = tracker.classifications
+            observed = tracker.observations
+            for class_name, count in (frame_summaries[-1]['pattern_counts'].items() if frame_summaries else ()):
+                if count:
+                    PATTERNS_DETECTED.inc(count, endpoint=current_endpoint(), pattern=class_name)
+            
+            analysis_result = {
+                'frames_analyzed': len(frames),
+                'droplets_tracked': len(tracker.closed) + len(tracker.tracks),
+                'droplet_observations': observed,
+                'classifications_run': classified,
+                'classifications_reused': observed - classified,
+                'reuse_ratio': (observed - classified) / observed if observed else 0.0,
+                'confidence_threshold': confidence_threshold,
+                'tracking_parameters': {
+                    'change_threshold': change_threshold,
+                    'iou_threshold': iou_threshold,
+                    'frame_interval_seconds': frame_interval
+                },
+                'detection_parameters': {
+                    'min_area': min_area,
+                    'max_area': max_area
+                },
+                'inference_profile': profile.name,
+                'frames': frame_summaries,
+                'droplets': tracker.timelines(frame_interval)
+            }
+            
+            return {
+                'success': True,
+                'message': 'Sequence analysis completed successfully',
+                'sequence_analysis': analysis_result,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            }
+            
+        except Exception as e:
+            logger.error(f"Sequence analysis failed: {e}")
+            record_error("analysis")
+            return {
+                'success': False,
+                'message': f'Sequence analysis failed: {str(e)}',
+                'sequence_analysis': {}
+            }
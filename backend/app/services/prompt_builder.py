@@ -0,0 +1,150 @@
+# PROMPT BUILDER
+# Compact, stable LLM prompts with token counting and a token budget for retrieved context
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken ships with the OpenAI/langchain extras; fall back to an estimate
+    tiktoken = None
+
+from app.core.config import settings
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Tokens in text for model (tiktoken if installed, otherwise ~4 characters per token)"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+    """Cut text to at most max_tokens, on a word boundary where possible"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        cut = text[:max_tokens * 4]
+    else:
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    if len(cut) < len(text) and " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut
+
+
+def compact(text: str) -> str:
+    """Strip every line and collapse blank-line runs, so indented templates carry no whitespace tokens"""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def fmt_number(value: Any, digits: int = 1) -> str:
+    """Fixed-precision number, so equal inputs always render the same prompt text"""
+    try:
+        return f"{float(value):.{digits}f}"
+    except (TypeError, ValueError):
+        return "n/a"
+
+
+@dataclass
+class BuiltPrompt:
+    """Rendered prompt, its token count and how much retrieved context had to go"""
+
+    text: str
+    tokens: int
+    passages_dropped: int
+    passages_truncated: int
+
+
+class PromptBuilder:
+    """
+    Assembles a prompt from fixed sections and budget-trimmed retrieved context
+
+    Fixed sections are always kept, in the order added. Retrieved passages
+    fill whatever is left of the token budget, most relevant first; passages
+    that do not fit are dropped and the last one that partly fits is
+    truncated.
+    """
+
+    def __init__(self, budget: Optional[int] = None, model: str = "gpt-3.5-turbo"):
+        self.budget = settings.LLM_PROMPT_TOKEN_BUDGET if budget is None else budget
+        self.model = model
+        self._sections: List[Tuple[Optional[str], str]] = []
+        self._context_index: Optional[int] = None
+        self._context_title: Optional[str] = None
+        self._passages: List[str] = []
+
+    def section(self, title: Optional[str], body: str) -> "PromptBuilder":
+        self._sections.append((title, compact(body)))
+        return self
+
+    def context(self, title: str, passages: Sequence[str]) -> "PromptBuilder":
+        """Retrieved passages, most relevant first; rendered where this is called"""
+        self._context_index = len(self._sections)
+        self._context_title = title
+        self._passages = [" ".join(p.split()) for p in passages if p and p.strip()]
+        self._sections.append((title, ""))
+        return self
+
+    @staticmethod
+    def _render(sections: Sequence[Tuple[Optional[str], str]]) -> str:
+        blocks = [f"{title}:\n{body}" if title else body for title, body in sections if body]
+        return "\n\n".join(blocks)
+
+    def build(self) -> BuiltPrompt:
+        fixed = self._render(self._sections)
+        used = count_tokens(fixed, self.model)
+
+        kept: List[str] = []
+        trimmed = 0
+        if self._context_index is not None:
+            # Room left for context, less the section title and separators
+            remaining = self.budget - used - count_tokens(f"\n\n{self._context_title}:\n", self.model)
+            for passage in self._passages:
+                line = f"- {passage}"
+                cost = count_tokens(line + "\n", self.model)
+                if cost <= remaining:
+                    kept.append(line)
+                    remaining -= cost
+                    continue
+                partial = truncate_to_tokens(line, remaining - 1, self.model)
+                if len(partial) > 2:
+                    kept.append(partial + "...")
+                    trimmed = 1
+                break
+            self._sections[self._context_index] = (self._context_title, "\n".join(kept))
+
+        text = self._render(self._sections)
+        return BuiltPrompt(text, count_tokens(text, self.model), len(self._passages) - len(kept), trimmed)
+
+
+def format_nail_readings(predictions: Sequence[Dict[str, Any]]) -> str:
+    """One short line per nail: id, estimate and detection confidence (boxes and sizes are not useful to the LLM)"""
+    lines = []
+    for index, prediction in enumerate(predictions, 1):
+        nail_id = prediction.get('nail_id', index)
+        value = prediction.get('hemoglobin_g_per_L', prediction.get('median_hemoglobin_g_per_L'))
+        line = f"nail {nail_id}: {fmt_number(value)} g/L, confidence {fmt_number(prediction.get('confidence'), 2)}"
+        if 'std_g_per_L' in prediction:
+            line += f", spread ±{fmt_number(prediction['std_g_per_L'])} over {prediction.get('num_estimates', '?')} frames"
+        lines.append(line)
+    return "\n".join(lines) if lines else "none"
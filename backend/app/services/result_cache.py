@@ -0,0 +1,302 @@
+# RESULT CACHE
+# Caches analysis responses keyed on the decoded image plus request parameters
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from PIL import Image
+import logging
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def image_fingerprint(image: Image.Image) -> str:
+    """
+    Fingerprint a decoded image
+
+    Hashes the decoded pixels exactly. Cached results are medical readings of
+    one person's photo, so near-duplicate matching (a perceptual hash) is
+    deliberately not offered: it could serve one user's result for another
+    user's similar photo.
+
+    Args:
+        image: PIL Image object
+
+    Returns:
+        str: Hex fingerprint
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode())
+    digest.update(image.tobytes())
+    return f"c:{digest.hexdigest()}"
+
+
+class CacheBackend:
+    """Storage interface for the result cache"""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    Local-disk cache storing one JSON file per entry
+
+    File mtime records the last access, so LRU order and TTL survive restarts.
+    An in-process index of entries in access order keeps writes and evictions
+    O(1); the directory is rescanned every rescan_seconds to pick up entries
+    written by other processes sharing it.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 rescan_seconds: float = 60):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.rescan_seconds = rescan_seconds
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # File name -> last access time, least recently used first
+        self._index: "OrderedDict[str, float]" = OrderedDict()
+        self._scanned_at = 0.0
+        self._rescan()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _rescan(self) -> None:
+        entries = []
+        for path in self.directory.glob('*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path.name))
+            except FileNotFoundError:
+                continue
+        self._index = OrderedDict((name, mtime) for mtime, name in sorted(entries))
+        self._scanned_at = time.monotonic()
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        with self._lock:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                self._index.pop(path.name, None)
+                return None
+
+            if time.time() - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                self._index.pop(path.name, None)
+                self.evictions += 1
+                return None
+
+            try:
+                with open(path, 'r') as f:
+                    value = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable cache entry {path.name}: {e}")
+                path.unlink(missing_ok=True)
+                self._index.pop(path.name, None)
+                return None
+
+            # Touch the entry so it counts as recently used
+            os.utime(path, None)
+            self._index[path.name] = time.time()
+            self._index.move_to_end(path.name)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        # Unique per writer, so processes sharing the directory never write the same temp file
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as f:
+            tmp_path = f.name
+            try:
+                json.dump(value, f)
+            except BaseException:
+                f.close()
+                os.unlink(tmp_path)
+                raise
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._index[path.name] = time.time()
+            self._index.move_to_end(path.name)
+            if time.monotonic() - self._scanned_at > self.rescan_seconds:
+                self._rescan()
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries while over max_entries or expired"""
+        now = time.time()
+        while self._index:
+            name, accessed = next(iter(self._index.items()))
+            if len(self._index) <= self.max_entries and now - accessed <= self.ttl_seconds:
+                break
+            path = self.directory / name
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                del self._index[name]
+                continue
+            if mtime > accessed:
+                # Read by another process since it was indexed
+                self._index[name] = mtime
+                self._index.move_to_end(name)
+                continue
+            path.unlink(missing_ok=True)
+            del self._index[name]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self.directory.glob('*.json'):
+                path.unlink(missing_ok=True)
+            self._index.clear()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class ResultCache:
+    """Bounded cache of analysis responses with hit-rate accounting"""
+
+    def __init__(self, backend: CacheBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+
+    def make_key(self, namespace: str, image: Image.Image, **params) -> str:
+        """Build a cache key from the endpoint, the image fingerprint and request parameters"""
+        fingerprint = image_fingerprint(image)
+        encoded_params = json.dumps(params, sort_keys=True, default=str)
+        return f"{namespace}|{fingerprint}|{encoded_params}"
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        namespace = key.split('|', 1)[0]
+        value = self.backend.get(key)
+        with self._lock:
+            counter = self._hits if value is not None else self._misses
+            counter[namespace] = counter.get(namespace, 0) + 1
+        CACHE_REQUESTS.inc(endpoint=namespace, result="hit" if value is not None else "miss")
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+
+        try:
+            self.backend.set(key, value)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not cache result: {e}")
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counts and hit rate, overall and per endpoint"""
+        with self._lock:
+            namespaces = sorted(set(self._hits) | set(self._misses))
+            per_endpoint = {}
+            for namespace in namespaces:
+                hits = self._hits.get(namespace, 0)
+                misses = self._misses.get(namespace, 0)
+                per_endpoint[namespace] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': hits / (hits + misses) if hits + misses else 0.0
+                }
+            total_hits = sum(self._hits.values())
+            total_misses = sum(self._misses.values())
+
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'evictions': getattr(self.backend, 'evictions', 0),
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_rate': total_hits / (total_hits + total_misses) if total_hits + total_misses else 0.0,
+            'endpoints': per_endpoint
+        }
+
+
+def create_result_cache() -> ResultCache:
+    """Build the result cache configured in settings"""
+    if settings.RESULT_CACHE_BACKEND == "disk":
+        backend = DiskCacheBackend(
+            settings.RESULT_CACHE_DIR,
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS
+        )
+    else:
+        backend = InMemoryCacheBackend(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS
+        )
+
+    return ResultCache(backend, enabled=settings.RESULT_CACHE_ENABLED)
@@ -1,30 +1,95 @@
 import base64
 import io
+import threading
 from PIL import Image
-import torch
-from transformers import pipeline, BlipProcessor, BlipForConditionalGeneration
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Union
 import numpy as np
 
+from app.core.inference_executor import inference_executor
+from app.core.inference_workers import inference_workers
+from app.core.metrics import record_error, stage_timer
+from app.services.caption_engine import create_caption_engine
+from app.services.inference_profiles import CAPTION_PRESETS, InferenceProfile, get_inference_profile
+from app.services.model_optimization import keep_float32
+
 class VisionAnalysisService:
     def __init__(self):
-        # Initialize BLIP model for image captioning
-        self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+        # Models are loaded on first use, so the API process does not hold
+        # them when they are served by worker processes
+        self.processor = None
+        self.model = None
+        self.captioner = None
+        self.classifier = None
+        self._load_lock = threading.Lock()
+    
+    def _load_models(self):
+        """Load BLIP and the classification pipeline - called only when needed"""
+        if self.classifier is not None:
+            return
         
-        # Initialize classification pipeline for basic analysis
-        self.classifier = pipeline("image-classification", model="microsoft/resnet-50")
+        with self._load_lock:
+            if self.classifier is not None:
+                return
+            
+            # Deferred: transformers is only needed once the vision pipeline is used
+            from transformers import pipeline, BlipProcessor, BlipForConditionalGeneration
+            
+            with stage_timer("model_load"):
+                # Initialize BLIP model for image captioning
+                self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
+                self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+                # Under bfloat16 autocast the vocabulary projection stays fp32, so beam scores are full precision
+                keep_float32(self.model, ('text_decoder.cls.predictions.decoder',))
+                self.captioner = create_caption_engine(self.processor, self.model)
+                
+                # Initialize classification pipeline for basic analysis
+                self.classifier = pipeline("image-classification", model="microsoft/resnet-50")
         
-    async def analyze_skin_condition(self, image: Image.Image) -> Dict[str, Any]:
+    def _caption(self, image: Image.Image, profile: InferenceProfile) -> str:
+        """BLIP caption with the profile's decoding preset (cached per image, batched with concurrent requests)"""
+        with stage_timer("captioning"):
+            return self.captioner.caption(image, profile.caption)
+    
+    async def _caption_async(self, image: Image.Image, profile: InferenceProfile) -> str:
+        """_caption awaited outside the inference slots, which stay free for other requests meanwhile"""
+        if self.captioner is None:
+            await inference_executor.run(self._load_models)
+        with stage_timer("captioning"):
+            return await self.captioner.caption_async(image, profile.caption)
+    
+    async def analyze_skin_condition(
+        self,
+        image: Image.Image,
+        profile: Optional[Union[str, InferenceProfile]] = None
+    ) -> Dict[str, Any]:
         """Analyze skin condition from image"""
+        profile = get_inference_profile(profile)
+        if inference_workers.handles('vision'):
+            return await inference_workers.run('vision', '_analyze_skin_condition_sync', image, profile)
+        try:
+            description = await self._caption_async(image, profile)
+        except Exception as e:
+            record_error("analysis")
+            return {
+                "error": str(e),
+                "description": "Unable to analyze image",
+                "confidence": 0.0
+            }
+        return await inference_executor.run(self._analyze_skin_condition_sync, image, profile, description)
+    
+    def _analyze_skin_condition_sync(self, image: Image.Image, profile: InferenceProfile,
+                                     description: Optional[str] = None) -> Dict[str, Any]:
+        """Blocking part of analyze_skin_condition, run on an inference slot (captions too if not given)"""
         try:
+            self._load_models()
+            
             # Get image description
-            inputs = self.processor(image, return_tensors="pt")
-            out = self.model.generate(**inputs, max_length=50)
-            description = self.processor.decode(out[0], skip_special_tokens=True)
+            if description is None:
+                description = self._caption(image, profile)
             
             # Get classifications
-            classifications = self.classifier(image)
+            with stage_timer("classification"):
+                classifications = self.classifier(image)
             
             # Process for skin-specific insights
             analysis = {
@@ -37,20 +102,39 @@ class VisionAnalysisService:
             return analysis
             
         except Exception as e:
+            record_error("analysis")
             return {
                 "error": str(e),
                 "description": "Unable to analyze image",
                 "confidence": 0.0
             }
     
-    async def analyze_discharge(self, image: Image.Image) -> Dict[str, Any]:
+    async def analyze_discharge(
+        self,
+        image: Image.Image,
+        profile: Optional[Union[str, InferenceProfile]] = None
+    ) -> Dict[str, Any]:
         """Analyze discharge characteristics"""
+        profile = get_inference_profile(profile)
+        if inference_workers.handles('vision'):
+            return await inference_workers.run('vision', '_analyze_discharge_sync', image, profile)
+        try:
+            description = await self._caption_async(image, profile)
+        except Exception as e:
+            record_error("analysis")
+            return {"error": str(e)}
+        return await inference_executor.run(self._analyze_discharge_sync, image, profile, description)
+    
+    def _analyze_discharge_sync(self, image: Image.Image, profile: InferenceProfile,
+                                description: Optional[str] = None) -> Dict[str, Any]:
+        """Blocking part of analyze_discharge, run on an inference slot (captions too if not given)"""
         # For demo purposes, using general analysis
         # In production, use specialized medical models
         try:
-            inputs = self.processor(image, return_tensors="pt")
-            out = self.model.generate(**inputs, max_length=50)
-            description = self.processor.decode(out[0], skip_special_tokens=True)
+            self._load_models()
+            
+            if description is None:
+                description = self._caption(image, profile)
             
             # Analyze color and consistency
             color_info = self._analyze_color(image)
@@ -63,8 +147,18 @@ class VisionAnalysisService:
             }
             
         except Exception as e:
+            record_error("analysis")
             return {"error": str(e)}
     
+    def warm_up(self, image: Image.Image) -> None:
+        """Load BLIP and ResNet-50 and run a dummy image through every caption preset"""
+        self._load_models()
+        
+        for preset in CAPTION_PRESETS.values():
+            # Uncached, so every warm-up iteration runs the encoder and decoder
+            self.captioner.caption(image, preset, use_cache=False)
+        self.classifier(image)
+    
     def _extract_skin_concerns(self, description: str, classifications: List) -> List[str]:
         """Extract potential skin concerns from analysis"""
         concerns = []
@@ -0,0 +1,121 @@
+# STARTUP WARM-UP
+# Runs dummy inputs through every model before the service reports ready
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+
+from PIL import Image, ImageDraw
+
+from app.core.config import settings
+from app.core.inference_executor import inference_executor
+from app.core.inference_workers import inference_workers
+from app.core.metrics import endpoint_context, registry
+
+logger = logging.getLogger(__name__)
+
+# Typical upload size; the detector and the contour pass scale with it
+WARMUP_IMAGE_SIZE = (1024, 768)
+
+WARMUP_DURATION = registry.gauge(
+    'luna_warmup_duration_seconds', 'Duration of the startup warm-up, per model family and in total', ('model',)
+)
+READY = registry.gauge('luna_ready', 'Whether startup warm-up has finished (1) or not (0)')
+READY.set(0)
+
+
+def make_warmup_image() -> Image.Image:
+    """Gray slide with a grid of dark droplets, so contours and crops exist to classify"""
+    image = Image.new('RGB', WARMUP_IMAGE_SIZE, (180, 170, 160))
+    draw = ImageDraw.Draw(image)
+    for x in range(80, WARMUP_IMAGE_SIZE[0] - 80, 160):
+        for y in range(80, WARMUP_IMAGE_SIZE[1] - 80, 160):
+            draw.ellipse((x - 25, y - 25, x + 25, y + 25), fill=(60, 50, 45))
+    return image
+
+
+class WarmupState:
+    """Progress of the startup warm-up, reported by the readiness endpoint"""
+
+    def __init__(self):
+        self.ready = False
+        self.models: Dict[str, Dict[str, Any]] = {}
+        self.duration_seconds = 0.0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready,
+            'warmup_enabled': settings.WARMUP_ENABLED,
+            'duration_seconds': round(self.duration_seconds, 3),
+            'models': self.models
+        }
+
+
+warmup_state = WarmupState()
+
+
+async def _warm_family(family: str, service, image: Image.Image) -> None:
+    """Warm every inference slot (or worker process) serving a model family"""
+    if inference_workers.handles(family):
+        concurrency = len(inference_workers.pools[family].workers)
+        warm = lambda: inference_workers.run(family, 'warm_up', image)
+    else:
+        # Concurrent calls land on different slots, so each slot's thread pool is primed
+        concurrency = inference_executor.slots
+        warm = lambda: inference_executor.run(service.warm_up, image)
+
+    for _ in range(settings.WARMUP_ITERATIONS):
+        await asyncio.gather(*(warm() for _ in range(concurrency)))
+
+
+async def run_warmup(services: Dict[str, Any]) -> None:
+    """
+    Warm up the configured model families, then mark the service ready
+
+    Args:
+        services: Service instance (or LazyService) per model family ("nail", "pattern", "vision", "llm")
+    """
+    if not settings.WARMUP_ENABLED:
+        warmup_state.ready = True
+        READY.set(1)
+        return
+
+    image = make_warmup_image()
+    start = time.perf_counter()
+    with endpoint_context("warmup"):
+        for family in settings.WARMUP_MODELS:
+            service = services.get(family)
+            if service is None:
+                warmup_state.models[family] = {'status': 'unknown'}
+                continue
+            warmup_state.models[family] = {'status': 'running'}
+            family_start = time.perf_counter()
+            if hasattr(service, 'resolve_async'):
+                # A LazyService: import the pipeline's modules and build the service off the event loop
+                service = await service.resolve_async()
+
+            check = getattr(service, 'check_models_available', None)
+            if check is not None and not check()['models_ready']:
+                warmup_state.models[family] = {'status': 'skipped', 'reason': 'model files missing'}
+                continue
+
+            try:
+                if hasattr(service, 'warm_up'):
+                    await _warm_family(family, service, image)
+                # Otherwise (the LLM stack) building the service is the warm-up
+            except Exception as e:
+                logger.exception(f"Warm-up of {family} models failed")
+                warmup_state.models[family] = {'status': 'failed', 'error': str(e)}
+            else:
+                warmup_state.models[family] = {'status': 'done'}
+            duration = time.perf_counter() - family_start
+            warmup_state.models[family]['duration_seconds'] = round(duration, 3)
+            WARMUP_DURATION.set(duration, model=family)
+            logger.info(f"Warmed up {family} models in {duration:.2f}s")
+
+    warmup_state.duration_seconds = time.perf_counter() - start
+    WARMUP_DURATION.set(warmup_state.duration_seconds, model="total")
+    warmup_state.ready = True
+    READY.set(1)
+    logger.info(f"Warm-up finished in {warmup_state.duration_seconds:.2f}s")
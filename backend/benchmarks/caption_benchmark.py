@@ -0,0 +1,150 @@
+"""
+BLIP caption throughput and latency: per-call generate vs. the caption engine
+
+Loads BLIP once (downloads it on first run) and captions --requests
+synthetic images from --clients concurrent threads, as concurrent
+/analyze-image requests on inference slots would, for each caption preset:
+
+- generate: the previous path, one processor + model.generate call per request
+- engine, uncached: CaptionEngine with caching off; concurrent requests are
+  batched into one encoder pass and one generate call
+- engine, each image xN: caching on, every image posted --repeats times (cached
+  captions; another preset of a cached image only runs the decoder)
+
+Reports captions/sec, p50/p95 per-request latency and the mean batch size,
+and the share of engine captions identical to per-call generate (exit 1 if
+below --min-agreement).
+
+Usage (from backend/):
+    python -m benchmarks.caption_benchmark
+    python -m benchmarks.caption_benchmark --clients 8 --requests 64 --presets greedy-short beam
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import torch
+from PIL import Image
+
+from app.services.caption_engine import CAPTION_BATCH_SIZE, CaptionEngine
+from app.services.inference_profiles import CAPTION_PRESETS, CaptionPreset
+from app.services.vision_analysis import VisionAnalysisService
+from benchmarks.harness import percentile
+from benchmarks.synthetic import make_droplet_image, make_nail_image
+
+
+def make_images(count: int) -> List[Image.Image]:
+    """Distinct synthetic photos, alternating hands and LC slides"""
+    return [
+        make_nail_image(seed=seed)[0] if seed % 2 == 0 else make_droplet_image(num_droplets=40, seed=seed)[0]
+        for seed in range(count)
+    ]
+
+
+def run_clients(caption: Callable[[Image.Image], str], images: List[Image.Image],
+                clients: int) -> Tuple[List[str], List[float], float]:
+    """Caption every image from `clients` threads; returns captions, per-request ms and wall seconds"""
+    latencies: List[float] = [0.0] * len(images)
+
+    def request(index: int) -> str:
+        start = time.perf_counter()
+        text = caption(images[index])
+        latencies[index] = (time.perf_counter() - start) * 1000
+        return text
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        captions = list(pool.map(request, range(len(images))))
+    return captions, latencies, time.perf_counter() - start
+
+
+def batch_totals() -> Tuple[int, float]:
+    """Generate calls and images captioned by caption engines so far (luna_caption_batch_size)"""
+    return sum(CAPTION_BATCH_SIZE._counts.get((), [])), CAPTION_BATCH_SIZE._sums.get((), 0.0)
+
+
+def timed_batches(run: Callable[[], tuple]) -> Tuple[tuple, str]:
+    """Run, and report the mean engine batch size during it"""
+    calls, images = batch_totals()
+    result = run()
+    calls_after, images_after = batch_totals()
+    mean = f"{(images_after - images) / (calls_after - calls):.1f}" if calls_after > calls else '-'
+    return result, mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent requests')
+    parser.add_argument('--requests', type=int, default=32, help='Distinct images per run')
+    parser.add_argument('--repeats', type=int, default=3, help='Posts of each image in the cached run')
+    parser.add_argument('--presets', nargs='+', default=list(CAPTION_PRESETS), choices=list(CAPTION_PRESETS))
+    parser.add_argument('--batch-max-size', type=int, default=8)
+    parser.add_argument('--batch-wait-ms', type=float, default=10.0)
+    parser.add_argument('--min-agreement', type=float, default=0.9, help='Share of engine captions identical to generate')
+    args = parser.parse_args()
+
+    service = VisionAnalysisService()
+    service._load_models()
+    processor, model = service.processor, service.model
+    # Per-slot thread budget, as under the inference executor
+    torch.set_num_threads(max(1, torch.get_num_threads() // args.clients))
+    images = make_images(args.requests)
+
+    def generate(preset: CaptionPreset) -> Callable[[Image.Image], str]:
+        def caption(image: Image.Image) -> str:
+            with torch.no_grad():
+                out = model.generate(**processor(image, return_tensors="pt"),
+                                     max_length=preset.max_length, num_beams=preset.num_beams)
+            return processor.decode(out[0], skip_special_tokens=True)
+        return caption
+
+    def engine(cache_enabled: bool) -> CaptionEngine:
+        return CaptionEngine(processor, model, batch_max_size=args.batch_max_size,
+                             batch_wait_ms=args.batch_wait_ms, cache_enabled=cache_enabled)
+
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads per client, {args.clients} clients, "
+          f"{args.requests} images\n")
+    print("| Preset | Mode | Requests | Captions/s | p50 (ms) | p95 (ms) | Mean batch | Identical to generate |")
+    print("|---|---|---|---|---|---|---|---|")
+    failed = False
+    cached = engine(cache_enabled=True)
+    for name in args.presets:
+        preset = CAPTION_PRESETS[name]
+        generate(preset)(images[0])  # warm-up
+
+        (reference, latencies, seconds), _ = timed_batches(
+            lambda: run_clients(generate(preset), images, args.clients)
+        )
+        rows: List[tuple] = [('generate', reference, latencies, seconds, '-')]
+
+        uncached = engine(cache_enabled=False)
+        (captions, latencies, seconds), batch = timed_batches(
+            lambda: run_clients(lambda image: uncached.caption(image, preset), images, args.clients)
+        )
+        rows.append(('engine, uncached', captions, latencies, seconds, batch))
+
+        (captions, latencies, seconds), batch = timed_batches(
+            lambda: run_clients(lambda image: cached.caption(image, preset), images * args.repeats, args.clients)
+        )
+        rows.append((f'engine, each image x{args.repeats}', captions[:len(images)], latencies, seconds, batch))
+
+        for mode, captions, latencies, seconds, batch in rows:
+            count = len(latencies)
+            agreement = sum(a == b for a, b in zip(reference, captions)) / len(reference)
+            if mode != 'generate':
+                failed |= agreement < args.min_agreement
+            print(f"| {name} | {mode} | {count} | {count / seconds:.2f} | {percentile(latencies, 50):.0f} | "
+                  f"{percentile(latencies, 95):.0f} | {batch} | {agreement:.0%} |", flush=True)
+
+    print(f"\nCache after the repeat runs: {cached.describe()}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Embeddings providers: latency and retrieval overlap, local model vs. OpenAI
+
+Embeds the knowledge passages of LLMHealthService and HealthKnowledgeRAG with
+each provider, then runs a set of representative retrieval queries and
+reports
+
+- document embedding time (all passages, batched) and p50/p95 query latency
+- top-k overlap of each provider's retrieval with the reference provider
+  (OpenAI, the current default) on the same passages
+
+The OpenAI provider needs network access and a real OPENAI_API_KEY; without
+them only the local provider is timed and overlap is skipped.
+
+Usage (from backend/):
+    python -m benchmarks.embeddings_benchmark
+    python -m benchmarks.embeddings_benchmark --providers local --local-model ./models/all-MiniLM-L6-v2
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import create_embeddings
+from app.services.llm_health_service import HEALTH_KNOWLEDGE
+from app.services.rag_services import HEALTH_DOCUMENTS
+from benchmarks.harness import percentile
+
+# Queries shaped like the ones the services build
+QUERIES = [
+    "skin a close up of a red rash on the skin redness irritation",
+    "discharge a white substance on a cloth itching",
+    "hemoglobin anemia iron deficiency women health 118.4 g/L",
+    "yellow discharge with a strong odor",
+    "burning when urinating and frequent urge",
+    "acne on the chin before my period",
+    "how to keep intimate areas clean",
+    "clear stretchy discharge in the middle of my cycle",
+]
+
+
+def top_k(document_vectors: np.ndarray, query_vector: np.ndarray, k: int) -> List[int]:
+    """Indices of the k passages most similar to the query (cosine)"""
+    docs = document_vectors / np.linalg.norm(document_vectors, axis=1, keepdims=True)
+    query = query_vector / np.linalg.norm(query_vector)
+    return np.argsort(-(docs @ query), kind='stable')[:k].tolist()
+
+
+def evaluate(provider: str, passages: List[str], k: int, repeats: int) -> Optional[Dict[str, object]]:
+    settings.EMBEDDINGS_PROVIDER = provider
+    embeddings = create_embeddings()
+    try:
+        embeddings.embed_query("warm-up")
+    except Exception as e:
+        print(f"{provider}: unavailable ({type(e).__name__}: {e})")
+        return None
+
+    start = time.perf_counter()
+    document_vectors = np.asarray(embeddings.embed_documents(passages), dtype=np.float32)
+    documents_ms = (time.perf_counter() - start) * 1000
+
+    latencies, rankings = [], []
+    for _ in range(repeats):
+        for query in QUERIES:
+            start = time.perf_counter()
+            embeddings.embed_query(query)
+            latencies.append(time.perf_counter() - start)
+    for query in QUERIES:
+        rankings.append(top_k(document_vectors, np.asarray(embeddings.embed_query(query), dtype=np.float32), k))
+
+    return {
+        'provider': provider,
+        'dimensions': document_vectors.shape[1],
+        'documents_ms': documents_ms,
+        'query_p50_ms': percentile(latencies, 50) * 1000,
+        'query_p95_ms': percentile(latencies, 95) * 1000,
+        'rankings': rankings
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--providers', nargs='*', default=['openai', 'local'])
+    parser.add_argument('--local-model', default=settings.EMBEDDINGS_LOCAL_MODEL)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=5, help='Passes over the query set for latency')
+    args = parser.parse_args()
+
+    settings.EMBEDDINGS_LOCAL_MODEL = args.local_model
+    passages = list(HEALTH_KNOWLEDGE) + list(HEALTH_DOCUMENTS)
+
+    results = [r for r in (evaluate(p, passages, args.k, args.repeats) for p in args.providers) if r]
+    reference = next((r for r in results if r['provider'] == 'openai'), None)
+
+    print(f"\n# {len(passages)} passages, {len(QUERIES)} queries, top-{args.k}\n")
+    print(f"| Provider | Dims | Embed all passages (ms) | Query p50 (ms) | Query p95 (ms) | Top-{args.k} overlap vs openai |")
+    print("|---|---|---|---|---|---|")
+    for result in results:
+        if reference is None:
+            overlap = "n/a"
+        else:
+            shared = [
+                len(set(ours) & set(theirs)) / args.k
+                for ours, theirs in zip(result['rankings'], reference['rankings'])
+            ]
+            overlap = f"{np.mean(shared):.0%}"
+        print(f"| {result['provider']} | {result['dimensions']} | {result['documents_ms']:.1f} | "
+              f"{result['query_p50_ms']:.2f} | {result['query_p95_ms']:.2f} | {overlap} |")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Sweep inference slot / thread-per-slot configurations
+
+Runs the nail or pattern pipeline (random weights, synthetic images) through
+an InferenceExecutor for every combination of slots and threads per slot, with
+enough concurrent clients to keep every slot busy. Reports throughput and
+p50/p95 request latency and recommends the configuration with the highest
+throughput whose p95 stays within --p95-slack of the best p95.
+
+Usage (from backend/):
+    python -m benchmarks.executor_sweep
+    python -m benchmarks.executor_sweep --workload nail --slots 1 2 4 --threads 1 2 4 8 --pin
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import torch
+
+from app.core.inference_executor import InferenceExecutor, available_cores
+from app.services.inference_profiles import get_inference_profile
+from app.services.model_optimization import optimize_classifier
+from app.services.nail_hemoglobin_service import NailHemoglobinService, NailDetector, HemoglobinPredictor
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import environment_metadata, percentile
+from benchmarks.synthetic import make_droplet_image, make_nail_image
+
+
+def build_workload(workload: str, seed: int):
+    """Return a blocking zero-argument callable running one request of the workload"""
+    torch.manual_seed(seed)
+    profile = get_inference_profile()
+
+    if workload == "nail":
+        service = NailHemoglobinService()
+        service.nail_detector = NailDetector(None, service.device)
+        service.hemoglobin_predictor = HemoglobinPredictor(None, service.device)
+        service._models_initialized = True
+        image, _ = make_nail_image(seed=seed)
+        return lambda: service._analyze_hemoglobin_sync(image, profile)
+
+    service = PatternDetectionService()
+    service.model = optimize_classifier(service.create_pattern_aware_resnet18().to(service.device), service.device)
+    image, _ = make_droplet_image(seed=seed)
+    return lambda: service._analyze_patterns_sync(image, 100, 50000, 0.5, profile)
+
+
+async def _drive(executor: InferenceExecutor, fn, requests: int, clients: int) -> List[float]:
+    """Issue requests from a fixed number of concurrent clients, returning per-request latency"""
+    latencies: List[float] = []
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            start = time.perf_counter()
+            await executor.run(fn)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+def run_config(fn, slots: int, threads: int, pin: bool, requests: int, warmup: int) -> Dict[str, Any]:
+    executor = InferenceExecutor(slots=slots, threads_per_slot=threads, pin_cores=pin)
+    clients = slots * 2
+    try:
+        asyncio.run(_drive(executor, fn, warmup * slots, clients))
+        start = time.perf_counter()
+        latencies = asyncio.run(_drive(executor, fn, requests, clients))
+        elapsed = time.perf_counter() - start
+    finally:
+        executor.shutdown()
+
+    return {
+        'slots': slots,
+        'threads_per_slot': threads,
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000
+    }
+
+
+def recommend(results: List[Dict[str, Any]], p95_slack: float) -> Dict[str, Any]:
+    """Highest-throughput configuration whose p95 is within p95_slack of the best p95"""
+    best_p95 = min(r['p95_ms'] for r in results)
+    eligible = [r for r in results if r['p95_ms'] <= best_p95 * (1 + p95_slack)]
+    return max(eligible, key=lambda r: r['throughput_rps'])
+
+
+def main():
+    num_cores = len(available_cores())
+    default_values = sorted({v for v in (1, 2, 4, 8, num_cores) if v <= num_cores})
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workload', choices=['pattern', 'nail'], default='pattern')
+    parser.add_argument('--slots', type=int, nargs='*', default=default_values)
+    parser.add_argument('--threads', type=int, nargs='*', default=default_values)
+    parser.add_argument('--requests', type=int, default=40, help='Measured requests per configuration')
+    parser.add_argument('--warmup', type=int, default=1, help='Warm-up requests per slot')
+    parser.add_argument('--pin', action='store_true', help='Pin each slot to its own cores')
+    parser.add_argument('--oversubscribe', action='store_true',
+                        help='Also run configurations with slots x threads > available cores')
+    parser.add_argument('--p95-slack', type=float, default=0.25)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fn = build_workload(args.workload, args.seed)
+    env = environment_metadata()
+    print(f"# Executor sweep: {args.workload} workload, {num_cores} cores, torch {env.get('torch')}, pinned={args.pin}\n")
+    print("| Slots | Threads/slot | Throughput (req/s) | p50 (ms) | p95 (ms) |")
+    print("|---|---|---|---|---|")
+
+    results = []
+    for slots in args.slots:
+        for threads in args.threads:
+            if slots * threads > num_cores and not args.oversubscribe:
+                continue
+            result = run_config(fn, slots, threads, args.pin, args.requests, args.warmup)
+            results.append(result)
+            print(f"| {slots} | {threads} | {result['throughput_rps']:.2f} | "
+                  f"{result['p50_ms']:.1f} | {result['p95_ms']:.1f} |", flush=True)
+
+    if results:
+        best = recommend(results, args.p95_slack)
+        print(f"\nRecommended: INFERENCE_SLOTS={best['slots']} "
+              f"INFERENCE_THREADS_PER_SLOT={best['threads_per_slot']} "
+              f"({best['throughput_rps']:.2f} req/s, p95 {best['p95_ms']:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
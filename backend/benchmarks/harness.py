@@ -0,0 +1,141 @@
+# BENCHMARK HARNESS
+# Stage timing, memory measurement, JSON results and baseline comparison
+
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def measure_stage(fn: Callable[[], Any], iterations: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """
+    Time a zero-argument callable and measure its peak Python memory
+
+    Timing runs without tracemalloc so its overhead does not skew latency;
+    one extra traced run measures the peak allocation of a single call.
+
+    Args:
+        fn: Callable running one iteration of the stage
+        iterations: Number of timed iterations
+        warmup: Untimed iterations run first
+
+    Returns:
+        dict: p50/p95/mean/min latency in ms, peak traced and RSS memory in MB
+    """
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 95),
+        'mean_ms': statistics.mean(timings),
+        'min_ms': min(timings),
+        'peak_traced_mb': peak / (1024 * 1024),
+        'max_rss_mb': _max_rss_mb()
+    }
+
+
+def environment_metadata() -> Dict[str, Any]:
+    """Describe the machine and library versions a result was produced on"""
+    metadata = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor()
+    }
+    try:
+        import torch
+        metadata['torch'] = torch.__version__
+        metadata['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    try:
+        import cv2
+        metadata['opencv'] = cv2.__version__
+        metadata['opencv_threads'] = cv2.getNumThreads()
+    except ImportError:
+        pass
+    return metadata
+
+
+def write_results(path: str, stages: Dict[str, Dict[str, float]], extra: Optional[Dict[str, Any]] = None) -> None:
+    results = {'metadata': environment_metadata(), 'stages': stages}
+    if extra:
+        results['metadata'].update(extra)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(stages: Dict[str, Dict[str, float]], baseline_path: str,
+                        tolerance: float = 0.10, metric: str = 'p50_ms') -> List[str]:
+    """
+    Compare stage results to a saved baseline
+
+    Args:
+        stages: Current stage results
+        baseline_path: JSON file previously written by write_results
+        tolerance: Allowed relative slowdown before a stage counts as regressed
+        metric: Stage metric to compare
+
+    Returns:
+        list: Names of regressed stages (a comparison table is printed)
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)['stages']
+
+    regressions = []
+    print(f"\n{'stage':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in stages.items():
+        if name not in baseline:
+            print(f"{name:<28} {'-':>10} {result[metric]:>10.2f} {'new':>8}")
+            continue
+
+        before = baseline[name][metric]
+        after = result[metric]
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<28} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{flag}")
+
+    return regressions
+
+
+def print_results(stages: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'stage':<28} {'p50 ms':>9} {'p95 ms':>9} {'peak MB':>9}")
+    for name, result in stages.items():
+        print(f"{name:<28} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['peak_traced_mb']:>9.2f}")
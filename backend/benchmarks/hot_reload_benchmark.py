@@ -0,0 +1,166 @@
+"""
+Hot reload of the pattern classifier under concurrent load
+
+Serves the blocking part of /analyze-patterns from a random-weight checkpoint
+in a temporary directory with --clients threads. Halfway through it atomically
+replaces the checkpoint with new weights and reloads, as the checkpoint
+watcher would, and reports
+
+- requests served and failed before, across and after the swap, with p50/p95
+  latency of each phase
+- which checkpoint version each request was served with
+- how long the old version stayed alive after the swap (until the last
+  request pinning it finished) and process RSS before and after
+
+Exits 1 if any request failed, the new version was never served or the old
+version was not released within --release-timeout seconds.
+
+Usage (from backend/):
+    python -m benchmarks.hot_reload_benchmark
+    python -m benchmarks.hot_reload_benchmark --clients 8 --seconds 20
+"""
+
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import torch
+
+from app.core.config import settings
+from app.services.inference_profiles import get_inference_profile
+from app.services.model_registry import SETTLE_SECONDS
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import percentile
+from benchmarks.synthetic import make_droplet_image
+
+MODEL = 'pattern_classifier'
+MIN_AREA, MAX_AREA, CONFIDENCE = 100, 50000, 0.5
+
+
+def rss_mb() -> float:
+    """Resident set size of this process (Linux; 0 elsewhere)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return 0.0
+
+
+def write_checkpoint(service: PatternDetectionService, path: str, seed: int) -> None:
+    """Random-weight checkpoint in the training format, replacing path atomically"""
+    torch.manual_seed(seed)
+    model = service.create_pattern_aware_resnet18()
+    partial = path + '.partial'
+    torch.save({'model_state_dict': model.state_dict(),
+                'class_to_idx': {name: index for index, name in service.default_class_names.items()}}, partial)
+    os.replace(partial, path)
+    # Skip the settle delay meant for checkpoints still being copied into place
+    past = time.time() - SETTLE_SECONDS
+    os.utime(path, (past, past))
+
+
+def client(service, image, profile, stop: threading.Event, log: List[tuple]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            result = service._analyze_patterns_sync(image, MIN_AREA, MAX_AREA, CONFIDENCE, profile)
+            ok = result.get('success', False)
+            version = result['pattern_analysis']['model_versions'].get(MODEL) if ok else None
+        except Exception:
+            ok, version = False, None
+        end = time.perf_counter()
+        log.append((start, end, ok, version))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0, help='Load duration; the swap happens halfway')
+    parser.add_argument('--droplets', type=int, default=100)
+    parser.add_argument('--release-timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    # Every request classifies its crops, so requests keep using the model across the swap
+    settings.PATTERN_CACHE_ENABLED = False
+    service = PatternDetectionService()
+    profile = get_inference_profile(None)
+    image, _ = make_droplet_image(num_droplets=args.droplets)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'pattern_aware_resnet18_final.pth')
+        write_checkpoint(service, path, seed=0)
+        service.models.register(MODEL, path, loader=service._read_checkpoint, warm_up=service._warm_classifier)
+        old_version = service.models.load(MODEL).version
+        service._analyze_patterns_sync(image, MIN_AREA, MAX_AREA, CONFIDENCE, profile)  # warm-up
+        rss_before = rss_mb()
+
+        log: List[tuple] = []
+        stop = threading.Event()
+        clients = [threading.Thread(target=client, args=(service, image, profile, stop, log))
+                   for _ in range(args.clients)]
+        for thread in clients:
+            thread.start()
+
+        time.sleep(args.seconds / 2)
+        write_checkpoint(service, path, seed=1)
+        swap_start = time.perf_counter()
+        outcome = service.models.reload()[MODEL]
+        swapped = time.perf_counter()
+        released = None
+        while time.perf_counter() - swap_start < args.seconds / 2 + args.release_timeout:
+            if released is None and not service.models.describe()[MODEL]['retired_versions_alive']:
+                released = time.perf_counter()
+            if time.perf_counter() - swapped >= args.seconds / 2 and released is not None:
+                break
+            time.sleep(0.05)
+        stop.set()
+        for thread in clients:
+            thread.join()
+        rss_after = rss_mb()
+        new_version = service.models.get(MODEL).version
+
+    phases: Dict[str, List[tuple]] = collections.OrderedDict(
+        (('before swap', []), ('across swap', []), ('after swap', []))
+    )
+    for entry in log:
+        start, end = entry[0], entry[1]
+        phase = 'before swap' if end < swap_start else 'after swap' if start > swapped else 'across swap'
+        phases[phase].append(entry)
+
+    print(f"# {args.clients} clients, {args.droplets} droplets, reload: {outcome} "
+          f"({(swapped - swap_start) * 1000:.0f} ms load + warm-up)\n")
+    print("| Phase | Requests | Failed | p50 (ms) | p95 (ms) | Served by old | Served by new |")
+    print("|---|---|---|---|---|---|---|")
+    for name, entries in phases.items():
+        latencies = [(end - start) * 1000 for start, end, _, _ in entries] or [0.0]
+        versions = collections.Counter(version for *_, version in entries)
+        print(f"| {name} | {len(entries)} | {sum(not ok for _, _, ok, _ in entries)} | "
+              f"{percentile(latencies, 50):.1f} | {percentile(latencies, 95):.1f} | "
+              f"{versions[old_version]} | {versions[new_version]} |")
+
+    release_text = f"{(released - swapped) * 1000:.0f} ms after the swap" if released else "never"
+    print(f"\nVersions {old_version} -> {new_version}; old version released {release_text}; "
+          f"RSS {rss_before:.0f} -> {rss_after:.0f} MB")
+
+    failed = sum(not ok for *_, ok, _ in log)
+    problems = []
+    if failed:
+        problems.append(f"{failed} failed requests")
+    if new_version == old_version or not any(version == new_version for *_, version in log):
+        problems.append("new version never served")
+    if released is None:
+        problems.append("old version not released")
+    if problems:
+        print('; '.join(problems))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Import-time budget for the API
+
+Times `import app.main` in fresh interpreters (median of --runs). Fails
+(exit 1) if the median exceeds --budget seconds, or if importing the app
+loaded any of the model stacks that must stay deferred until their pipeline
+is first used:
+
+    torch, torchvision, transformers, langchain, chromadb, openai, cv2
+
+Also lists the slowest top-level packages from `python -X importtime`, so a
+regression points at the import that caused it.
+
+Usage (from backend/):
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget 1.5 --runs 7
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFERRED_MODULES = ('torch', 'torchvision', 'transformers', 'langchain', 'chromadb', 'openai', 'cv2')
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [name for name in %r if name in sys.modules]}))
+""" % (DEFERRED_MODULES,)
+
+
+def _run(importtime: bool = False) -> Tuple[Dict[str, object], str]:
+    env = {**os.environ, 'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', 'offline-benchmark')}
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', _CHILD]
+    completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr[-4000:])
+        sys.exit(2)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_packages(importtime_log: str, count: int) -> List[Tuple[str, float]]:
+    """Import time (ms) of each top-level package and its submodules, slowest first"""
+    totals: Dict[str, float] = defaultdict(float)
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # header row
+        totals[name.strip().split('.')[0]] += int(self_us) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=2.0, help='Median seconds allowed for import app.main')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Slowest packages to list')
+    args = parser.parse_args()
+
+    _run()  # populate the bytecode cache; the first import after a change compiles
+    results = [_run()[0] for _ in range(args.runs)]
+    median = statistics.median(result['seconds'] for result in results)
+    loaded = sorted({name for result in results for name in result['loaded']})
+
+    _, log = _run(importtime=True)
+    print(f"import app.main: median {median:.3f}s over {args.runs} runs (budget {args.budget:.2f}s)\n")
+    print("| Package | Import time (ms) |")
+    print("|---|---|")
+    for name, ms in slowest_packages(log, args.top):
+        print(f"| {name} | {ms:.1f} |")
+
+    problems = []
+    if median > args.budget:
+        problems.append(f"over budget by {median - args.budget:.3f}s")
+    if loaded:
+        problems.append(f"imported at startup: {', '.join(loaded)}")
+    if problems:
+        print(f"\n{'; '.join(problems)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
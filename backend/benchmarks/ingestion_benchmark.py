@@ -0,0 +1,110 @@
+"""
+Knowledge-base ingestion throughput: cold, unchanged and partially edited corpus
+
+Writes a synthetic corpus of reference documents (recombined health
+passages with per-document detail) to a temporary directory and ingests it
+three times with KnowledgeIngestor:
+
+- cold: empty store, every chunk is embedded
+- unchanged: same corpus, every chunk should be reused (nothing embedded)
+- edited: --edit-fraction of the documents get a new paragraph; only their
+  changed chunks should be embedded
+
+and reports chunks/sec overall and embedded chunks/sec for each run, per
+--concurrency value. Uses the configured EMBEDDINGS_PROVIDER; pass
+--embeddings local to run offline.
+
+Usage (from backend/):
+    python -m benchmarks.ingestion_benchmark --embeddings local --documents 500
+    python -m benchmarks.ingestion_benchmark --concurrency 1 2 4 8 --edit-fraction 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from app.core.config import settings
+from app.services.embeddings import create_embeddings
+from app.services.knowledge_ingestion import KnowledgeIngestor, KnowledgeStore
+from app.services.llm_health_service import HEALTH_KNOWLEDGE
+from app.services.rag_services import HEALTH_DOCUMENTS
+
+PASSAGES = list(HEALTH_DOCUMENTS) + list(HEALTH_KNOWLEDGE)
+
+
+def write_corpus(directory: Path, documents: int, paragraphs: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    for index in range(documents):
+        body = [f"Reference note {index}: {rng.choice(PASSAGES)}"]
+        body += [
+            f"{rng.choice(PASSAGES)} {rng.choice(PASSAGES)} (section {index}.{p})"
+            for p in range(paragraphs - 1)
+        ]
+        (directory / f"doc_{index:05d}.md").write_text("\n\n".join(body))
+
+
+def edit_corpus(directory: Path, fraction: float, seed: int = 1) -> int:
+    rng = random.Random(seed)
+    paths = sorted(directory.glob("*.md"))
+    edited = rng.sample(paths, max(1, int(len(paths) * fraction)))
+    for path in edited:
+        path.write_text(path.read_text() + f"\n\nRevised guidance: {rng.choice(PASSAGES)}")
+    return len(edited)
+
+
+async def run(args, concurrency: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus, store_dir = Path(tmp) / "corpus", Path(tmp) / "store"
+        corpus.mkdir()
+        write_corpus(corpus, args.documents, args.paragraphs)
+
+        ingestor = KnowledgeIngestor(
+            KnowledgeStore(str(store_dir)),
+            embeddings=create_embeddings(),
+            chunk_size=args.chunk_size,
+            overlap=settings.KNOWLEDGE_CHUNK_OVERLAP,
+            batch_size=args.batch_size,
+            concurrency=concurrency
+        )
+
+        runs = [("cold", None), ("unchanged", None), ("edited", lambda: edit_corpus(corpus, args.edit_fraction))]
+        for name, prepare in runs:
+            note = ""
+            if prepare is not None:
+                note = f" ({prepare()} docs edited)"
+            report = await ingestor.ingest(str(corpus))
+            print(f"| {concurrency} | {name}{note} | {report.files} | {report.chunks} | {report.embedded} | "
+                  f"{report.reused} | {report.seconds:.2f} | {report.chunks_per_second:.0f} | "
+                  f"{report.embedded_per_second:.0f} |", flush=True)
+            if report.errors:
+                print(f"    {report.failed} chunks failed: {report.errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--paragraphs', type=int, default=6, help='Paragraphs per document')
+    parser.add_argument('--edit-fraction', type=float, default=0.1)
+    parser.add_argument('--embeddings', choices=['openai', 'local'], default=settings.EMBEDDINGS_PROVIDER)
+    parser.add_argument('--chunk-size', type=int, default=settings.KNOWLEDGE_CHUNK_SIZE)
+    parser.add_argument('--batch-size', type=int, default=settings.EMBEDDINGS_BATCH_SIZE)
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, settings.KNOWLEDGE_INGEST_CONCURRENCY])
+    args = parser.parse_args()
+
+    settings.EMBEDDINGS_PROVIDER = args.embeddings
+
+    print(f"# {args.documents} documents x {args.paragraphs} paragraphs, embeddings {args.embeddings}, "
+          f"batch {args.batch_size}, chunk {args.chunk_size} chars\n")
+    print("| Concurrency | Run | Files | Chunks | Embedded | Reused | Seconds | Chunks/s | Embedded/s |")
+    print("|---|---|---|---|---|---|---|---|---|")
+    for concurrency in args.concurrency:
+        asyncio.run(run(args, concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Peak-memory regression check for the nail and pattern pipelines on reference images
+
+Runs the blocking part of /analyze-hemoglobin and /analyze-patterns
+(random-weight models with the production architectures) on synthetic
+reference images inside memory_accounting(), so every stage_timer stage
+records its peak, exactly as in a memory-accounted request. Also measures
+pattern classifier preprocessing of one crop on its own.
+
+Two peaks are gated per stage: the traced Python peak and the RSS peak
+(kernel high-water mark, reset at each stage boundary), which is where
+torch CPU tensors and PIL buffers show up. Each pipeline runs in a fresh
+spawned process with MALLOC_MMAP_THRESHOLD_ lowered, so every large buffer
+is its own mapping, returned to the kernel when freed: a stage's RSS peak
+then counts its buffers instead of memory malloc reuses from an earlier
+stage, and is stable between runs.
+
+With --record the per-stage peaks, plus --headroom and --slack-mb, are
+written as the budget file; otherwise they are compared to it and the script
+exits 1 if any stage exceeds either budget. benchmarks/memory_budgets.json
+is the reference (CPU, default arguments); re-record it when a change is
+expected to move memory, or record a separate file on other hardware.
+
+Usage (from backend/):
+    python -m benchmarks.memory_budget --record
+    python -m benchmarks.memory_budget
+    python -m benchmarks.memory_budget --budgets other_budgets.json --droplets 600
+"""
+
+import argparse
+import dataclasses
+import multiprocessing
+import os
+import sys
+from typing import Callable, Dict
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+# Read by glibc at process start, so it applies to the spawned measuring processes
+MMAP_THRESHOLD = str(64 * 1024)
+
+import torch
+
+from app.core.config import settings
+from app.core.memory import MB, memory_accounting
+from app.services.inference_profiles import get_inference_profile
+from app.services.model_optimization import optimize_classifier
+from app.services.nail_hemoglobin_service import HemoglobinPredictor, NailDetector, NailHemoglobinService
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import compare_to_baseline, write_results
+from benchmarks.synthetic import make_droplet_image, make_nail_image
+
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(__file__), 'memory_budgets.json')
+MIN_AREA, MAX_AREA, CONFIDENCE = 100, 50000, 0.5
+
+
+def build_nail_run(droplets: int, seed: int) -> Callable[[], object]:
+    torch.manual_seed(seed)
+    nail_service = NailHemoglobinService()
+    nail_service.nail_detector = NailDetector(None, nail_service.device)
+    nail_service.hemoglobin_predictor = HemoglobinPredictor(None, nail_service.device)
+    nail_service._models_initialized = True
+    # Random detector weights score low; lower the threshold so crops are predicted
+    profile = dataclasses.replace(get_inference_profile(None), nail_confidence_threshold=0.05)
+    nail_image, _ = make_nail_image(seed=seed)
+    return lambda: nail_service._analyze_hemoglobin_sync(nail_image, profile)
+
+
+def _pattern_service(seed: int) -> PatternDetectionService:
+    torch.manual_seed(seed)
+    # The warm-up run would otherwise leave the slide's crops classified in the cache
+    settings.PATTERN_CACHE_ENABLED = False
+    pattern_service = PatternDetectionService()
+    pattern_service.model = optimize_classifier(
+        pattern_service.create_pattern_aware_resnet18().to(pattern_service.device), pattern_service.device
+    )
+    return pattern_service
+
+
+def build_pattern_run(droplets: int, seed: int) -> Callable[[], object]:
+    pattern_service = _pattern_service(seed)
+    profile = get_inference_profile(None)
+    droplet_image, _ = make_droplet_image(num_droplets=droplets, seed=seed)
+    return lambda: pattern_service._analyze_patterns_sync(droplet_image, MIN_AREA, MAX_AREA, CONFIDENCE, profile)
+
+
+def build_preprocess_run(droplets: int, seed: int) -> Callable[[], object]:
+    pattern_service = _pattern_service(seed)
+    profile = get_inference_profile(None)
+    droplet_image, _ = make_droplet_image(num_droplets=droplets, seed=seed)
+    crop = droplet_image.crop((0, 0, 96, 96))
+    return lambda: pattern_service.preprocess_image(crop, profile.classifier_input_size)
+
+
+RUNS = {
+    'nail': build_nail_run,
+    'pattern': build_pattern_run,
+    'pattern.preprocess': build_preprocess_run,
+}
+
+
+def measure_run(name: str, droplets: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """Per-stage peaks (MB) of one run, keyed "<run>.<stage>"; "<run>.request" is the whole run"""
+    run = RUNS[name](droplets, seed)
+    run()  # warm-up: lazy initialization and allocator pools are not per-request costs
+    with memory_accounting() as account:
+        run()
+    results = {}
+    for stage, usage in account.stages.items():
+        # A run without stages of its own is reported under its name
+        key = name if len(account.stages) == 1 else f"{name}.{stage}"
+        results[key] = {
+            'python_peak_mb': usage['python_peak_bytes'] / MB,
+            'rss_peak_mb': usage['rss_peak_bytes'] / MB
+        }
+    return results
+
+
+def measure(droplets: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """Every run, each in a fresh process so earlier runs leave no memory behind for it to reuse"""
+    os.environ.setdefault('MALLOC_MMAP_THRESHOLD_', MMAP_THRESHOLD)
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for name in RUNS:
+        with context.Pool(1) as pool:
+            results.update(pool.apply(measure_run, (name, droplets, seed)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', default=DEFAULT_BUDGETS, help='Budget file to check against or record')
+    parser.add_argument('--record', action='store_true', help='Record current peaks (plus headroom) as the budgets')
+    parser.add_argument('--headroom', type=float, default=0.15, help='Relative slack added to recorded peaks')
+    parser.add_argument('--slack-mb', type=float, default=1.0,
+                        help='Absolute slack added to recorded peaks, so near-zero stages do not fail on noise')
+    parser.add_argument('--droplets', type=int, default=300, help='Droplets on the reference slide')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = measure(args.droplets, args.seed)
+
+    print(f"{'stage':<32} {'python peak MB':>15} {'rss peak MB':>12}")
+    for name, usage in results.items():
+        print(f"{name:<32} {usage['python_peak_mb']:>15.2f} {usage['rss_peak_mb']:>12.2f}")
+
+    if args.record:
+        budgets = {
+            name: {metric: peak * (1 + args.headroom) + args.slack_mb for metric, peak in usage.items()}
+            for name, usage in results.items()
+        }
+        write_results(args.budgets, budgets, {'droplets': args.droplets, 'seed': args.seed,
+                                              'headroom': args.headroom, 'slack_mb': args.slack_mb})
+        print(f"\nRecorded budgets in {args.budgets}")
+        return
+
+    if not os.path.exists(args.budgets):
+        print(f"\nNo budget file at {args.budgets}; run with --record first")
+        sys.exit(2)
+
+    over_budget = []
+    for metric in ('python_peak_mb', 'rss_peak_mb'):
+        over_budget += [
+            f"{name} ({metric})" for name in compare_to_baseline(results, args.budgets, tolerance=0.0, metric=metric)
+        ]
+    if over_budget:
+        print(f"\nOver memory budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Multi-frame nail capture: detector on every frame vs. keyframes + tracking
+
+Builds a synthetic clip of one hand (random-weight models): the hand drifts a
+few pixels per frame and every frame gets fresh sensor noise. The clip is
+analyzed
+
+- per frame: the single-image pipeline on every frame (detector + one
+  hemoglobin forward pass per nail)
+- sequence: /analyze-hemoglobin-sequence with several keyframe intervals
+  (detector on keyframes, template tracking in between, all crops batched)
+
+and the script reports frames/s, detector runs and the per-nail spread of the
+estimates. Random detector weights produce low scores, so the nail
+confidence threshold is lowered (--confidence) to give the tracker boxes.
+
+Usage (from backend/):
+    python -m benchmarks.nail_sequence_benchmark
+    python -m benchmarks.nail_sequence_benchmark --frames 60 --intervals 1 5 10 30
+"""
+
+import argparse
+import dataclasses
+import os
+import random
+import time
+from typing import List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import numpy as np
+import torch
+from PIL import Image
+
+from app.services.inference_profiles import get_inference_profile
+from app.services.nail_hemoglobin_service import HemoglobinPredictor, NailDetector, NailHemoglobinService
+from benchmarks.synthetic import make_nail_image
+
+
+def make_clip(frames: int, seed: int) -> List[Image.Image]:
+    """Frames of one hand drifting slowly, each with its own sensor noise"""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    base, _ = make_nail_image(seed=seed)
+    pixels = np.asarray(base, dtype=np.int16)
+
+    clip = []
+    dx = dy = 0
+    for _ in range(frames):
+        dx += rng.randint(-2, 2)
+        dy += rng.randint(-2, 2)
+        frame = np.roll(pixels, (dy, dx), axis=(0, 1)) + np_rng.normal(0, 3, pixels.shape).astype(np.int16)
+        clip.append(Image.fromarray(np.clip(frame, 0, 255).astype(np.uint8)))
+    return clip
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--intervals', type=int, nargs='*', default=[1, 5, 10])
+    parser.add_argument('--confidence', type=float, default=0.05, help='Nail confidence threshold')
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    service = NailHemoglobinService()
+    service.nail_detector = NailDetector(None, service.device)
+    service.hemoglobin_predictor = HemoglobinPredictor(None, service.device)
+    service._models_initialized = True
+    profile = dataclasses.replace(get_inference_profile(args.profile), nail_confidence_threshold=args.confidence)
+
+    clip = make_clip(args.frames, args.seed)
+    service._analyze_hemoglobin_sync(clip[0], profile)  # warm-up
+
+    start = time.perf_counter()
+    nails = 0
+    for frame in clip:
+        nails += service._analyze_hemoglobin_sync(frame, profile)['nail_analysis']['num_nails_detected']
+    per_frame = time.perf_counter() - start
+
+    print(f"# {args.frames} frames, profile {profile.name}, torch {torch.__version__}\n")
+    print("| Mode | Frames/s | Detector runs | Crops | Nails | Median per-nail std (g/L) | Speedup |")
+    print("|---|---|---|---|---|---|---|")
+    print(f"| per frame | {args.frames / per_frame:.2f} | {args.frames} | {nails} | - | - | 1.0x |")
+
+    for interval in args.intervals:
+        start = time.perf_counter()
+        result = service._analyze_hemoglobin_sequence_sync(clip, interval, profile)
+        elapsed = time.perf_counter() - start
+        if not result['success']:
+            print(f"| keyframe every {interval} | {args.frames / elapsed:.2f} | - | 0 | 0 | - | "
+                  f"{per_frame / elapsed:.1f}x |")
+            continue
+        analysis = result['nail_analysis']
+        spread = np.median([pred['std_g_per_L'] for pred in analysis['individual_predictions']])
+        print(f"| keyframe every {interval} | {args.frames / elapsed:.2f} | {analysis['detector_runs']} | "
+              f"{analysis['crops_evaluated']} | {analysis['num_nails_detected']} | {spread:.2f} | "
+              f"{per_frame / elapsed:.1f}x |")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Parity check and before/after timing for the load-time model optimizations
+
+Builds each production architecture with random weights (and randomized
+BatchNorm statistics, so folding is not a no-op), then compares the eager
+model with the optimized one (BatchNorm folded, channels_last, TorchScript
+frozen where possible) on the same inputs:
+
+- hemoglobin: ScaleCorrectedHemoglobinModel vs. the folded, frozen ResNet18
+- pattern: pattern-aware ResNet18 vs. its folded, frozen version
+- nail: Faster R-CNN backbone features and final detections
+
+Exits non-zero if any output differs by more than --tolerance (relative to
+the output magnitude).
+
+Usage (from backend/):
+    python -m benchmarks.optimization_benchmark
+    python -m benchmarks.optimization_benchmark --iterations 50 --tolerance 1e-3
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import torch
+import torch.nn as nn
+from torchvision import transforms
+from torchvision.ops import FrozenBatchNorm2d
+
+from app.core.config import settings
+from app.services.model_optimization import (
+    fold_output_affine, optimize_classifier, optimize_detector, to_model_input
+)
+from app.services.nail_hemoglobin_service import HemoglobinPredictor, NailDetector
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import percentile
+from benchmarks.synthetic import make_nail_image
+
+
+@contextmanager
+def optimization(enabled: bool):
+    """Temporarily switch load-time optimization on or off"""
+    previous = settings.MODEL_OPTIMIZATION_ENABLED
+    settings.MODEL_OPTIMIZATION_ENABLED = enabled
+    try:
+        yield
+    finally:
+        settings.MODEL_OPTIMIZATION_ENABLED = previous
+
+
+def randomize_batchnorm(model: nn.Module) -> None:
+    """Give BatchNorm layers non-trivial statistics so folding is actually exercised"""
+    with torch.no_grad():
+        for module in model.modules():
+            if isinstance(module, (nn.BatchNorm2d, FrozenBatchNorm2d)):
+                module.running_mean.copy_(torch.randn_like(module.running_mean) * 0.1)
+                module.running_var.copy_(torch.rand_like(module.running_var) + 0.5)
+                module.weight.copy_(torch.rand_like(module.weight) + 0.5)
+                module.bias.copy_(torch.randn_like(module.bias) * 0.1)
+
+
+def time_call(fn: Callable[[], object], iterations: int, warmup: int = 3) -> float:
+    """p50 latency of fn in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 50) * 1000
+
+
+def relative_error(reference: torch.Tensor, candidate: torch.Tensor) -> float:
+    scale = reference.abs().max().item() or 1.0
+    return (reference - candidate).abs().max().item() / scale
+
+
+def compare_classifier(name: str, eager: nn.Module, optimized: nn.Module, sizes: List[int],
+                       iterations: int) -> List[Dict[str, object]]:
+    rows = []
+    for size in sizes:
+        batch = torch.randn(1, 3, size, size)
+        with torch.inference_mode():
+            error = relative_error(eager(batch), optimized(to_model_input(batch)))
+            eager_ms = time_call(lambda: eager(batch), iterations)
+            optimized_ms = time_call(lambda: optimized(to_model_input(batch)), iterations)
+        rows.append({'model': name, 'input': f"1x3x{size}x{size}", 'eager_ms': eager_ms,
+                     'optimized_ms': optimized_ms, 'error': error})
+    return rows
+
+
+def compare_detector(iterations: int) -> List[Dict[str, object]]:
+    with optimization(False):
+        detector = NailDetector(None, 'cpu')
+    randomize_batchnorm(detector.model)
+    eager = detector.model
+    with optimization(True):
+        optimized = optimize_detector(copy.deepcopy(eager))
+
+    image, _ = make_nail_image()
+    batch = transforms.ToTensor()(image).unsqueeze(0)
+    with torch.inference_mode():
+        images, _ = eager.transform(list(batch))
+        eager_features = eager.backbone(images.tensors)
+        optimized_features = optimized.backbone(images.tensors)
+        feature_error = max(
+            relative_error(eager_features[key], optimized_features[key]) for key in eager_features
+        )
+
+        eager_boxes = eager(batch)[0]['boxes']
+        optimized_boxes = optimized(batch)[0]['boxes']
+        if eager_boxes.shape == optimized_boxes.shape and len(eager_boxes):
+            box_error = relative_error(eager_boxes, optimized_boxes)
+        else:
+            box_error = 0.0 if eager_boxes.shape == optimized_boxes.shape else float('inf')
+
+        eager_ms = time_call(lambda: eager(batch), iterations)
+        optimized_ms = time_call(lambda: optimized(batch), iterations)
+
+    return [{'model': 'nail detector', 'input': f"1x3x{image.height}x{image.width}", 'eager_ms': eager_ms,
+             'optimized_ms': optimized_ms, 'error': max(feature_error, box_error)}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='Maximum relative output difference')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    sizes = [160, 224]
+    rows = []
+
+    # Hemoglobin: the optimized predictor serves the bare ResNet with scale/shift folded in
+    with optimization(False):
+        reference = HemoglobinPredictor(None, 'cpu')
+    randomize_batchnorm(reference.model)
+    eager = reference.model
+    folded = copy.deepcopy(eager)
+    with optimization(True):
+        fold_output_affine(folded.base_model.fc, folded.scale_factor, folded.shift_factor)
+        optimized = optimize_classifier(folded.base_model, torch.device('cpu'))
+    rows += compare_classifier('hemoglobin', eager, optimized, sizes, args.iterations)
+
+    # Pattern-aware ResNet18
+    eager = PatternDetectionService().create_pattern_aware_resnet18().eval()
+    randomize_batchnorm(eager)
+    with optimization(True):
+        optimized = optimize_classifier(copy.deepcopy(eager), torch.device('cpu'))
+    rows += compare_classifier('pattern', eager, optimized, sizes, args.iterations)
+
+    rows += compare_detector(args.iterations)
+
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads, freeze={settings.MODEL_FREEZE_ENABLED}\n")
+    print("| Model | Input | Eager p50 (ms) | Optimized p50 (ms) | Speedup | Max rel. error | Parity |")
+    print("|---|---|---|---|---|---|---|")
+    failed = False
+    for row in rows:
+        ok = row['error'] <= args.tolerance
+        failed |= not ok
+        print(f"| {row['model']} | {row['input']} | {row['eager_ms']:.2f} | {row['optimized_ms']:.2f} | "
+              f"{row['eager_ms'] / row['optimized_ms']:.2f}x | {row['error']:.2e} | {'ok' if ok else 'FAIL'} |")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
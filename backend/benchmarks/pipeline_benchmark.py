@@ -0,0 +1,127 @@
+"""
+Offline micro-benchmarks for every stage of the nail and pattern pipelines
+
+Uses randomly initialized models with the production architectures
+(Faster R-CNN ResNet50-FPN, the scale-corrected ResNet18 and the pattern-aware
+ResNet18) and synthetic nail/droplet images, so no checkpoints, network or GPU
+are needed. Each stage is timed separately; results are written as JSON with
+p50/p95 latency and peak memory and can be compared to a saved baseline.
+
+Usage (from backend/):
+    python -m benchmarks.pipeline_benchmark --output baseline.json
+    python -m benchmarks.pipeline_benchmark --baseline baseline.json --tolerance 0.1
+    python -m benchmarks.pipeline_benchmark --stages pattern.merge pattern.preprocess
+"""
+
+import argparse
+import io
+import os
+import sys
+from typing import Callable, Dict
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from app.services.model_optimization import optimize_classifier, to_model_input
+from app.services.nail_hemoglobin_service import NailDetector, HemoglobinPredictor
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import compare_to_baseline, measure_stage, print_results, write_results
+from benchmarks.synthetic import encode_image, make_droplet_image, make_nail_image
+
+
+def build_stages(num_droplets: int, seed: int) -> Dict[str, Callable[[], object]]:
+    """Prepare inputs once and return a zero-argument callable per stage"""
+    torch.manual_seed(seed)
+    device = 'cpu'
+
+    nail_detector = NailDetector(None, device)
+    hemoglobin_predictor = HemoglobinPredictor(None, device)
+    pattern_service = PatternDetectionService()
+    pattern_service.model = optimize_classifier(pattern_service.create_pattern_aware_resnet18().to(device), device)
+
+    # Nail pipeline inputs: use the synthetic nail boxes so crop/classify stages do
+    # not depend on what an untrained detector happens to find
+    nail_image, nail_boxes = make_nail_image(seed=seed)
+    nail_bytes = encode_image(nail_image)
+    nail_crops = [nail_image.crop(box) for box in nail_boxes]
+    nail_tensors = torch.stack([hemoglobin_predictor.transform(crop) for crop in nail_crops])
+
+    # Pattern pipeline inputs
+    droplet_image, _ = make_droplet_image(num_droplets=num_droplets, seed=seed)
+    droplet_bytes = encode_image(droplet_image)
+    droplet_bgr = cv2.cvtColor(np.array(droplet_image), cv2.COLOR_RGB2BGR)
+    candidate_bboxes = pattern_service.detect_patterns_improved(droplet_bgr, merge_distance=0)
+    merged_bboxes = pattern_service.merge_nearby_boxes(candidate_bboxes, 30)
+    pattern_crops = [pattern_service.extract_pattern_crop(droplet_bgr, bbox) for bbox in merged_bboxes]
+    pattern_crops = [crop for crop in pattern_crops if crop is not None]
+    pattern_tensors = torch.stack([pattern_service.preprocess_image(crop) for crop in pattern_crops])
+
+    def decode(data: bytes) -> Callable[[], object]:
+        def run():
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            return image
+        return run
+
+    def classify_each(model, tensors):
+        def run():
+            with torch.inference_mode():
+                for tensor in tensors:
+                    model(to_model_input(tensor.unsqueeze(0)))
+        return run
+
+    return {
+        'nail.decode': decode(nail_bytes),
+        'nail.detect': lambda: nail_detector.detect_nails(nail_image),
+        'nail.crop': lambda: [nail_image.crop(box) for box in nail_boxes],
+        'nail.preprocess': lambda: [hemoglobin_predictor.transform(crop) for crop in nail_crops],
+        'nail.classify': classify_each(hemoglobin_predictor.model, nail_tensors),
+        'pattern.decode': decode(droplet_bytes),
+        'pattern.detect': lambda: pattern_service.detect_patterns_improved(droplet_bgr, merge_distance=0),
+        'pattern.merge': lambda: pattern_service.merge_nearby_boxes(candidate_bboxes, 30),
+        'pattern.crop': lambda: [pattern_service.extract_pattern_crop(droplet_bgr, bbox) for bbox in merged_bboxes],
+        'pattern.preprocess': lambda: [pattern_service.preprocess_image(crop) for crop in pattern_crops],
+        'pattern.classify': classify_each(pattern_service.model, pattern_tensors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--droplets', type=int, default=60, help='Droplets on the synthetic slide')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='*', default=None, help='Only run these stages')
+    parser.add_argument('--output', default=None, help='Write JSON results to this file')
+    parser.add_argument('--baseline', default=None, help='Compare against a previously written JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative p50 slowdown')
+    args = parser.parse_args()
+
+    stages = build_stages(args.droplets, args.seed)
+    selected = args.stages or list(stages)
+    unknown = set(selected) - set(stages)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}. Available: {', '.join(stages)}")
+
+    results = {}
+    for name in selected:
+        results[name] = measure_stage(stages[name], iterations=args.iterations, warmup=args.warmup)
+
+    print_results(results)
+
+    if args.output:
+        write_results(args.output, results, {'droplets': args.droplets, 'seed': args.seed})
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressed stages: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
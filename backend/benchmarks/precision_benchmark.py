@@ -0,0 +1,246 @@
+"""
+Accuracy drift and throughput/memory of bfloat16 autocast against fp32
+
+Builds each vision model twice with identical weights, once in fp32 and once
+with MODEL_BF16_AUTOCAST, runs both on the same synthetic inputs and reports
+
+- hemoglobin: max |bf16 - fp32| prediction in g/L over a batch of nail crops
+- pattern: share of crops classified the same, max confidence difference
+- nail: mean IoU of each fp32 box with its best bf16 match, max score difference
+- blip (--blip, downloads the model): share of identical captions
+
+plus p50 latency, items/sec and peak RSS growth of one call for each
+precision. The trained checkpoints in backend/models/ are used when present;
+drift is then checked against the tolerances and the script exits 1 on a
+violation. With random weights drift is reported but not checked (it says
+nothing about the trained models).
+
+bfloat16 is only faster on CPUs with native support (AVX512-BF16 / AMX);
+elsewhere expect a slowdown and use the memory columns only.
+
+Usage (from backend/):
+    python -m benchmarks.precision_benchmark
+    python -m benchmarks.precision_benchmark --iterations 20 --blip
+"""
+
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import torch
+from torchvision.ops import box_iou
+
+from app.core.config import settings
+from app.services.inference_profiles import get_inference_profile
+from app.services.model_optimization import optimize_classifier
+from app.services.nail_hemoglobin_service import HemoglobinPredictor, NailDetector, NailHemoglobinService
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import percentile
+from benchmarks.synthetic import make_droplet_image, make_nail_image
+
+PRECISIONS = (('fp32', False), ('bf16', True))
+
+
+@contextmanager
+def bf16_autocast(enabled: bool):
+    """Temporarily switch bfloat16 autocast on or off (read at model load, and per call for BLIP)"""
+    previous = settings.MODEL_BF16_AUTOCAST
+    settings.MODEL_BF16_AUTOCAST = enabled
+    try:
+        yield
+    finally:
+        settings.MODEL_BF16_AUTOCAST = previous
+
+
+def _status_kb(field: str) -> int:
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise ValueError(field)
+
+
+def peak_rss_growth_mb(fn: Callable[[], object]) -> Optional[float]:
+    """Peak resident memory growth during one call (Linux only: resets VmHWM through clear_refs)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        baseline = _status_kb('VmRSS')
+        fn()
+        return (_status_kb('VmHWM') - baseline) / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def time_call(fn: Callable[[], object], iterations: int, warmup: int = 2) -> float:
+    """p50 latency of fn in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 50) * 1000
+
+
+def nail_inputs(count: int) -> Tuple[list, list]:
+    """Synthetic hand images and the nail crops drawn on them"""
+    images, crops = [], []
+    for seed in range(count):
+        image, boxes = make_nail_image(seed=seed)
+        images.append(image)
+        crops += [image.crop(box) for box in boxes]
+    return images, crops
+
+
+def droplet_crops(count: int, size: int = 96) -> list:
+    """Tiles of a synthetic LC slide, as the pattern classifier sees them"""
+    image, _ = make_droplet_image(num_droplets=count)
+    columns = image.width // size
+    return [
+        image.crop(((i % columns) * size, (i // columns) * size, (i % columns + 1) * size, (i // columns + 1) * size))
+        for i in range(min(count, columns * (image.height // size)))
+    ]
+
+
+def hemoglobin_drift(reference: List[float], candidate: List[float]) -> Dict[str, float]:
+    return {'max_abs_g_per_l': max(abs(a - b) for a, b in zip(reference, candidate))}
+
+
+def pattern_drift(reference: list, candidate: list) -> Dict[str, float]:
+    agree = sum(a[0] == b[0] for a, b in zip(reference, candidate)) / len(reference)
+    return {'agreement': agree, 'max_confidence_diff': max(abs(a[1] - b[1]) for a, b in zip(reference, candidate))}
+
+
+def nail_drift(reference: list, candidate: list) -> Dict[str, float]:
+    ious, score_diffs, count_diff = [], [], 0
+    for ref, cand in zip(reference, candidate):
+        count_diff = max(count_diff, abs(ref['num_nails'] - cand['num_nails']))
+        if not ref['boxes']:
+            continue
+        if not cand['boxes']:
+            ious += [0.0] * len(ref['boxes'])
+            continue
+        best, match = box_iou(torch.tensor(ref['boxes']), torch.tensor(cand['boxes'])).max(dim=1)
+        ious += best.tolist()
+        score_diffs += [abs(ref['scores'][i] - cand['scores'][j]) for i, j in enumerate(match.tolist())]
+    return {
+        'mean_box_iou': sum(ious) / len(ious) if ious else 1.0,
+        'max_score_diff': max(score_diffs, default=0.0),
+        'max_count_diff': count_diff
+    }
+
+
+def blip_drift(reference: List[str], candidate: List[str]) -> Dict[str, float]:
+    return {'identical_captions': sum(a == b for a, b in zip(reference, candidate)) / len(reference)}
+
+
+def build_models(args) -> Dict[str, Tuple[Callable[[], Callable[[], object]], int, Callable, bool]]:
+    """name -> (build the inference call under the current precision, items per call, drift fn, trained weights)"""
+    paths = NailHemoglobinService()
+    nail_path = str(paths.nail_model_path) if paths.nail_model_path.exists() else None
+    hemoglobin_path = str(paths.hemoglobin_model_path) if paths.hemoglobin_model_path.exists() else None
+    pattern_trained = PatternDetectionService().check_models_available()['models_ready']
+
+    images, crops = nail_inputs(args.images)
+    tiles = droplet_crops(args.crops)
+    profile = get_inference_profile(None)
+    # Random detector weights score low; keep low-confidence boxes so there is something to compare
+    nail_threshold = profile.nail_confidence_threshold if nail_path else 0.05
+
+    def hemoglobin():
+        predictor = HemoglobinPredictor(hemoglobin_path, 'cpu')
+        return lambda: predictor.predict_hemoglobin_batch(crops, profile.classifier_input_size)
+
+    def pattern():
+        service = PatternDetectionService()
+        if pattern_trained:
+            service.load_model()
+        else:
+            service.model = optimize_classifier(service.create_pattern_aware_resnet18(), service.device)
+        # Threshold 0: compare argmax classes, not the uncertain cut-off
+        return lambda: service.classify_patterns(tiles, 0.0, profile.classifier_input_size)
+
+    def nail():
+        detector = NailDetector(nail_path, 'cpu')
+        return lambda: [detector.detect_nails(image, nail_threshold, profile) for image in images]
+
+    models = {
+        'hemoglobin': (hemoglobin, len(crops), hemoglobin_drift, hemoglobin_path is not None),
+        'pattern': (pattern, len(tiles), pattern_drift, pattern_trained),
+        'nail': (nail, len(images), nail_drift, nail_path is not None),
+    }
+    if args.blip:
+        from app.services.vision_analysis import VisionAnalysisService
+
+        def blip():
+            service = VisionAnalysisService()
+            service._load_models()
+            return lambda: [service.captioner.caption(image, profile.caption, use_cache=False) for image in images]
+
+        models['blip'] = (blip, len(images), blip_drift, True)
+    return models
+
+
+def check(name: str, drift: Dict[str, float], args) -> bool:
+    if name == 'hemoglobin':
+        return drift['max_abs_g_per_l'] <= args.max_hemoglobin_drift
+    if name == 'pattern':
+        return drift['agreement'] >= args.min_agreement
+    if name == 'nail':
+        return drift['mean_box_iou'] >= args.min_box_iou and drift['max_count_diff'] == 0
+    if name == 'blip':
+        return drift['identical_captions'] >= args.min_caption_agreement
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--images', type=int, default=4, help='Synthetic hand images (4 nail crops each)')
+    parser.add_argument('--crops', type=int, default=64, help='LC slide tiles for the pattern classifier')
+    parser.add_argument('--blip', action='store_true', help='Also compare BLIP captions (downloads the model)')
+    parser.add_argument('--max-hemoglobin-drift', type=float, default=0.5, help='g/L')
+    parser.add_argument('--min-agreement', type=float, default=0.99, help='Pattern class agreement')
+    parser.add_argument('--min-box-iou', type=float, default=0.9, help='Mean IoU of matched nail boxes')
+    parser.add_argument('--min-caption-agreement', type=float, default=0.75, help='Share of identical captions')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads\n")
+    print("| Model | Precision | p50 (ms) | Items/s | Peak RSS growth (MB) | Drift vs fp32 | Check |")
+    print("|---|---|---|---|---|---|---|")
+    failed = False
+    for name, (build, items, drift_fn, trained) in build_models(args).items():
+        reference = None
+        for precision, enabled in PRECISIONS:
+            with bf16_autocast(enabled):
+                torch.manual_seed(args.seed)
+                infer = build()
+                outputs = infer()
+                latency_ms = time_call(infer, args.iterations)
+                peak_mb = peak_rss_growth_mb(infer)
+
+            if reference is None:
+                reference, drift, status = outputs, '', ''
+            else:
+                values = drift_fn(reference, outputs)
+                drift = ', '.join(f"{key} {value:.4g}" for key, value in values.items())
+                ok = check(name, values, args)
+                failed |= trained and not ok
+                status = ('ok' if ok else 'FAIL') if trained else 'random weights'
+            peak = f"{peak_mb:.1f}" if peak_mb is not None else 'n/a'
+            print(f"| {name} | {precision} | {latency_ms:.2f} | {items / latency_ms * 1000:.1f} | {peak} | "
+                  f"{drift} | {status} |", flush=True)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Latency vs. accuracy table for the inference profiles
+
+Runs the nail hemoglobin and LC pattern pipelines under every profile on the
+same inputs. Accuracy is reported as agreement with the "accurate" profile:
+nail count match rate and mean absolute hemoglobin difference for nails, and
+for patterns the share of reference droplet boxes found again (IoU >= 0.5,
+profiles may expand and merge boxes differently) and the class agreement of
+those droplets.
+
+Usage (from backend/):
+    python -m benchmarks.profile_benchmark --iterations 10
+    python -m benchmarks.profile_benchmark --images path/to/nails --output benchmarks/results/profiles.md
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from PIL import Image
+
+from app.core.config import settings
+from app.services.droplet_tracking import bbox_iou_matrix
+from app.services.inference_profiles import INFERENCE_PROFILES
+from app.services.model_optimization import optimize_classifier
+from app.services.nail_hemoglobin_service import NailHemoglobinService, NailDetector, HemoglobinPredictor
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import percentile
+from benchmarks.synthetic import make_droplet_image, make_nail_image
+
+
+def build_services(weights: str):
+    """Build the nail and pattern services with trained or random weights"""
+    nail_service = NailHemoglobinService()
+    # Otherwise later profiles reuse crop probabilities cached by earlier ones at the same input size
+    settings.PATTERN_CACHE_ENABLED = False
+    pattern_service = PatternDetectionService()
+
+    use_real = weights == "real"
+    if use_real and not nail_service.check_models_available()['models_ready']:
+        print("Trained nail models not found, falling back to random weights", file=sys.stderr)
+        use_real = False
+
+    if use_real:
+        nail_service._initialize_models()
+    else:
+        nail_service.nail_detector = NailDetector(None, nail_service.device)
+        nail_service.hemoglobin_predictor = HemoglobinPredictor(None, nail_service.device)
+        nail_service._models_initialized = True
+
+    if weights != "real" or not pattern_service.load_model():
+        pattern_service.model = optimize_classifier(
+            pattern_service.create_pattern_aware_resnet18().to(pattern_service.device), pattern_service.device
+        )
+
+    return nail_service, pattern_service
+
+
+def load_inputs(images_dir: str, count: int):
+    """Load nail/droplet images from a directory, or synthesize them"""
+    if images_dir:
+        paths = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in {'.jpg', '.jpeg', '.png', '.webp'})
+        images = [Image.open(p).convert('RGB') for p in paths[:count]]
+        return images, images
+
+    nail_images = [make_nail_image(seed=i)[0] for i in range(count)]
+    droplet_images = [make_droplet_image(seed=i)[0] for i in range(count)]
+    return nail_images, droplet_images
+
+
+async def run_profile(name, nail_service, pattern_service, nail_images, droplet_images, iterations):
+    """Time both pipelines for one profile and keep the last outputs for agreement checks"""
+    nail_times, pattern_times = [], []
+    nail_outputs, pattern_outputs = [], []
+
+    for iteration in range(iterations):
+        for image in nail_images:
+            start = time.perf_counter()
+            result = await nail_service.analyze_hemoglobin(image, profile=name)
+            nail_times.append((time.perf_counter() - start) * 1000)
+            if iteration == iterations - 1:
+                nail_outputs.append(result)
+
+        for image in droplet_images:
+            start = time.perf_counter()
+            result = await pattern_service.analyze_patterns(image, profile=name)
+            pattern_times.append((time.perf_counter() - start) * 1000)
+            if iteration == iterations - 1:
+                pattern_outputs.append(result)
+
+    return {
+        'nail_p50_ms': statistics.median(nail_times),
+        'nail_p95_ms': percentile(nail_times, 95),
+        'pattern_p50_ms': statistics.median(pattern_times),
+        'pattern_p95_ms': percentile(pattern_times, 95),
+        'nail_outputs': nail_outputs,
+        'pattern_outputs': pattern_outputs
+    }
+
+
+def match_droplets(reference: List[Dict], candidate: List[Dict], min_iou: float = 0.5) -> List[Tuple[Dict, Dict]]:
+    """Pair each reference detection with the unpaired candidate detection overlapping it most"""
+    iou = bbox_iou_matrix([d['bbox'] for d in reference], [d['bbox'] for d in candidate])
+    pairs, used = [], set()
+    for ref_index, detection in enumerate(reference):
+        for cand_index in iou[ref_index].argsort()[::-1]:
+            if iou[ref_index, cand_index] < min_iou:
+                break
+            if cand_index not in used:
+                used.add(cand_index)
+                pairs.append((detection, candidate[cand_index]))
+                break
+    return pairs
+
+
+def agreement(reference: Dict, candidate: Dict) -> Dict[str, float]:
+    """Compare a profile's outputs to the reference profile's outputs"""
+    count_matches, hb_diffs = 0, []
+    for ref, cand in zip(reference['nail_outputs'], candidate['nail_outputs']):
+        ref_nails = ref['nail_analysis']
+        cand_nails = cand['nail_analysis']
+        count_matches += ref_nails['num_nails_detected'] == cand_nails['num_nails_detected']
+        if ref.get('success') and cand.get('success'):
+            hb_diffs.append(abs(ref_nails['average_hemoglobin_g_per_L'] - cand_nails['average_hemoglobin_g_per_L']))
+
+    class_matches, matched, droplets = 0, 0, 0
+    for ref, cand in zip(reference['pattern_outputs'], candidate['pattern_outputs']):
+        ref_detections = ref['pattern_analysis'].get('individual_detections', [])
+        pairs = match_droplets(ref_detections, cand['pattern_analysis'].get('individual_detections', []))
+        droplets += len(ref_detections)
+        matched += len(pairs)
+        class_matches += sum(ref_detection['class'] == cand_detection['class'] for ref_detection, cand_detection in pairs)
+
+    return {
+        'nail_count_agreement': count_matches / max(1, len(reference['nail_outputs'])),
+        'hb_mean_abs_diff': statistics.mean(hb_diffs) if hb_diffs else float('nan'),
+        'droplet_recall': matched / droplets if droplets else float('nan'),
+        'pattern_class_agreement': class_matches / matched if matched else float('nan')
+    }
+
+
+def render_table(results: Dict[str, Dict]) -> str:
+    reference = results['accurate']
+    lines = [
+        "| Profile | Nail p50 (ms) | Nail p95 (ms) | Pattern p50 (ms) | Pattern p95 (ms) "
+        "| Nail count agreement | Hb mean abs diff (g/L) | Droplet recall | Pattern class agreement |",
+        "|---|---|---|---|---|---|---|---|---|",
+    ]
+    for name, result in results.items():
+        agree = agreement(reference, result)
+        lines.append(
+            f"| {name} | {result['nail_p50_ms']:.1f} | {result['nail_p95_ms']:.1f} "
+            f"| {result['pattern_p50_ms']:.1f} | {result['pattern_p95_ms']:.1f} "
+            f"| {agree['nail_count_agreement']:.2f} | {agree['hb_mean_abs_diff']:.2f} "
+            f"| {agree['droplet_recall']:.2f} | {agree['pattern_class_agreement']:.2f} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', choices=['real', 'random'], default='real')
+    parser.add_argument('--images', default=None, help='Directory of real images (default: synthetic)')
+    parser.add_argument('--count', type=int, default=4, help='Number of input images')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--output', default=None, help='Write the markdown table to this file')
+    args = parser.parse_args()
+
+    nail_service, pattern_service = build_services(args.weights)
+    nail_images, droplet_images = load_inputs(args.images, args.count)
+
+    results = {}
+    for name in INFERENCE_PROFILES:
+        results[name] = asyncio.run(
+            run_profile(name, nail_service, pattern_service, nail_images, droplet_images, args.iterations)
+        )
+
+    table = render_table(results)
+    print(table)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(table + "\n")
+
+
+if __name__ == '__main__':
+    main()
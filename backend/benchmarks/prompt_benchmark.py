@@ -0,0 +1,89 @@
+"""
+Input-token size of the LLM prompts: original verbose templates vs. compact builder
+
+Renders the hemoglobin, health (skin/discharge) and cycle-insight prompts
+for representative inputs with LLM_COMPACT_PROMPTS off and on, counts their
+tokens (tiktoken if installed, otherwise an estimate) and reports the
+reduction per prompt type. No LLM or embedding calls are made.
+
+Usage (from backend/):
+    python -m benchmarks.prompt_benchmark
+    python -m benchmarks.prompt_benchmark --budget 400 --show
+"""
+
+import argparse
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from langchain.schema import Document
+
+from app.core.config import settings
+from app.services.llm_health_service import HEALTH_KNOWLEDGE, LLMHealthService
+from app.services.prompt_builder import count_tokens, tiktoken
+
+
+def build_prompts(service: LLMHealthService):
+    docs = [Document(page_content=text) for text in HEALTH_KNOWLEDGE[:3]]
+    nail_result = {
+        'nail_analysis': {
+            'num_nails_detected': 4,
+            'average_hemoglobin_g_per_L': 127.43518,
+            'individual_predictions': [
+                {'nail_id': i + 1, 'bounding_box': [101.23456 + 80 * i, 88.91234, 160.5678 + 80 * i, 170.1234],
+                 'confidence': 0.9312345 - 0.05 * i, 'hemoglobin_g_per_L': 124.5678 + 2.1 * i, 'nail_size': (59, 82)}
+                for i in range(4)
+            ]
+        }
+    }
+    image_analysis = {
+        'description': 'a close up of a red rash on the skin of a woman',
+        'skin_concerns': ['redness', 'irritation'],
+        'confidence': 0.7345
+    }
+    symptoms = ['fatigue', 'itching']
+
+    return {
+        'hemoglobin': lambda: service._create_hemoglobin_prompt(
+            nail_result, symptoms, {'age': 29}, docs, service._get_hemoglobin_knowledge()
+        ),
+        'health': lambda: service._create_health_prompt(image_analysis, 'skin', symptoms, {'age': 29}, docs),
+        'cycle': lambda: service._create_cycle_insight_prompt(
+            14, 28, 5, 'ovulatory', ['energy', 'sleep'], 'reproductive'
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=int, default=settings.LLM_PROMPT_TOKEN_BUDGET)
+    parser.add_argument('--show', action='store_true', help='Print the compact prompts')
+    args = parser.parse_args()
+
+    # Only the prompt templates are exercised; skip the embeddings / vector store set-up
+    service = LLMHealthService.__new__(LLMHealthService)
+    settings.LLM_PROMPT_TOKEN_BUDGET = args.budget
+
+    rows, compact_texts = [], {}
+    for name, build in build_prompts(service).items():
+        settings.LLM_COMPACT_PROMPTS = False
+        verbose = count_tokens(build())
+        settings.LLM_COMPACT_PROMPTS = True
+        text = build()
+        compact_texts[name] = text
+        rows.append((name, verbose, count_tokens(text)))
+
+    counter = 'tiktoken' if tiktoken is not None else 'estimate (~4 chars/token)'
+    print(f"# Token counts ({counter}), budget {args.budget}\n")
+    print("| Prompt | Verbose tokens | Compact tokens | Reduction |")
+    print("|---|---|---|---|")
+    for name, verbose, compact in rows:
+        print(f"| {name} | {verbose} | {compact} | {1 - compact / verbose:.0%} |")
+
+    if args.show:
+        for name, text in compact_texts.items():
+            print(f"\n--- {name} ---\n{text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Parameter re-sweeps of one LC slide with and without the pattern analysis cache
+
+Lab users tune min_area / max_area / confidence_threshold by re-posting the
+same slide. This runs the blocking part of /analyze-patterns (random-weight
+classifier) over a grid of those parameters on one synthetic slide:
+
+- uncached: PATTERN_CACHE_ENABLED=false, every call thresholds, finds
+  contours and classifies every crop
+- cached: the first call fills the slide cache (cold); every later call only
+  re-filters, re-merges and re-thresholds, classifying crops it has not seen
+
+Reports p50/p95 latency of the sweep calls and checks that the cached
+responses are identical to the uncached ones (exit 1 otherwise).
+
+Usage (from backend/):
+    python -m benchmarks.resweep_benchmark
+    python -m benchmarks.resweep_benchmark --droplets 1000 --width 3000 --height 2200
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import torch
+
+from app.core.config import settings
+from app.services.inference_profiles import get_inference_profile
+from app.services.model_optimization import optimize_classifier
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.harness import percentile
+from benchmarks.synthetic import make_droplet_image
+
+MIN_AREAS = (50, 100, 200)
+MAX_AREAS = (5000, 50000)
+CONFIDENCES = (0.3, 0.5, 0.7)
+
+
+def make_service(model, cache_enabled: bool) -> PatternDetectionService:
+    previous = settings.PATTERN_CACHE_ENABLED
+    settings.PATTERN_CACHE_ENABLED = cache_enabled
+    try:
+        service = PatternDetectionService()
+    finally:
+        settings.PATTERN_CACHE_ENABLED = previous
+    service.model = model
+    return service
+
+
+def sweep(service: PatternDetectionService, image, profile) -> Dict[str, object]:
+    latencies: List[float] = []
+    results = []
+    for min_area, max_area, confidence in itertools.product(MIN_AREAS, MAX_AREAS, CONFIDENCES):
+        start = time.perf_counter()
+        result = service._analyze_patterns_sync(image, min_area, max_area, confidence, profile)
+        latencies.append((time.perf_counter() - start) * 1000)
+        analysis = result['pattern_analysis']
+        results.append((analysis['pattern_counts'], analysis['individual_detections']))
+    return {'latencies': latencies, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--droplets', type=int, default=300)
+    parser.add_argument('--width', type=int, default=2048)
+    parser.add_argument('--height', type=int, default=1536)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    profile = get_inference_profile(None)
+    reference = PatternDetectionService()
+    model = optimize_classifier(reference.create_pattern_aware_resnet18().to(reference.device), reference.device)
+    image, _ = make_droplet_image(args.width, args.height, num_droplets=args.droplets, seed=args.seed)
+
+    uncached = make_service(model, cache_enabled=False)
+    cached = make_service(model, cache_enabled=True)
+    uncached._analyze_patterns_sync(image, MIN_AREAS[0], MAX_AREAS[0], CONFIDENCES[0], profile)  # warm-up
+
+    baseline = sweep(uncached, image, profile)
+    swept = sweep(cached, image, profile)
+    calls = len(baseline['latencies'])
+
+    print(f"# {args.width}x{args.height} slide, {args.droplets} droplets, {calls} parameter combinations\n")
+    print("| Mode | Calls | p50 (ms) | p95 (ms) | Total (s) |")
+    print("|---|---|---|---|---|")
+    rows = [
+        ('uncached', baseline['latencies']),
+        ('cached: first call (cold)', swept['latencies'][:1]),
+        ('cached: re-sweeps', swept['latencies'][1:]),
+    ]
+    for name, latencies in rows:
+        print(f"| {name} | {len(latencies)} | {percentile(latencies, 50):.2f} | {percentile(latencies, 95):.2f} | "
+              f"{sum(latencies) / 1000:.2f} |")
+
+    entry = next(iter(cached.slide_cache._entries.values()))
+    print(f"\nCached: {len(entry.contours.areas)} contours, {len(entry.probabilities)} crop probabilities")
+
+    mismatches = sum(a != b for a, b in zip(baseline['results'], swept['results']))
+    if mismatches:
+        print(f"{mismatches} of {calls} cached responses differ from the uncached ones")
+        sys.exit(1)
+    print("Cached responses identical to uncached")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Knowledge retrieval: lexical (BM25) vs. vector vs. hybrid
+
+Builds a HybridRetriever over the HealthKnowledgeRAG passages for each
+retrieval mode and runs a hand-labelled query set through it, reporting
+p50/p95 retrieval latency (embedding included) and recall@k against the
+labelled relevant passages.
+
+The vector and hybrid modes use the configured EMBEDDINGS_PROVIDER; pass
+--embeddings local to run them offline.
+
+Usage (from backend/):
+    python -m benchmarks.retrieval_benchmark --embeddings local
+    python -m benchmarks.retrieval_benchmark --modes lexical hybrid --alpha 0.3 --k 3
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from langchain.schema import Document
+
+from app.core.config import settings
+from app.services.hybrid_retriever import RETRIEVAL_MODES, HybridRetriever
+from app.services.rag_services import HEALTH_DOCUMENTS
+from benchmarks.harness import percentile
+
+# Query -> indices of the HEALTH_DOCUMENTS passages that answer it
+LABELLED_QUERIES: Dict[str, List[int]] = {
+    "discharge yellow itching": [1, 2],
+    "fishy odor": [1],
+    "thick white discharge like cottage cheese": [2],
+    "burning when urinating and frequent urge": [3],
+    "how to prevent a UTI": [4, 3],
+    "is douching safe": [12, 5],
+    "clear stretchy discharge in the middle of my cycle": [7, 0],
+    "acne on the chin before my period": [8],
+    "red irritated skin after using a new soap": [9],
+    "when should I see a doctor about discharge changes": [10],
+    "skin a close up of a red rash on the skin redness irritation": [9],
+    "discharge a white substance on a cloth itching": [2, 0],
+}
+
+
+def evaluate(mode: str, k: int, repeats: int) -> Dict[str, float]:
+    documents = [Document(page_content=text) for text in HEALTH_DOCUMENTS]
+    retriever = HybridRetriever(documents, collection_name=f"retrieval_benchmark_{mode}", mode=mode)
+    retriever.retrieve("warm-up", k=k)
+
+    latencies = []
+    for _ in range(repeats):
+        for query in LABELLED_QUERIES:
+            start = time.perf_counter()
+            retriever.retrieve(query, k=k)
+            latencies.append(time.perf_counter() - start)
+
+    recalls = []
+    for query, relevant in LABELLED_QUERIES.items():
+        retrieved = {doc.metadata['doc_id'] for doc in retriever.retrieve(query, k=k)}
+        recalls.append(len(retrieved & set(relevant)) / len(relevant))
+
+    return {
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p95_us': percentile(latencies, 95) * 1e6,
+        'recall': sum(recalls) / len(recalls)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='*', default=list(RETRIEVAL_MODES), choices=RETRIEVAL_MODES)
+    parser.add_argument('--embeddings', choices=['openai', 'local'], default=settings.EMBEDDINGS_PROVIDER)
+    parser.add_argument('--alpha', type=float, default=settings.RETRIEVAL_HYBRID_ALPHA)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    settings.EMBEDDINGS_PROVIDER = args.embeddings
+    settings.RETRIEVAL_HYBRID_ALPHA = args.alpha
+
+    print(f"# {len(HEALTH_DOCUMENTS)} passages, {len(LABELLED_QUERIES)} labelled queries, "
+          f"embeddings {args.embeddings}, alpha {args.alpha}\n")
+    print(f"| Mode | p50 (us) | p95 (us) | Recall@{args.k} |")
+    print("|---|---|---|---|")
+    for mode in args.modes:
+        result = evaluate(mode, args.k, args.repeats)
+        print(f"| {mode} | {result['p50_us']:.0f} | {result['p95_us']:.0f} | {result['recall']:.0%} |", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Time-lapse throughput: full per-frame pattern analysis vs. droplet tracking
+
+Builds a synthetic time-lapse of one LC slide (random-weight classifier):
+every frame adds sensor noise and 1 px of stage jitter, and a small fraction
+of droplets rotate by 90 degrees between frames to emulate pattern changes.
+The same frames are then analyzed three ways:
+
+- full: /analyze-patterns on every frame (detection + per-droplet classification)
+- tracked, threshold 0: tracking with every droplet reclassified each frame (batching only)
+- tracked: tracking that reclassifies only droplets whose crop changed
+
+Reports frames/s, classifier calls and how often the tracked final-frame
+classes agree with a full analysis of the last frame.
+
+Usage (from backend/):
+    python -m benchmarks.sequence_benchmark
+    python -m benchmarks.sequence_benchmark --frames 60 --droplets 120 --change-rate 0.05
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from app.core.config import settings
+from app.services.inference_profiles import get_inference_profile
+from app.services.model_optimization import optimize_classifier
+from app.services.pattern_detection_service import PatternDetectionService
+from benchmarks.synthetic import make_droplet_image
+
+MIN_AREA, MAX_AREA, CONFIDENCE = 100, 50000, 0.5
+
+
+def make_sequence(service: PatternDetectionService, frames: int, droplets: int, change_rate: float,
+                  seed: int) -> List[Image.Image]:
+    """Noisy, slightly jittered frames of one slide with a few droplets changing between frames"""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    base, _ = make_droplet_image(num_droplets=droplets, seed=seed)
+    field = np.array(base)
+    bboxes = service.detect_patterns_improved(cv2.cvtColor(field, cv2.COLOR_RGB2BGR), MIN_AREA, MAX_AREA)
+
+    sequence = []
+    for _ in range(frames):
+        for x, y, w, h in bboxes:
+            if rng.random() < change_rate:
+                side = min(w, h)
+                region = field[y:y + side, x:x + side]
+                field[y:y + side, x:x + side] = np.rot90(region).copy()
+        shift = (rng.randint(-1, 1), rng.randint(-1, 1))
+        frame = np.roll(field, shift, axis=(0, 1)).astype(np.int16)
+        frame += np_rng.normal(0, 3, frame.shape).astype(np.int16)
+        sequence.append(Image.fromarray(np.clip(frame, 0, 255).astype(np.uint8)))
+    return sequence
+
+
+def run_full(service: PatternDetectionService, frames: List[Image.Image], profile) -> Dict[str, object]:
+    calls = 0
+    start = time.perf_counter()
+    for frame in frames:
+        result = service._analyze_patterns_sync(frame, MIN_AREA, MAX_AREA, CONFIDENCE, profile)
+        calls += result['pattern_analysis']['total_patterns_detected']
+    elapsed = time.perf_counter() - start
+    return {'elapsed': elapsed, 'calls': calls, 'last': result['pattern_analysis']['individual_detections']}
+
+
+def run_tracked(service: PatternDetectionService, frames: List[Image.Image], profile,
+                change_threshold: float) -> Dict[str, object]:
+    start = time.perf_counter()
+    result = service._analyze_pattern_sequence_sync(
+        frames, MIN_AREA, MAX_AREA, CONFIDENCE, change_threshold, settings.SEQUENCE_IOU_THRESHOLD, None, profile
+    )
+    elapsed = time.perf_counter() - start
+    analysis = result['sequence_analysis']
+    last_frame = len(frames) - 1
+    last = [
+        {'bbox': tuple(droplet['observations'][-1]['bbox']), 'class': droplet['current_class']}
+        for droplet in analysis['droplets'] if droplet['last_frame'] == last_frame
+    ]
+    return {'elapsed': elapsed, 'calls': analysis['classifications_run'], 'last': last}
+
+
+def agreement(reference: List[Dict[str, object]], candidate: List[Dict[str, object]]) -> float:
+    """Share of last-frame droplets given the same class as a full analysis of that frame"""
+    classes = {tuple(item['bbox']): item['class'] for item in candidate}
+    if not reference:
+        return 1.0
+    return sum(classes.get(tuple(item['bbox'])) == item['class'] for item in reference) / len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--droplets', type=int, default=60)
+    parser.add_argument('--change-rate', type=float, default=0.02, help='Chance a droplet changes per frame')
+    parser.add_argument('--change-threshold', type=float, default=settings.SEQUENCE_CHANGE_THRESHOLD)
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    service = PatternDetectionService()
+    service.model = optimize_classifier(service.create_pattern_aware_resnet18().to(service.device), service.device)
+    profile = get_inference_profile(args.profile)
+
+    frames = make_sequence(service, args.frames, args.droplets, args.change_rate, args.seed)
+    service._analyze_patterns_sync(frames[0], MIN_AREA, MAX_AREA, CONFIDENCE, profile)  # warm-up
+
+    full = run_full(service, frames, profile)
+    rows = [
+        ('full (per frame)', full),
+        ('tracked, threshold 0', run_tracked(service, frames, profile, 0.0)),
+        (f'tracked, threshold {args.change_threshold}', run_tracked(service, frames, profile, args.change_threshold)),
+    ]
+
+    print(f"# {args.frames} frames, {args.droplets} droplets, change rate {args.change_rate}/frame, "
+          f"profile {profile.name}, torch {torch.__version__}\n")
+    print("| Mode | Frames/s | Classifier calls | Speedup | Last-frame agreement |")
+    print("|---|---|---|---|---|")
+    for name, row in rows:
+        print(f"| {name} | {args.frames / row['elapsed']:.2f} | {row['calls']} | "
+              f"{full['elapsed'] / row['elapsed']:.1f}x | {agreement(full['last'], row['last']):.1%} |")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Response serialization on dense slides: stdlib JSONResponse vs. fast encoder and field selection
+
+Builds /analyze-patterns responses with thousands of individual_detections
+(as the endpoint produces them, and with numpy scalars as vectorized code
+produces them) and reports encode time and payload size for
+
+- stdlib: Starlette's JSONResponse (json.dumps); numpy results need a
+  conversion pass first, which is included in its time
+- fast: FastJSONResponse (orjson if installed, else json.dumps with a numpy
+  default hook)
+- summary: detail=summary (selection + fast encode, detections left out)
+- fields: fields=summary,pattern_analysis.pattern_counts
+
+Usage (from backend/):
+    python -m benchmarks.serialization_benchmark
+    python -m benchmarks.serialization_benchmark --detections 1000 5000 20000 --iterations 50
+"""
+
+import argparse
+import random
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from app.core.serialization import FastJSONResponse, orjson, parse_fields, select_fields
+from benchmarks.harness import measure_stage
+
+SUMMARY_OMIT = ("pattern_analysis.individual_detections",)
+FIELDS = "summary,pattern_analysis.pattern_counts"
+
+
+def dense_slide_response(detections: int, numpy_types: bool, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    classes = ['bipolar-circle', 'radial-cross', 'uncertain']
+    items = []
+    for _ in range(detections):
+        bbox = (rng.randrange(4000), rng.randrange(3000), rng.randrange(8, 80), rng.randrange(8, 80))
+        confidence = rng.random()
+        if numpy_types:
+            bbox = tuple(np.int64(v) for v in bbox)
+            confidence = np.float32(confidence)
+        items.append({'bbox': bbox, 'class': rng.choice(classes), 'confidence': confidence})
+    counts = {name: sum(1 for item in items if item['class'] == name) for name in classes}
+    counts['error'] = 0
+    return {
+        'status': 'success',
+        'pattern_analysis': {
+            'total_patterns_detected': detections,
+            'pattern_counts': counts,
+            'circular_patterns': counts['bipolar-circle'],
+            'cross_patterns': counts['radial-cross'],
+            'uncertain_patterns': counts['uncertain'],
+            'confidence_threshold': 0.5,
+            'detection_parameters': {'min_area': 50, 'max_area': 5000},
+            'inference_profile': 'balanced',
+            'individual_detections': items
+        },
+        'summary': {
+            'total_patterns': detections,
+            'circular_patterns': counts['bipolar-circle'],
+            'cross_patterns': counts['radial-cross'],
+            'uncertain_patterns': counts['uncertain'],
+            'analysis_quality': 'high'
+        },
+        'timestamp': '2024-01-15T10:30:00Z'
+    }
+
+
+def to_builtin(value):
+    """The conversion pass the stdlib encoder needs for numpy results"""
+    if isinstance(value, dict):
+        return {key: to_builtin(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--detections', type=int, nargs='*', default=[1000, 5000, 20000])
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    encoder = 'orjson' if orjson is not None else 'json.dumps (orjson not installed)'
+    print(f"# Fast encoder: {encoder}\n")
+    print("| Detections | Types | Variant | p50 (ms) | p95 (ms) | Payload (KB) |")
+    print("|---|---|---|---|---|---|")
+    for detections in args.detections:
+        for numpy_types in (False, True):
+            content = dense_slide_response(detections, numpy_types)
+            variants = {
+                'stdlib': lambda: JSONResponse(content=to_builtin(content) if numpy_types else content),
+                'fast': lambda: FastJSONResponse(content=content),
+                'summary': lambda: FastJSONResponse(content=select_fields(content, omit=SUMMARY_OMIT)),
+                'fields': lambda: FastJSONResponse(content=select_fields(content, parse_fields(FIELDS))),
+            }
+            for name, encode in variants.items():
+                result = measure_stage(encode, iterations=args.iterations, warmup=2)
+                size_kb = len(encode().body) / 1024
+                types = 'numpy' if numpy_types else 'python'
+                print(f"| {detections} | {types} | {name} | {result['p50_ms']:.2f} | {result['p95_ms']:.2f} | "
+                      f"{size_kb:.1f} |", flush=True)
+
+
+if __name__ == '__main__':
+    main()
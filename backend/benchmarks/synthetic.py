@@ -0,0 +1,109 @@
+# SYNTHETIC BENCHMARK INPUTS
+# Deterministic nail and LC droplet images so benchmarks run fully offline
+
+import io
+import random
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def make_nail_image(width: int = 640, height: int = 480, num_nails: int = 4,
+                    seed: int = 0) -> Tuple[Image.Image, List[Tuple[int, int, int, int]]]:
+    """
+    Render a hand-like image with pinkish nail plates on a skin-tone background
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        num_nails: Number of nail plates to draw
+        seed: Random seed
+
+    Returns:
+        tuple: (RGB image, list of nail boxes as (x1, y1, x2, y2))
+    """
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), (205, 160, 130))
+    draw = ImageDraw.Draw(image)
+
+    boxes = []
+    finger_width = width // (num_nails + 1)
+    for i in range(num_nails):
+        cx = finger_width * (i + 1)
+        top = height // 4 + rng.randint(-20, 20)
+
+        # Finger
+        draw.rounded_rectangle(
+            (cx - finger_width // 3, top, cx + finger_width // 3, height),
+            radius=finger_width // 3,
+            fill=(215, 170, 140)
+        )
+
+        # Nail plate
+        nail_w = finger_width // 4
+        nail_h = int(nail_w * 1.3)
+        shade = rng.randint(-15, 15)
+        box = (cx - nail_w, top + 10, cx + nail_w, top + 10 + 2 * nail_h)
+        draw.ellipse(box, fill=(230 + shade // 3, 160 + shade, 165 + shade), outline=(240, 220, 215))
+        boxes.append(box)
+
+    noise = np.random.default_rng(seed).normal(0, 4, (height, width, 3))
+    pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels), boxes
+
+
+def make_droplet_image(width: int = 1024, height: int = 768, num_droplets: int = 60,
+                       seed: int = 0) -> Tuple[Image.Image, List[str]]:
+    """
+    Render a dark LC slide with bright bipolar-circle and radial-cross droplets
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        num_droplets: Number of droplets to place on a jittered grid
+        seed: Random seed
+
+    Returns:
+        tuple: (RGB image, list of drawn pattern classes in placement order)
+    """
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), (8, 8, 10))
+    draw = ImageDraw.Draw(image)
+
+    cols = max(1, int(np.sqrt(num_droplets * width / height)))
+    rows = max(1, int(np.ceil(num_droplets / cols)))
+    cell_w, cell_h = width // cols, height // rows
+
+    classes = []
+    for index in range(num_droplets):
+        row, col = divmod(index, cols)
+        radius = rng.randint(8, min(cell_w, cell_h) // 4)
+        cx = col * cell_w + cell_w // 2 + rng.randint(-cell_w // 8, cell_w // 8)
+        cy = row * cell_h + cell_h // 2 + rng.randint(-cell_h // 8, cell_h // 8)
+        brightness = rng.randint(150, 240)
+
+        draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius), fill=(brightness,) * 3)
+
+        if rng.random() < 0.5:
+            # Radial cross: dark extinction brushes through the centre
+            width_px = max(2, radius // 4)
+            draw.line((cx - radius, cy, cx + radius, cy), fill=(20, 20, 20), width=width_px)
+            draw.line((cx, cy - radius, cx, cy + radius), fill=(20, 20, 20), width=width_px)
+            classes.append('radial-cross')
+        else:
+            # Bipolar circle: two dark poles on one axis
+            pole = max(2, radius // 3)
+            draw.ellipse((cx - pole, cy - radius, cx + pole, cy - radius + 2 * pole), fill=(20, 20, 20))
+            draw.ellipse((cx - pole, cy + radius - 2 * pole, cx + pole, cy + radius), fill=(20, 20, 20))
+            classes.append('bipolar-circle')
+
+    image = image.filter(ImageFilter.GaussianBlur(radius=1))
+    return image, classes
+
+
+def encode_image(image: Image.Image, format: str = 'JPEG') -> bytes:
+    """Encode an image the way a client upload would arrive"""
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, quality=90)
+    return buffer.getvalue()